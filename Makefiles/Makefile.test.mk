@@ -48,9 +48,11 @@ comptests_packages=\
 	duckieteam_tests\
 	complete_image_pipeline_tests\
 	duckietown_segmaps_tests\
+	lane_filter_tests\
 	lane_filter_generic_tests\
 	easy_regression_tests\
-	grid_helper_tests
+	grid_helper_tests\
+	led_detection_tests
 
 # These take a long time
 # anti_instagram_tests\
@@ -33,6 +33,7 @@ from .image_timestamps import *
 from .image_writing import *
 from .instantiate_utils import *
 from .jpg import *
+from .latest_frame import *
 from .locate_files_impl import *
 from .logging_logger import *
 from .matplotlib_utils import *
@@ -41,6 +42,7 @@ from .mkdirs import *
 from .networking import *
 from .parameters import *
 from .path_utils import *
+from .profiler import *
 from .paths import *
 from .read_package_xml import *
 from .robot_name import *
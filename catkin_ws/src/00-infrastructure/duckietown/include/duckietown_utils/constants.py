@@ -10,6 +10,8 @@ class DuckietownConstants(object):
     DUCKIEFLEET_ROOT_variable = 'DUCKIEFLEET_ROOT'
     DUCKIETOWN_DATA_variable = 'DUCKIETOWN_DATA'
     DUCKIETOWN_CONFIG_SEQUENCE_variable = 'DUCKIETOWN_CONFIG_SEQUENCE'
+    # If set to 1, the profiler (duckietown_utils.profiler) is enabled
+    DUCKIETOWN_PROFILER_variable = 'DUCKIETOWN_PROFILER'
 
     # The name of a hypothetical robot used in the unit tests.
     ROBOT_NAME_FOR_TESTS = 'robbie'
@@ -17,6 +17,7 @@ from .contracts_ import contract
 from .deprecation import deprecated
 from .file_utils import write_data_to_file
 from .logging_logger import logger
+from .memoization import memoize_simple
 from .timeit import timeit_clock
 
 
@@ -51,11 +52,52 @@ def bgr_from_jpg(data):
     return _bgr_from_file_data(data)
 
 
+@contract(data=str, scale='float,>0', returns='array[HxWx3](uint8)')
+def bgr_from_jpg_resized(data, scale):
+    """
+        Returns the JPG image resized by scale, like
+
+            cv2.resize(bgr_from_jpg(data), (0, 0), fx=scale, fy=scale)
+
+        but, if cv2.imdecode() can do it, the image is first decoded at
+        1/2, 1/4 or 1/8 of its size (the smallest that is not smaller than
+        the result), which is much faster, as libjpeg skips most of the
+        inverse DCT. The result can then differ from the above by a pixel
+        in size and slightly in value.
+    """
+    reduction = 1
+    flag = cv2.IMREAD_COLOR
+    if _imdecode_can_reduce():
+        for r in [2, 4, 8]:
+            if r * scale <= 1:
+                reduction = r
+                flag = getattr(cv2, 'IMREAD_REDUCED_COLOR_%d' % r)
+    bgr = _bgr_from_file_data(data, flag)
+    f = scale * reduction
+    if f == 1:
+        return bgr
+    return cv2.resize(bgr, (0, 0), fx=f, fy=f)
+
+
+@memoize_simple
+def _imdecode_can_reduce():
+    """
+        True if cv2.imdecode() honours the IMREAD_REDUCED_COLOR_* flags
+        (older versions of OpenCV ignore them and decode the full image).
+    """
+    flag = getattr(cv2, 'IMREAD_REDUCED_COLOR_2', None)
+    if flag is None:
+        return False
+    _retval, s = cv2.imencode('.jpg', np.zeros((16, 16, 3), 'uint8'))
+    bgr = cv2.imdecode(s, flag)
+    return bgr is not None and bgr.shape[:2] == (8, 8)
+
+
 @contract(data=str, returns='array[HxWx3](uint8)')
-def _bgr_from_file_data(data):
+def _bgr_from_file_data(data, flag=cv2.IMREAD_COLOR):
     """ Returns an OpenCV BGR image from a string """
     s = np.fromstring(data, np.uint8)
-    bgr = cv2.imdecode(s, cv2.IMREAD_COLOR)
+    bgr = cv2.imdecode(s, flag)
     if bgr is None:
         msg = 'Could not decode image (cv2.imdecode returned None). '
         msg += 'This is usual a sign of data corruption.'
@@ -0,0 +1,138 @@
+from collections import namedtuple
+import threading
+import time
+import traceback
+
+from .logging_logger import logger
+from .text_utils import seconds_as_ms
+
+__all__ = [
+    'LatestFrameWorker',
+    'LatestFrameStats',
+]
+
+LatestFrameStats = namedtuple('LatestFrameStats',
+                              ['received',  # number of items put()
+                               'processed',  # number of items given to process()
+                               'dropped',  # replaced in the mailbox before being processed
+                               'last_queue_latency',  # time between put() and process(), seconds
+                               'avg_queue_latency'])
+
+
+class LatestFrameWorker(object):
+    """
+        A processing stage with a single persistent worker thread
+        and a one-slot mailbox.
+
+        put() never blocks: it stores the item in the mailbox, replacing
+        (and dropping) the one that was waiting, if any. The worker
+        always processes the newest item; items that arrive while it is
+        busy overwrite each other, so at most one is waiting.
+
+            worker = LatestFrameWorker(process=self.process_image)
+            ...
+            def on_image(self, msg):
+                worker.put(msg)
+
+        on_drop(item) is called (in the thread calling put()) for each
+        dropped item.
+
+        Exceptions raised by process() are logged; the worker continues.
+    """
+
+    def __init__(self, process, name='LatestFrameWorker', on_drop=None):
+        self._process = process
+        self._on_drop = on_drop
+        self._cond = threading.Condition(threading.Lock())
+        # (item, time of put()) or None
+        self._mailbox = None
+        self._stopped = False
+        self._busy = False
+
+        self._received = 0
+        self._processed = 0
+        self._dropped = 0
+        self._last_queue_latency = None
+        self._total_queue_latency = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name=name)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def put(self, item):
+        """ Puts the item in the mailbox, dropping the one waiting. """
+        with self._cond:
+            if self._stopped:
+                msg = 'The worker was shut down.'
+                raise ValueError(msg)
+            dropped = self._mailbox
+            self._received += 1
+            if dropped is not None:
+                self._dropped += 1
+            self._mailbox = (item, time.time())
+            self._cond.notify()
+
+        if dropped is not None and self._on_drop is not None:
+            self._on_drop(dropped[0])
+
+    def get_stats(self):
+        """ Returns a LatestFrameStats. """
+        with self._cond:
+            if self._processed:
+                avg_queue_latency = self._total_queue_latency / self._processed
+            else:
+                avg_queue_latency = None
+            return LatestFrameStats(received=self._received,
+                                    processed=self._processed,
+                                    dropped=self._dropped,
+                                    last_queue_latency=self._last_queue_latency,
+                                    avg_queue_latency=avg_queue_latency)
+
+    def info(self):
+        """ Returns a one-line summary of the statistics. """
+        stats = self.get_stats()
+        return ('received %d processed %d dropped %d queue latency %s (avg %s)' %
+                (stats.received, stats.processed, stats.dropped,
+                 seconds_as_ms(stats.last_queue_latency),
+                 seconds_as_ms(stats.avg_queue_latency)))
+
+    def is_idle(self):
+        """ True if the worker is not processing and the mailbox is empty. """
+        with self._cond:
+            return self._mailbox is None and not self._busy
+
+    def shutdown(self, wait=True):
+        """
+            Stops the worker. The item being processed is completed;
+            the one waiting in the mailbox, if any, is discarded.
+        """
+        with self._cond:
+            self._stopped = True
+            self._mailbox = None
+            self._cond.notify()
+        if wait and threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._mailbox is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                item, t_put = self._mailbox
+                self._mailbox = None
+                self._busy = True
+                latency = time.time() - t_put
+                self._processed += 1
+                self._last_queue_latency = latency
+                self._total_queue_latency += latency
+
+            try:
+                self._process(item)
+            except Exception:
+                logger.error('%s: error while processing:\n%s' %
+                             (self._thread.name, traceback.format_exc()))
+            finally:
+                with self._cond:
+                    self._busy = False
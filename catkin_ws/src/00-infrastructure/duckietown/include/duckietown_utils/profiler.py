@@ -0,0 +1,251 @@
+from collections import deque
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+
+from .constants import DuckietownConstants
+from .logging_logger import logger
+
+__all__ = [
+    'Profiler',
+    'ProfileNode',
+    'profiler',
+]
+
+
+class _NullSpan(object):
+    """ The span returned by a disabled profiler. """
+    __slots__ = []
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ['profiler', 'name', 'path', 't0']
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        local = self.profiler._get_local()
+        stack = local.stack
+        parent = stack[-1] if stack else ()
+        self.path = parent + (self.name,)
+        stack.append(self.path)
+        self.t0 = time.time()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        delta = time.time() - self.t0
+        local = self.profiler._local
+        local.stack.pop()
+        records = local.records
+        r = records.get(self.path)
+        if r is None:
+            r = records[self.path] = _SpanRecord(self.profiler.capacity)
+        r.count += 1
+        r.total += delta
+        r.samples.append(delta)
+
+
+class _SpanRecord(object):
+    __slots__ = ['count', 'total', 'samples']
+
+    def __init__(self, capacity):
+        self.count = 0
+        self.total = 0.0
+        # the last durations, for the percentiles
+        self.samples = deque(maxlen=capacity)
+
+
+class ProfileNode(object):
+    """
+        A node of the call tree returned by Profiler.get_tree().
+
+        count, total (seconds) and the percentiles of the duration are
+        aggregated over all the threads; self_time is the total minus
+        the total of the children.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.samples = []
+        self.children = {}
+
+    @property
+    def self_time(self):
+        return max(0.0, self.total - sum(c.total for c in self.children.values()))
+
+    def percentiles(self, ps=(50, 95, 99)):
+        if not self.samples:
+            return [None] * len(ps)
+        return [float(_) for _ in np.percentile(self.samples, ps)]
+
+    def get_sorted_children(self):
+        """ Returns the children by decreasing total time. """
+        return sorted(self.children.values(), key=lambda c: -c.total)
+
+
+class Profiler(object):
+    """
+        A hierarchical profiler.
+
+        Spans are opened with
+
+            with profiler.span('name'):
+                ...
+
+        Each thread has its own stack of spans, so nested spans in
+        different threads do not interfere. The durations (wall time)
+        are aggregated by path in the call tree (get_tree(),
+        format_tree()), with count, total and percentiles (of the last
+        "capacity" durations), and can be exported in the "collapsed
+        stacks" format of flamegraph.pl (get_flamegraph_lines(),
+        write_flamegraph()).
+
+        When the profiler is disabled, span() only checks the attribute
+        "enabled" and returns a shared no-op context manager.
+    """
+
+    def __init__(self, enabled=False, capacity=200):
+        self.enabled = enabled
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # the records of all the threads (one dict per thread)
+        self._all_records = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name)
+
+    def reset(self):
+        """ Forgets the spans recorded so far (the open ones are recorded when closed). """
+        with self._lock:
+            for records in self._all_records:
+                records.clear()
+
+    def _get_local(self):
+        local = self._local
+        try:
+            local.stack
+        except AttributeError:
+            local.stack = []
+            local.records = {}
+            with self._lock:
+                self._all_records.append(local.records)
+        return local
+
+    def get_tree(self):
+        """ Returns the root ProfileNode of the call tree (the root has no data). """
+        root = ProfileNode('root')
+        with self._lock:
+            all_records = list(self._all_records)
+        for records in all_records:
+            # (the other threads might be adding records)
+            for path, r in list(records.items()):
+                node = root
+                for name in path:
+                    if not name in node.children:
+                        node.children[name] = ProfileNode(name)
+                    node = node.children[name]
+                node.count += r.count
+                node.total += r.total
+                node.samples.extend(list(r.samples))
+        return root
+
+    def format_tree(self, min_total=0.0):
+        """
+            Returns a text summary of the call tree, omitting the
+            subtrees with total time less than min_total seconds.
+        """
+        lines = []
+        lines.append('%-50s %8s %12s %10s %10s %10s %10s' %
+                     ('span', 'count', 'total', 'mean', 'p50', 'p95', 'p99'))
+
+        def ms(x):
+            return '-' if x is None else '%.2f ms' % (x * 1000)
+
+        def visit(node, depth):
+            for child in node.get_sorted_children():
+                if child.total < min_total:
+                    continue
+                name = '  ' * depth + child.name
+                mean = child.total / child.count if child.count else None
+                p50, p95, p99 = child.percentiles()
+                lines.append('%-50s %8d %12s %10s %10s %10s %10s' %
+                             (name, child.count, ms(child.total), ms(mean),
+                              ms(p50), ms(p95), ms(p99)))
+                visit(child, depth + 1)
+
+        visit(self.get_tree(), 0)
+        return '\n'.join(lines)
+
+    def get_flamegraph_lines(self):
+        """
+            Returns the call tree in the "collapsed stacks" format used by
+            flamegraph.pl: one line "a;b;c N" for each path, where N is
+            the self time in microseconds.
+        """
+        lines = []
+
+        def visit(node, prefix):
+            for child in node.get_sorted_children():
+                path = prefix + [child.name.replace(';', ':').replace(' ', '_')]
+                us = int(round(child.self_time * 1e6))
+                if us > 0:
+                    lines.append('%s %d' % (';'.join(path), us))
+                visit(child, path)
+
+        visit(self.get_tree(), [])
+        return lines
+
+    def write_flamegraph(self, filename):
+        """ Writes the output of get_flamegraph_lines() to a file. """
+        with open(filename, 'w') as f:
+            for line in self.get_flamegraph_lines():
+                f.write(line + '\n')
+        logger.info('Profiler: written %s' % filename)
+
+    def install_signal_handler(self, filename, signum=signal.SIGUSR1):
+        """
+            Writes the flame graph data to filename when the process
+            receives the signal, for example with
+
+                kill -USR1 <pid>
+        """
+        def handler(_signum, _frame):
+            try:
+                self.write_flamegraph(filename)
+            except Exception as e:
+                logger.error('Profiler: could not write %s: %s' % (filename, e))
+        signal.signal(signum, handler)
+
+
+def _enabled_from_environment():
+    v = os.environ.get(DuckietownConstants.DUCKIETOWN_PROFILER_variable, '')
+    return v not in ['', '0']
+
+
+# The profiler that is fed by timeit_clock() and timeit_wall();
+# enabled if the environment variable DUCKIETOWN_PROFILER is set to 1.
+profiler = Profiler(enabled=_enabled_from_environment())
@@ -1,7 +1,9 @@
 from contextlib import contextmanager
+import threading
 import time
 
 from .constants import DuckietownConstants
+from .profiler import profiler
 
 __all__ = [
     'rospy_timeit_clock',
@@ -29,39 +31,62 @@ def rospy_timeit_wall(s):
     rospy.loginfo('%10d ms: %s' % (1000 * delta, s))
 
 
-class Stack(object):
-    stack = []
+class _TimeitLocal(threading.local):
+    # nesting level of timeit_generic() in this thread (for the indentation)
+    depth = 0
 
 
-@contextmanager
-def timeit_generic(desc, minimum, time_function):
-#     logger.debug('timeit %s ...' % desc)
-    Stack.stack.append(desc)
-    t0 = time_function()
-    yield
-    t1 = time_function()
-    delta = t1 - t0
-    Stack.stack.pop()
-    if minimum is not None:
-        if delta < minimum:
+_timeit_local = _TimeitLocal()
+
+
+class timeit_generic(object):
+    """
+        Context manager that measures the time taken by the block,
+        and prints it if DuckietownConstants.show_timeit_benchmarks is set
+        or if it is more than "minimum" seconds.
+
+        The block is also a span of the profiler (see profiler.py),
+        named "desc"; "details" are printed but are not part of the name,
+        so that the spans can be aggregated.
+    """
+    __slots__ = ['desc', 'minimum', 'time_function', 'details', 'span', 'show', 't0']
+
+    def __init__(self, desc, minimum, time_function, details=None):
+        self.desc = desc
+        self.minimum = minimum
+        self.time_function = time_function
+        self.details = details
+
+    def __enter__(self):
+        self.span = profiler.span(self.desc)
+        self.span.__enter__()
+        self.show = DuckietownConstants.show_timeit_benchmarks or (self.minimum is not None)
+        if self.show:
+            _timeit_local.depth += 1
+            self.t0 = self.time_function()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.show:
+            t1 = self.time_function()
+            delta = t1 - self.t0
+            _timeit_local.depth -= 1
+        self.span.__exit__(exc_type, exc_value, tb)
+        if not self.show:
             return
-    if DuckietownConstants.show_timeit_benchmarks or (minimum is not None):
-        pre = '   ' * len(Stack.stack)
+        if self.minimum is not None:
+            if delta < self.minimum:
+                return
+        pre = '   ' * _timeit_local.depth
+        desc = self.desc
+        if self.details is not None:
+            desc += ' (%s)' % self.details
         msg = 'timeit_clock: %s %6.2f ms  for %s' % (pre, delta * 1000, desc)
-#        t0 = time_function()
         print(msg)
-#        t1 = time_function()
-#        delta = t1 - t0
 
 
-@contextmanager
-def timeit_clock(desc, minimum=None):
-    with timeit_generic(desc=desc, minimum=minimum, time_function=time.clock):
-        yield
+def timeit_clock(desc, minimum=None, details=None):
+    return timeit_generic(desc=desc, minimum=minimum, time_function=time.clock, details=details)
 
 
-@contextmanager
-def timeit_wall(desc, minimum=None):
-    with timeit_generic(desc=desc, minimum=minimum, time_function=time.time) as f:
-        yield f
-
+def timeit_wall(desc, minimum=None, details=None):
+    return timeit_generic(desc=desc, minimum=minimum, time_function=time.time, details=details)
@@ -1,3 +1,6 @@
 from . import hierarchy
 from . import colors
 from . import fuzzy_match_test
+from . import latest_frame
+from . import profiler
+from . import jpg_resized
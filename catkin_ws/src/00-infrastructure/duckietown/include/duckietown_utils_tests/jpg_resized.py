@@ -0,0 +1,28 @@
+import cv2
+
+import duckietown_utils as dtu
+import numpy as np
+
+
+def smooth_image(H=480, W=640):
+    y, x = np.mgrid[0:H, 0:W]
+    bgr = np.dstack([x * 255.0 / W, y * 255.0 / H, (x + y) * 127.0 / (H + W)])
+    return bgr.astype('uint8')
+
+
+@dtu.unit_test
+def jpg_resized_same_as_resize():
+    bgr = smooth_image()
+    data = dtu.jpg_from_bgr(bgr)
+    full = dtu.bgr_from_jpg(data)
+    for scale in [1.0, 0.5, 0.2, 0.1]:
+        res = dtu.bgr_from_jpg_resized(data, scale)
+        expected = cv2.resize(full, (0, 0), fx=scale, fy=scale)
+        assert res.shape == expected.shape, (scale, res.shape, expected.shape)
+        # the same up to the difference between the two ways of resizing
+        diff = np.abs(res.astype('int32') - expected)
+        assert np.mean(diff) < 3, (scale, np.mean(diff))
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import duckietown_utils as dtu
+
+
+def wait_until(condition, timeout=5.0):
+    t0 = time.time()
+    while not condition():
+        if time.time() - t0 > timeout:
+            raise Exception('Timeout')
+        time.sleep(0.001)
+
+
+@dtu.unit_test
+def latest_frame_keeps_newest():
+    processed = []
+    dropped = []
+    release = threading.Event()
+
+    def process(item):
+        release.wait()
+        processed.append(item)
+
+    worker = dtu.LatestFrameWorker(process=process, on_drop=dropped.append)
+    worker.put(1)
+    # wait for the worker to pick up 1
+    wait_until(lambda: worker.get_stats().processed == 1)
+    # these replace each other in the mailbox
+    for i in [2, 3, 4]:
+        worker.put(i)
+    release.set()
+    wait_until(worker.is_idle)
+
+    assert processed == [1, 4], processed
+    assert dropped == [2, 3], dropped
+    stats = worker.get_stats()
+    assert stats.received == 4
+    assert stats.processed == 2
+    assert stats.dropped == 2
+    assert stats.last_queue_latency >= 0
+    worker.shutdown()
+
+
+@dtu.unit_test
+def latest_frame_survives_errors():
+    processed = []
+
+    def process(item):
+        if item == 'bad':
+            raise ValueError(item)
+        processed.append(item)
+
+    worker = dtu.LatestFrameWorker(process=process)
+    worker.put('bad')
+    wait_until(worker.is_idle)
+    worker.put('good')
+    wait_until(worker.is_idle)
+    assert processed == ['good'], processed
+    worker.shutdown()
+
+    try:
+        worker.put('late')
+    except ValueError:
+        pass
+    else:
+        raise Exception('Expected ValueError after shutdown()')
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
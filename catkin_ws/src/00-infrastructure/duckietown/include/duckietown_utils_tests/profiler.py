@@ -0,0 +1,113 @@
+import threading
+import time
+
+import duckietown_utils as dtu
+from duckietown_utils.profiler import Profiler
+
+
+@dtu.unit_test
+def profiler_disabled_is_noop():
+    p = Profiler(enabled=False)
+    a = p.span('a')
+    b = p.span('b')
+    assert a is b
+    with a:
+        pass
+    assert not p.get_tree().children
+
+
+@dtu.unit_test
+def profiler_call_tree():
+    p = Profiler(enabled=True)
+    for _ in range(3):
+        with p.span('a'):
+            with p.span('b'):
+                time.sleep(0.001)
+            with p.span('c'):
+                with p.span('b'):
+                    time.sleep(0.001)
+    with p.span('b'):
+        time.sleep(0.001)
+
+    root = p.get_tree()
+    assert sorted(root.children) == ['a', 'b']
+    a = root.children['a']
+    assert a.count == 3
+    assert sorted(a.children) == ['b', 'c']
+    assert a.children['b'].count == 3
+    assert a.children['c'].children['b'].count == 3
+    assert root.children['b'].count == 1
+    assert a.total >= a.children['b'].total + a.children['c'].total
+    p50, p95, p99 = a.percentiles()
+    assert p50 <= p95 <= p99
+
+    s = p.format_tree()
+    assert 'a' in s and 'p99' in s
+
+    # path -> self time in microseconds
+    self_us = {}
+    for line in p.get_flamegraph_lines():
+        path, us = line.rsplit(' ', 1)
+        self_us[path] = int(us)
+    assert set(['a;b', 'a;c;b', 'b']) <= set(self_us), self_us
+    assert set(self_us) <= set(['a', 'a;b', 'a;c', 'a;c;b', 'b']), self_us
+    assert self_us['a;c;b'] >= 3000
+
+    def total_us(path):
+        # the time of a path includes the time of its children
+        return sum(us for p2, us in self_us.items()
+                   if p2 == path or p2.startswith(path + ';'))
+
+    assert total_us('a') >= total_us('a;b') + total_us('a;c')
+    assert total_us('a;c') >= total_us('a;c;b')
+    # and it matches the call tree, up to the rounding to microseconds
+    assert abs(total_us('a') - a.total * 1e6) <= len(self_us)
+
+    p.reset()
+    assert not any(c.count for c in p.get_tree().children.values())
+
+
+@dtu.unit_test
+def profiler_threads_have_own_stacks():
+    p = Profiler(enabled=True)
+    started = threading.Event()
+    release = threading.Event()
+
+    def worker():
+        with p.span('worker'):
+            started.set()
+            release.wait()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    started.wait()
+    # the span of the other thread is open, but this is not its child
+    with p.span('main'):
+        pass
+    release.set()
+    t.join()
+
+    root = p.get_tree()
+    assert sorted(root.children) == ['main', 'worker']
+    assert not root.children['worker'].children
+
+
+@dtu.unit_test
+def profiler_fed_by_timeit():
+    enabled = dtu.profiler.enabled
+    dtu.profiler.enable()
+    dtu.profiler.reset()
+    try:
+        with dtu.timeit_clock('outer'):
+            for i in range(2):
+                with dtu.timeit_wall('inner', details='%d' % i):
+                    pass
+    finally:
+        dtu.profiler.enabled = enabled
+    outer = dtu.profiler.get_tree().children['outer']
+    assert outer.count == 1
+    assert outer.children['inner'].count == 2
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -1,7 +1,7 @@
 from UserDict import UserDict
 from contextlib import contextmanager
+import os
 import rospy
-import threading
 
 import duckietown_utils as dtu
 
@@ -9,6 +9,7 @@ from .node_description.configuration import PROCESS_THREADED, PROCESS_SYNCHRONOU
 from .node_description.configuration import load_configuration_package_node
 from .user_config.decide import get_user_configuration
 from .utils.timing import ProcessingTimingStats
+from .utils.diagnostics import TimingDiagnosticsPublisher
 
 
 __all__ = [
@@ -57,6 +58,7 @@ class EasyNode(object):
         self._init_publishers()
         self._init_parameters()
         self._init_subscriptions()
+        self._init_diagnostics()
         self.info(self._configuration)
 
     def _init_subscriptions(self):
@@ -71,8 +73,12 @@ class EasyNode(object):
                 self.sub = sub
                 self.pts = ProcessingTimingStats()
 
-            def init_threaded(self):
-                self.thread_lock = threading.Lock()
+            def init_threaded(self, process, name):
+                # a single worker that always processes the newest message
+                def on_drop(_data):
+                    self.pts.decided_to_skip()
+                self.worker = dtu.LatestFrameWorker(process=process, name=name,
+                                                    on_drop=on_drop)
 
         class Callback():
             def __init__(self, node, subscription):
@@ -85,6 +91,17 @@ class EasyNode(object):
                 self.node._sub_callback(
                     self.subscription, subscriber_proxy, data)
 
+        class ThreadedCallback():
+            def __init__(self, node, callback_name, subscription, subscriber_proxy):
+                self.node = node
+                self.callback_name = callback_name
+                self.subscription = subscription
+                self.subscriber_proxy = subscriber_proxy
+
+            def __call__(self, data):
+                self.node._sub_callback_threaded(self.callback_name, self.subscription,
+                                                 self.subscriber_proxy, data)
+
         for s in subscriptions.values():
             callback = Callback(node=self, subscription=s)
             S = rospy.Subscriber(s.topic, s.type, callback, # @UndefinedVariable
@@ -94,7 +111,20 @@ class EasyNode(object):
 
             self.info('Subscribed to %s' % s.topic)
             if s.process == PROCESS_THREADED:
-                sp.init_threaded()
+                callback_name = 'on_received_%s' % s.name
+                process = ThreadedCallback(node=self, callback_name=callback_name,
+                                           subscription=s, subscriber_proxy=sp)
+                sp.init_threaded(process, name='%s:%s' % (self.node_type_name, s.name))
+
+    def _init_diagnostics(self):
+        """ Publishes the timing statistics of the subscriptions on /diagnostics. """
+        interval = self.config.en_diagnostics_interval
+        if not interval or interval <= 0:
+            return
+        self.diagnostics = TimingDiagnosticsPublisher(interval, hardware_id=rospy.get_name())  # @UndefinedVariable
+        for s in self._configuration.subscriptions.values():
+            sp = getattr(self.subscribers, s.name)
+            self.diagnostics.add('%s: %s' % (self.node_type_name, s.name), sp.pts)
 
     def _sub_callback(self, subscription, subscriber_proxy, data):
         subscriber_proxy.pts.received_message(data)
@@ -105,12 +135,9 @@ class EasyNode(object):
                 subscriber_proxy.pts.decided_to_process(data)
                 self._call_callback(callback_name, subscription, data)
             elif subscription.process == PROCESS_THREADED:
-                # Start a daemon thread to process the image
-                target = self._sub_callback_threaded
-                args = (callback_name, subscription, subscriber_proxy, data)
-                thread = threading.Thread(target=target, args=args)
-                thread.setDaemon(True)
-                thread.start()
+                # The worker processes the newest message; if it is busy,
+                # this replaces (and skips) the one waiting.
+                subscriber_proxy.worker.put(data)
             else:
                 assert False, subscription.process
         else:
@@ -130,22 +157,18 @@ class EasyNode(object):
                     yield
 
             def get_stats(self):
-                return self.sp.pts.get_stats()
+                s = self.sp.pts.get_stats()
+                if hasattr(self.sp, 'worker'):
+                    s += '\nworker: ' + self.sp.worker.info()
+                return s
 
         context = Context(self, subscription)
         return context
 
     def _sub_callback_threaded(self, callback_name, subscription, subscriber_proxy, data):
-        if not subscriber_proxy.thread_lock.acquire(False):
-            # TODO self.stats.skipped()
-            subscriber_proxy.pts.decided_to_skip()
-            return
-        try:
-            subscriber_proxy.pts.decided_to_process(data)
-            self._call_callback(callback_name, subscription, data)
-        finally:
-            # Release the thread lock
-            subscriber_proxy.thread_lock.release()
+        # called by the subscriber's worker thread
+        subscriber_proxy.pts.decided_to_process(data)
+        self._call_callback(callback_name, subscription, data)
 
     def _call_callback(self, callback_name, subscription, data):
         c = getattr(self, callback_name)
@@ -256,6 +279,11 @@ class EasyNode(object):
 
     def spin(self):
         rospy.on_shutdown(self.on_shutdown)  # @UndefinedVariable
+        if dtu.profiler.enabled:
+            # "kill -USR1 <pid>" writes the profile in the flamegraph.pl format
+            fn = os.path.join(dtu.get_dt_tmp_dir(), '%s.flamegraph.txt' % self.node_type_name)
+            dtu.profiler.install_signal_handler(fn)
+            self.info('Profiler enabled: send SIGUSR1 to write %s' % fn)
         self._init()
         self.on_init()
         rospy.spin()  # @UndefinedVariable
@@ -0,0 +1,54 @@
+import threading
+
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+import rospy
+
+__all__ = [
+    'TimingDiagnosticsPublisher',
+    'get_timing_diagnostic_status',
+]
+
+
+def get_timing_diagnostic_status(name, pts, hardware_id=''):
+    """ Returns a DiagnosticStatus with the summary of a ProcessingTimingStats. """
+    status = DiagnosticStatus()
+    status.level = DiagnosticStatus.OK
+    status.name = name
+    status.hardware_id = hardware_id
+    status.message = 'timing statistics'
+    status.values = [KeyValue(key=k, value=v) for k, v in pts.get_summary()]
+    return status
+
+
+class TimingDiagnosticsPublisher(object):
+    """
+        Publishes periodically the statistics of a set of ProcessingTimingStats
+        on the /diagnostics topic, as one DiagnosticArray.
+
+            diagnostics = TimingDiagnosticsPublisher(interval=5.0)
+            diagnostics.add('line_detector_node image', pts)
+    """
+
+    def __init__(self, interval, hardware_id=''):
+        self.hardware_id = hardware_id
+        self._lock = threading.Lock()
+        # list of (name, ProcessingTimingStats)
+        self._stats = []
+        self._pub = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
+        self._timer = rospy.Timer(rospy.Duration.from_sec(interval), self._publish)
+
+    def add(self, name, pts):
+        with self._lock:
+            self._stats.append((name, pts))
+
+    def _publish(self, _event=None):
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.Time.now()
+        with self._lock:
+            stats = list(self._stats)
+        msg.status = [get_timing_diagnostic_status(name, pts, self.hardware_id)
+                      for name, pts in stats]
+        self._pub.publish(msg)
+
+    def shutdown(self):
+        self._timer.shutdown()
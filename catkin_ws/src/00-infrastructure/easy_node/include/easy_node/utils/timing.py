@@ -1,11 +1,14 @@
 from collections import defaultdict
 from contextlib import contextmanager
+import threading
 import time
 import duckietown_utils as dtu
+import numpy as np
 
 
 __all__ = [
     'ProcessingTimingStats',
+    'SingleStat',
 ]
 
 class ProcessingTimingStats(object):
@@ -49,17 +52,25 @@ class ProcessingTimingStats(object):
                 ...
                 
         A call to reset() resets all counters.
+
+        phase() can be called from several threads at once.
+
+        Each statistic keeps only the last "capacity" samples (see SingleStat),
+        so the memory used does not grow; the percentiles and fps are computed
+        on those.
     """
     
-    def __init__(self):
+    def __init__(self, capacity=1000):
         self.num_resets = 0
+        self.capacity = capacity
+        self._lock = threading.Lock()
         self.reset()
         
     def reset(self):
         self.events = []
         self.last_msg_received = None
         self.last_msg_being_processed = None
-        self.stats = defaultdict(lambda: SingleStat())
+        self.stats = defaultdict(lambda: SingleStat(self.capacity))
         self.phase_names = []
         
     def received_message(self, msg=None):
@@ -88,8 +99,9 @@ class ProcessingTimingStats(object):
     @contextmanager
     def phase(self, phase_name):
         with dtu.timeit_clock(phase_name): 
-            if not phase_name in self.phase_names:
-                self.phase_names.append(phase_name)
+            with self._lock:
+                if not phase_name in self.phase_names:
+                    self.phase_names.append(phase_name)
             if self.last_msg_being_processed is None:
                 msg = 'Did not call decided_to_process() before?'
                 raise ValueError(msg)
@@ -108,10 +120,35 @@ class ProcessingTimingStats(object):
                 delta_wall = t2 - t1
                 latency_from_acquisition = t2 - self.last_msg_being_processed
     
+            self.record_phase(phase_name, delta_wall, delta_clock, latency_from_acquisition)
+
+    def record_phase(self, phase_name, delta_wall, delta_clock, latency_from_acquisition):
+        """ Records the durations of a phase timed elsewhere (see phase()). """
+        with self._lock:
+            if not phase_name in self.phase_names:
+                self.phase_names.append(phase_name)
             self.stats[(phase_name, 'clock')].sample(delta_clock)
             self.stats[(phase_name, 'wall')].sample(delta_wall)
             self.stats[(phase_name, 'latency')].sample(latency_from_acquisition)
-    
+
+    def get_summary(self):
+        """
+            Returns the statistics as a list of (name, value) strings,
+            e.g. for a diagnostic_msgs/DiagnosticStatus.
+        """
+        values = []
+        for name in ['received', 'processed', 'skipped']:
+            values.append(('%s fps' % name, '%.1f' % self.stats[name].rate()))
+            values.append(('%s' % name, '%d' % self.stats[name].num()))
+        with self._lock:
+            phase_names = list(self.phase_names)
+        for phase_name in phase_names:
+            for what in ['wall', 'latency']:
+                stat = self.stats[(phase_name, what)]
+                for p, v in zip(PERCENTILES, stat.percentiles(PERCENTILES)):
+                    values.append(('%s %s p%d' % (phase_name, what, p), dtu.seconds_as_ms(v)))
+        return values
+
     def get_stats(self):
         s = ""
         stats = self.stats
@@ -129,7 +166,7 @@ class ProcessingTimingStats(object):
                 skipped_percentage, 
             )
         
-        l = max(len(_) for _ in self.phase_names)
+        l = max([len(_) for _ in self.phase_names] + [0])
         for phase_name in self.phase_names:
             stats_clock = self.stats[(phase_name, 'clock')]
             stats_wall = self.stats[(phase_name, 'wall')]
@@ -138,8 +175,9 @@ class ProcessingTimingStats(object):
             total_latency = dtu.seconds_as_ms(stats_latency.last_value())
             delta_wall = dtu.seconds_as_ms(stats_wall.last_value())
             delta_clock = dtu.seconds_as_ms(stats_clock.last_value())
-            msg = ('%s | total latency %10s | delta wall %10s | delta clock %10s' %
-                   (phase_name.ljust(l), total_latency, delta_wall, delta_clock))
+            p_wall = ' '.join(dtu.seconds_as_ms(_) for _ in stats_wall.percentiles(PERCENTILES))
+            msg = ('%s | total latency %10s | delta wall %10s | delta clock %10s | wall p50/p95/p99 %s' %
+                   (phase_name.ljust(l), total_latency, delta_wall, delta_clock, p_wall))
             s += '\n' + msg
         return s
 #                 acquired | total latency 49737091899.9ms | delta wall     None clock     None
@@ -153,42 +191,92 @@ class ProcessingTimingStats(object):
 #               pub_image | total latency 49737091909.8ms | delta wall    0.1ms clock    0.1ms
 #    pub_edge/pub_segment | total latency 49737091910.8ms | delta wall    1.1ms clock    1.1ms
    
+PERCENTILES = [50, 95, 99]
+
+
 class SingleStat(object):
-    
-    def __init__(self):
-        self.times = []
-        self.values = []
-    
+    """
+        Samples (time, value) of a statistic, in a ring buffer that keeps
+        the last "capacity" ones. sample() is O(1); value None is stored
+        as NaN.
+
+        num() and duration() count from the first sample; rate(), fps()
+        and percentiles() use the samples in the buffer.
+    """
+
+    def __init__(self, capacity=1000):
+        assert capacity >= 1, capacity
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype='float64')
+        self.values = np.zeros(capacity, dtype='float64')
+        self.n = 0
+        self.t_first = None
+
     def sample(self, v=None):
 #         t = rospy.get_time()  # @UndefinedVariable
         t = time.time()
-        self.times.append(t)
-        self.values.append(v)
+        if self.n == 0:
+            self.t_first = t
+        i = self.n % self.capacity
+        self.times[i] = t
+        self.values[i] = np.nan if v is None else v
+        self.n += 1
 
     def last_value(self):
-        if self.values:
-            return self.values[-1]
-        else:
+        if self.n == 0:
             return None
-    
+        v = self.values[(self.n - 1) % self.capacity]
+        if np.isnan(v):
+            return None
+        return float(v)
+
     def num(self):
         """ Returns the number of samples. """
-        return len(self.times)
-    
+        return self.n
+
+    def num_kept(self):
+        """ Returns the number of samples in the buffer. """
+        return min(self.n, self.capacity)
+
+    def rate(self):
+        """ Returns the samples per second, in the period covered by the buffer. """
+        k = self.num_kept()
+        if k == 0:
+            return 0.0
+        if self.n <= self.capacity:
+            oldest = self.t_first
+        else:
+            oldest = self.times[self.n % self.capacity]
+        duration = time.time() - oldest
+        if duration <= 0:
+            return 0.0
+        return k / duration
+
     def fps(self):
         """ Returns the frames per second as a string. """
-        n = self.num()
-        if n == 0:
+        if self.num() == 0:
             return '0 fps'
         else:
-            duration = self.duration()
-            f = n / duration
-            return '%.1f fps' % f
-             
+            return '%.1f fps' % self.rate()
+
     def duration(self):
+        if self.t_first is None:
+            return 0.0
         delta = time.time()
-        return delta - self.times[0]
-    
+        return delta - self.t_first
+
+    def percentiles(self, ps=PERCENTILES):
+        """
+            Returns the list of percentiles of the values in the buffer
+            (None if there are none).
+        """
+        values = self.values[:self.num_kept()]
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return [None] * len(ps)
+        return [float(_) for _ in np.percentile(values, ps)]
+
+
 def get_percentage(i, n):
     if n == 0: 
         return '0 %'
@@ -1,2 +1,3 @@
 from . import summary
 from . import test_configuration 
+from . import timing
@@ -0,0 +1,61 @@
+import duckietown_utils as dtu
+from easy_node.utils.timing import ProcessingTimingStats, SingleStat
+import numpy as np
+
+
+@dtu.unit_test
+def single_stat_ring_buffer():
+    s = SingleStat(capacity=10)
+    assert s.num() == 0
+    assert s.last_value() is None
+    assert s.percentiles([50]) == [None]
+    assert s.fps() == '0 fps'
+
+    for i in range(25):
+        s.sample(float(i))
+    # all the samples are counted, only the last 10 are kept
+    assert s.num() == 25
+    assert s.num_kept() == 10
+    assert s.times.shape == (10,)
+    assert s.last_value() == 24.0
+    p50, p100 = s.percentiles([50, 100])
+    assert p50 == np.median(np.arange(15, 25))
+    assert p100 == 24.0
+    assert s.rate() > 0
+
+    # None values are counted but not used for the percentiles
+    s.sample()
+    assert s.last_value() is None
+    assert s.percentiles([100]) == [24.0]
+
+
+@dtu.unit_test
+def processing_timing_stats_percentiles():
+    pts = ProcessingTimingStats(capacity=100)
+    pts.reset()
+    for i in range(1000):
+        pts.received_message()
+        pts.decided_to_process()
+        pts.record_phase('detection', delta_wall=0.001 * (i % 100),
+                         delta_clock=0.0, latency_from_acquisition=0.1)
+        with pts.phase('publishing'):
+            pass
+
+    assert pts.phase_names == ['detection', 'publishing']
+    assert pts.stats['received'].num() == 1000
+    assert pts.stats[('detection', 'wall')].num_kept() == 100
+    p50, p95, p99 = pts.stats[('detection', 'wall')].percentiles()
+    assert abs(p50 - 0.0495) < 1e-9
+    assert abs(p99 - 0.09801) < 1e-9
+
+    summary = dict(pts.get_summary())
+    assert summary['processed'] == '1000'
+    assert summary['detection wall p95'] == dtu.seconds_as_ms(p95)
+    assert 'publishing latency p99' in summary
+
+    s = pts.get_stats()
+    assert 'wall p50/p95/p99' in s
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -2,7 +2,7 @@
 from anti_instagram.kmeans_rebuild import *
 from anti_instagram.calcLstsqTransform import *
 from anti_instagram.simpleColorBalanceClass import *
-from .scale_and_shift import scaleandshift
+from .scale_and_shift import scaleandshift, scaleandshift_lut
 import numpy as np
 import rospy
 import time
@@ -39,13 +39,20 @@ class AntiInstagram():
         self.KM = None
         self.CB = simpleColorBalanceClass()
 
+        # lookup tables, rebuilt when the parameters change:
+        # name -> (parameters, table)
+        self._luts = {}
+
     def setScaleShift(self, scale, shift):
         self.scale = scale
         self.shift = shift
 
 
-    def setupKM(self, numCenters, blurAlg, resize, blurKer):
-        self.KM = kMeansClass(numCenters, blurAlg, resize, blurKer)
+    def setupKM(self, numCenters, blurAlg, resize, blurKer, time_budget=None):
+        self.KM = kMeansClass(numCenters, blurAlg, resize, blurKer, time_budget=time_budget)
+
+    def setupCB(self, subsample, smoothing):
+        self.CB = simpleColorBalanceClass(subsample, smoothing)
 
 
     def calculateColorBalanceThreshold(self, img, CBpercent):
@@ -129,6 +136,9 @@ class AntiInstagram():
 
     def applyTransform(self, image):
         # apply linear trafo
+        if image.dtype == np.uint8:
+            # same result, with one cv2.LUT pass
+            return cv2.LUT(image, self.getTransformLUT())
         corrected_image = scaleandshift(image, self.scale, self.shift)
         # clip image to [0,255]
         corrected_image_clipped = np.clip(
@@ -137,11 +147,99 @@ class AntiInstagram():
 
     def applyColorBalance(self, img, ThLow, ThHi):
         # apply color balance
-#
-        corrected_image = self.applyTrafo(img, ThLow, ThHi)
-#
-        return corrected_image
-
+        # (same result as applyTrafo(), with one cv2.LUT pass)
+        lut = self.getColorBalanceLUT(ThLow, ThHi, get_channel_ranges(img))
+        return cv2.LUT(img, lut)
+
+    def applyColorBalanceThresholds(self, img, ThLow, ThHi):
+        """
+            Like applyColorBalance(), but maps [ThLow, ThHi] to [0, 255]
+            for each channel, instead of stretching the min and max of the
+            thresholded image. The two are the same if the image has values
+            outside of the thresholds; this one does not depend on which part
+            of the image is used, so it can be applied after resizing and
+            cropping.
+        """
+        lut = self.getColorBalanceLUT(ThLow, ThHi, None)
+        return cv2.LUT(img, lut)
+
+    def applyCorrection(self, img, trafo_mode='both', stretch_image=True):
+        """
+            Applies the color balance with the current thresholds
+            (if trafo_mode is 'cb' or 'both') and then the linear trafo
+            (if trafo_mode is 'lin' or 'both'), in one cv2.LUT pass.
+
+            With stretch_image the color balance is the one of
+            applyColorBalance(), otherwise the one of
+            applyColorBalanceThresholds().
+        """
+        do_cb = trafo_mode in ['cb', 'both']
+        do_lin = trafo_mode in ['lin', 'both']
+        if do_cb and do_lin:
+            ranges = get_channel_ranges(img) if stretch_image else None
+            cb = self.getColorBalanceLUT(self.ThLow, self.ThHi, ranges)
+            lin = self.getTransformLUT()
+            # keyed by the parameters of the two tables, not by their id():
+            # the id of a freed table can be reused by a new one
+            key = (color_balance_lut_key(self.ThLow, self.ThHi, ranges),
+                   transform_lut_key(self.scale, self.shift))
+
+            def f():
+                # lin(cb(x)) for each channel
+                combined = np.empty_like(cb)
+                for i in range(3):
+                    combined[:, 0, i] = lin[cb[:, 0, i], 0, i]
+                return combined
+
+            lut = self._get_lut('correction', key, f)
+            return cv2.LUT(img, lut)
+        elif do_cb:
+            if stretch_image:
+                return self.applyColorBalance(img, self.ThLow, self.ThHi)
+            else:
+                return self.applyColorBalanceThresholds(img, self.ThLow, self.ThHi)
+        elif do_lin:
+            return self.applyTransform(img)
+        else:
+            return img
+
+    def getTransformLUT(self):
+        """ The (256, 1, 3) lookup table for the linear trafo. """
+        key = transform_lut_key(self.scale, self.shift)
+        return self._get_lut('transform', key,
+                             lambda: scaleandshift_lut(self.scale, self.shift))
+
+    def getColorBalanceLUT(self, ThLow, ThHi, ranges):
+        """
+            The (256, 1, 3) lookup table for the color balance.
+
+            ranges is a list of (min, max) of each channel of the image,
+            or None to stretch the thresholds to [0, 255].
+        """
+        key = color_balance_lut_key(ThLow, ThHi, ranges)
+
+        def f():
+            x = np.arange(256, dtype=np.uint8)
+            lut = np.empty((256, 1, 3), dtype=np.uint8)
+            for idx in range(3):
+                # same thresholding as applyTrafo()
+                thresholded = self.apply_threshold(x, ThLow[idx], ThHi[idx])
+                if ranges is None:
+                    low, high = thresholded[0], thresholded[255]
+                else:
+                    low, high = thresholded[ranges[idx][0]], thresholded[ranges[idx][1]]
+                lut[:, 0, idx] = normalize_minmax_lut(thresholded, low, high)
+            return lut
+
+        return self._get_lut('color_balance', key, f)
+
+    def _get_lut(self, name, key, f):
+        cached = self._luts.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        lut = f()
+        self._luts[name] = (key, lut)
+        return lut
 
     def applyTrafo(self, img, ThLow = [], ThHi = []):
         if ThLow == [] and ThHi == []:
@@ -170,3 +268,34 @@ class AntiInstagram():
     def apply_mask(self, matrix, mask, fill_value):
         masked = np.ma.array(matrix, mask=mask, fill_value=fill_value)
         return masked.filled()
+
+
+def transform_lut_key(scale, shift):
+    """ The cache key of AntiInstagram.getTransformLUT(). """
+    return (tuple(map(float, scale)), tuple(map(float, shift)))
+
+
+def color_balance_lut_key(ThLow, ThHi, ranges):
+    """ The cache key of AntiInstagram.getColorBalanceLUT(). """
+    return (tuple(map(float, ThLow)), tuple(map(float, ThHi)),
+            None if ranges is None else tuple(ranges))
+
+
+def get_channel_ranges(img):
+    """ Returns the list of (min, max) of each channel of the image. """
+    mins = cv2.reduce(cv2.reduce(img, 0, cv2.REDUCE_MIN), 1, cv2.REDUCE_MIN)
+    maxs = cv2.reduce(cv2.reduce(img, 0, cv2.REDUCE_MAX), 1, cv2.REDUCE_MAX)
+    return zip(mins.ravel().tolist(), maxs.ravel().tolist())
+
+
+def normalize_minmax_lut(values, low, high):
+    """
+        Same as cv2.normalize(values, None, 0, 255, cv2.NORM_MINMAX) for
+        uint8 values, if low and high are the min and max of the image.
+    """
+    low = float(low)
+    high = float(high)
+    scale = 255.0 * (1.0 / (high - low) if high - low > np.finfo(float).eps else 0)
+    shift = 0 - low * scale
+    y = values.astype(np.float32) * np.float32(scale) + np.float32(shift)
+    return np.clip(np.rint(y), 0, 255).astype(np.uint8)
@@ -6,6 +6,7 @@ logger.setLevel(logging.DEBUG)
 
 from .anti_instagram_imp import *
 from .kmeans import *
+from .color_kmeans import *
 from .utils import *
 from .scale_and_shift import *
 
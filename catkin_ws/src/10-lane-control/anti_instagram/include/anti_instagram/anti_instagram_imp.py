@@ -1,6 +1,6 @@
 import cv2
 from .kmeans import getparameters2, identifyColors, runKMeans
-from .scale_and_shift import scaleandshift
+from .scale_and_shift import scaleandshift, scaleandshift_lut
 from anti_instagram.kmeans import CENTERS, CENTERS2
 import numpy as np
 import duckietown_utils as dtu
@@ -103,17 +103,30 @@ class AntiInstagram(AntiInstagramInterface):
         self.scale = [1.0, 1.0, 1.0]
         self.shift = [0.0, 0.0, 0.0]
         self.health = 0
+        # (scale, shift) -> lookup table for uint8 images
+        self._lut_key = None
+        self._lut = None
     
 #         median_blur = 5
         self.median_blur = median_blur
         
     def applyTransform(self, image):
+        if image.dtype == np.uint8:
+            # same result, with one cv2.LUT pass
+            return cv2.LUT(image, self._get_lut())
         corrected_image = scaleandshift(image, self.scale, self.shift)
         res = np.clip(corrected_image, 0, 255).astype('uint8')
 #         res = cv2.convertScaleAbs(corrected_image).astype('uint8')
 #         print res.dtype
         return res
     
+    def _get_lut(self):
+        key = (tuple(map(float, self.scale)), tuple(map(float, self.shift)))
+        if key != self._lut_key:
+            self._lut = scaleandshift_lut(self.scale, self.shift)
+            self._lut_key = key
+        return self._lut
+
     def calculateTransform(self, image): #, testframe=False):
         if self.median_blur > 0:
             image = cv2.medianBlur(image, self.median_blur)
@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+
+__all__ = [
+    'ColorKMeans',
+]
+
+
+class ColorKMeans(object):
+    """
+        Mini-batch k-means for the colors of uint8 images (N x 3 pixels).
+
+        - The centers are kept between the calls to fit(), which starts
+          from the previous ones (k-means++ on the first call).
+        - Each call uses at most max_samples pixels, and each iteration
+          a random batch of batch_size of them; the centers are moved
+          towards the batch with a per-center learning rate (1 / number
+          of pixels assigned so far in this call).
+        - assign() finds the closest center with a lookup table indexed
+          by the color quantized to 'bits' bits per channel, computed once
+          per set of centers; the batches, that are smaller than the table,
+          are assigned directly.
+        - fit() stops after max_it iterations or when time_budget
+          (seconds) is exceeded, whichever comes first.
+    """
+
+    def __init__(self, num_centers, batch_size=1000, max_samples=20000,
+                 bits=5, time_budget=None, seed=None):
+        assert 1 <= num_centers <= 256, num_centers
+        assert 1 <= bits <= 8, bits
+        self.num_centers = int(num_centers)
+        self.batch_size = int(batch_size)
+        self.max_samples = int(max_samples)
+        self.bits = int(bits)
+        self.time_budget = time_budget
+        self.random = np.random.RandomState(seed)
+        # float64 array (num_centers, 3), or None before the first fit()
+        self.centers = None
+        self._lut = None
+        # the colors of the cells of the lookup table
+        n = 1 << self.bits
+        step = 256 // n
+        c = np.arange(n) * step + (step - 1) / 2.0
+        grid = np.meshgrid(c, c, c, indexing='ij')
+        self._cell_colors = np.column_stack([g.ravel() for g in grid])
+
+    def reset(self):
+        """ Forgets the centers; the next fit() starts from scratch. """
+        self.centers = None
+        self._lut = None
+
+    def set_centers(self, centers):
+        centers = np.array(centers, dtype='float64')
+        assert centers.shape == (self.num_centers, 3), centers.shape
+        self.centers = centers
+        self._lut = None
+
+    def fit(self, pixels, max_it):
+        """
+            Updates the centers with the pixels (array N x 3, uint8).
+            Returns the number of iterations done.
+        """
+        t0 = time.time()
+        pixels = np.asarray(pixels)
+        assert pixels.ndim == 2 and pixels.shape[1] == 3, pixels.shape
+        assert pixels.shape[0] > 0, 'No pixels.'
+        if pixels.shape[0] > self.max_samples:
+            which = self.random.randint(0, pixels.shape[0], self.max_samples)
+            pixels = pixels[which]
+        pixels = pixels.astype('float64')
+
+        if self.centers is None:
+            self.set_centers(kmeanspp_init(pixels, self.num_centers, self.random))
+
+        counts = np.zeros(self.num_centers)
+        it = 0
+        while it < max_it:
+            if pixels.shape[0] > self.batch_size:
+                batch = pixels[self.random.randint(0, pixels.shape[0], self.batch_size)]
+            else:
+                batch = pixels
+            labels = closest_center(batch, self.centers)
+            batch_counts = np.bincount(labels, minlength=self.num_centers).astype('float64')
+            batch_sums = np.zeros((self.num_centers, 3))
+            for i in range(3):
+                batch_sums[:, i] = np.bincount(labels, weights=batch[:, i],
+                                               minlength=self.num_centers)
+            # c <- c + (sum_i (x_i - c)) / counts, over the new pixels x_i
+            counts += batch_counts
+            moved = batch_counts > 0
+            self.centers[moved] += ((batch_sums[moved] -
+                                     batch_counts[moved, np.newaxis] * self.centers[moved]) /
+                                    counts[moved, np.newaxis])
+            self._lut = None
+            it += 1
+
+            if self.time_budget is not None and time.time() - t0 > self.time_budget:
+                break
+        return it
+
+    def assign(self, pixels):
+        """ Returns the index of the closest center for each pixel (N x 3). """
+        codes = self._codes(np.asarray(pixels))
+        return self._get_lut()[codes]
+
+    def _codes(self, pixels):
+        shift = 8 - self.bits
+        q = pixels.astype('int64') >> shift
+        return (q[:, 0] << (2 * self.bits)) | (q[:, 1] << self.bits) | q[:, 2]
+
+    def _get_lut(self):
+        if self._lut is None:
+            self._lut = closest_center(self._cell_colors, self.centers).astype('uint8')
+        return self._lut
+
+
+def closest_center(points, centers):
+    """ Returns the index of the closest center for each point. """
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2; the first term does not matter
+    d = -2 * np.dot(points, centers.T) + np.sum(centers * centers, axis=1)
+    return np.argmin(d, axis=1)
+
+
+def kmeanspp_init(pixels, num_centers, random):
+    """ k-means++ initialization: returns the centers (num_centers x 3). """
+    centers = [pixels[random.randint(pixels.shape[0])]]
+    d2 = np.sum((pixels - centers[0]) ** 2, axis=1)
+    for _ in range(1, num_centers):
+        total = d2.sum()
+        if total > 0:
+            i = np.searchsorted(np.cumsum(d2), random.uniform(0, total))
+            i = min(i, pixels.shape[0] - 1)
+        else:
+            # all the pixels are already centers
+            i = random.randint(pixels.shape[0])
+        centers.append(pixels[i])
+        d2 = np.minimum(d2, np.sum((pixels - pixels[i]) ** 2, axis=1))
+    return np.array(centers)
@@ -1,6 +1,4 @@
 from collections import Counter
-from sklearn import linear_model
-from sklearn.cluster import KMeans
 import cv2
 import numpy as np
 import sys
@@ -29,6 +27,7 @@ def getimgdatapts(cv2img):
 
 #priors
 def runKMeans(cv_img, num_colors, init):
+    from sklearn.cluster import KMeans
 
     imgdata = getimgdatapts(cv_img[-100:,:,:]) # FIX ME: arbitrary cut off
     kmc = KMeans(n_clusters=num_colors, max_iter=25, n_init=10, init=init)
@@ -186,6 +185,7 @@ def getparameters2(mapping, trained, weights, true):
 
 
 def getparameters(mapping, trained, true):
+    from sklearn import linear_model
     redX = np.zeros((3, 1))
     redY = np.zeros((3, 1))
     greenX = np.zeros((3, 1))
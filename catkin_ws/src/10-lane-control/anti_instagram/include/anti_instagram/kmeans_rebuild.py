@@ -4,11 +4,9 @@ import sys
 import os
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 import argparse
-from matplotlib.patches import Rectangle
-from sklearn.cluster import KMeans
 from collections import Counter
+from anti_instagram.color_kmeans import ColorKMeans
 from anti_instagram.geom import processGeom2
 import rospy
 
@@ -35,12 +33,20 @@ class kMeansClass:
     color_image_array = []
 
     # initialize
-    def __init__(self, numCenters, blurAlg, resize, blurKer):
+    def __init__(self, numCenters, blurAlg, resize, blurKer, batch_size=1000, max_samples=20000,
+                 time_budget=None):
+        """
+            batch_size, max_samples, time_budget: see ColorKMeans
+        """
         self.input_image = None
         self.num_centers = int(numCenters)
         self.blur_alg = blurAlg
         self.fac_resize = float(resize)
         self.blur_kernel = int(blurKer)
+        # the centers are kept between the calls to applyKM()
+        self.kmeans = ColorKMeans(self.num_centers, batch_size=batch_size, max_samples=max_samples,
+                                  time_budget=time_budget)
+        self.labelcount = Counter()
         # set up array for center colors
         self.color_image_array = np.zeros((self.num_centers, 200, 200, 3), np.uint8)
 
@@ -76,25 +82,19 @@ class kMeansClass:
         # blur image
         self._blurImg()
 
-        # prepare KMeans
-        if self.trained_centers == []:
-            # initialize kmeans with the random k-mans++ method
-            kmc = KMeans(n_clusters=self.num_centers, init='k-means++', max_iter=max_it)
-        else:
-            # initialize kmeans with the previously found centers
-            kmc = KMeans(n_clusters=self.num_centers, init=self.prevCenters, max_iter=max_it)
-
         # prepare data points
         self.image_array = self._getimgdatapts(self.blurred_image, fancyGeom=fancyGeom)
 
         # run KMeans
-        kmc.fit(self.image_array)
+        # (k-means++ on the first call, then starting from the previously found centers)
+        self.kmeans.fit(self.image_array, max_it)
 
         # get centers, labels and labelcount from KMeans
-        self.trained_centers = kmc.cluster_centers_
-        self.labels = kmc.labels_
+        self.trained_centers = self.kmeans.centers.copy()
+        self.labels = self.kmeans.assign(self.image_array)
+        counts = np.bincount(self.labels, minlength=self.num_centers)
         for i in np.arange(self.num_centers):
-            self.labelcount[i] = np.sum(self.labels == i)
+            self.labelcount[i] = counts[i]
 
     def determineColor(self, trained_centers, withRed = True):
         idxRed = -1
@@ -31,6 +31,19 @@ def scaleandshift2(img, scale, shift):
 
     return img_shift
 
+def scaleandshift_lut(scale, shift):
+    """
+        Returns the lookup table, of shape (256, 1, 3), that gives the same
+        result as np.clip(scaleandshift2(img, scale, shift), 0, 255).astype('uint8')
+        for uint8 images, to be used with cv2.LUT().
+    """
+    assert len(scale) == 3, scale
+    assert len(shift) == 3, shift
+    x = np.arange(256, dtype='uint8').reshape((256, 1, 1))
+    x = np.tile(x, (1, 1, 3))
+    res = scaleandshift2(x, scale, shift)
+    return np.clip(res, 0, 255).astype('uint8')
+
 def scaleandshift1(img, scale, shift):
     h = img.shape[0]
     w = img.shape[1]
@@ -10,15 +10,31 @@ import time
 This class represents a basic color balance algorithm. The routine 'thresholdAnalysis' finds the two thresholds
     based on an image and a cut-off percentage. The routine 'applyTrafo' takes either two thresholds from input or the
     class own thresholds amd applies the transform.
+
+    The percentiles are found with a histogram of each channel, so the analysis is cheap enough to be run on
+    every frame; it can use a subset of the pixels ('subsample') and smooth the thresholds over the frames
+    ('smoothing').
 """
 class simpleColorBalanceClass:
     # initialize
-    def __init__(self):
+    def __init__(self, subsample=1, smoothing=0.0):
+        """
+            subsample: use one pixel out of subsample x subsample
+            smoothing: weight of the previous thresholds in the exponential smoothing
+                       (0: use only the current image)
+        """
+        assert int(subsample) >= 1, subsample
+        assert 0 <= smoothing < 1, smoothing
         self.ThLow = np.zeros(3, np.int16)
         self.ThLow.fill(-1)
         self.ThHi = np.zeros(3, np.int16)
         self.ThHi.fill(-1)
         self.halfPercent = -1
+        self.subsample = int(subsample)
+        self.smoothing = float(smoothing)
+        # smoothed thresholds (float), None before the first image
+        self.ThLowSmoothed = None
+        self.ThHiSmoothed = None
         print('Instance of simpleColorBalanceClass created.')
 
     def apply_mask(self, matrix, mask, fill_value):
@@ -36,22 +52,31 @@ class simpleColorBalanceClass:
 
     def thresholdAnalysis(self, img, percent):
         self.halfPercent = percent / 200.0
-        channels = cv2.split(img)
+        img = np.ascontiguousarray(img[::self.subsample, ::self.subsample, :])
 
-        for idx, channel in enumerate(channels):
+        ThLow = np.zeros(3)
+        ThHi = np.zeros(3)
+        for idx in range(3):
             # find the low and high precentile values (based on the input percentile)
-            height, width = channel.shape
-            vec_size = width * height
-            flat = channel.reshape(vec_size)
-            # sort entries
-            flat = np.sort(flat)
-            n_cols = flat.shape[0]
-            # calculate thresholds
-            self.ThLow[idx] = flat[int(math.floor(n_cols * self.halfPercent))]
-            self.ThHi[idx] = flat[int(math.ceil(n_cols * (1.0 - self.halfPercent)))]
+            hist = cv2.calcHist([img], [idx], None, [256], [0, 256])
+            ThLow[idx], ThHi[idx] = percentiles_from_histogram(hist.ravel(), self.halfPercent)
 
+        if self.ThLowSmoothed is None or self.smoothing == 0:
+            self.ThLowSmoothed = ThLow
+            self.ThHiSmoothed = ThHi
+        else:
+            a = self.smoothing
+            self.ThLowSmoothed = a * self.ThLowSmoothed + (1 - a) * ThLow
+            self.ThHiSmoothed = a * self.ThHiSmoothed + (1 - a) * ThHi
+
+        self.ThLow[:] = np.round(self.ThLowSmoothed)
+        self.ThHi[:] = np.round(self.ThHiSmoothed)
         return self.ThLow, self.ThHi
 
+    def resetSmoothing(self):
+        """ Forgets the thresholds of the previous images. """
+        self.ThLowSmoothed = None
+        self.ThHiSmoothed = None
 
     def applyTrafo(self, img, ThLow = [], ThHi = []):
         if ThLow == [] and ThHi == []:
@@ -65,3 +90,19 @@ class simpleColorBalanceClass:
             normalized = cv2.normalize(thresholded, thresholded.copy(), 0, 255, cv2.NORM_MINMAX)
             out_channels.append(normalized)
         return cv2.merge(out_channels)
+
+
+def percentiles_from_histogram(hist, halfPercent):
+    """
+        Returns the values (low, high) at the positions floor(n * halfPercent)
+        and ceil(n * (1 - halfPercent)) of the sorted pixel values, where n
+        is the number of pixels, given the histogram of the 256 values.
+    """
+    cumulative = np.cumsum(hist.astype('int64'))
+    n = int(cumulative[-1])
+    assert n > 0, 'Empty image.'
+    k_low = min(int(math.floor(n * halfPercent)), n - 1)
+    k_high = min(int(math.ceil(n * (1.0 - halfPercent))), n - 1)
+    # the value at position k is the first one with more than k pixels up to it
+    low, high = np.searchsorted(cumulative, [k_low, k_high], side='right')
+    return low, high
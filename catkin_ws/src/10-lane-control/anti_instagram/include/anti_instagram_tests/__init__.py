@@ -1,3 +1,7 @@
 
 from . import iids_tests
 from . import annotations_test
+from . import color_balance
+from . import lut_correction
+from . import percentile_thresholds
+from . import color_kmeans
@@ -0,0 +1,38 @@
+import duckietown_utils as dtu
+from anti_instagram.AntiInstagram_rebuild import AntiInstagram
+import numpy as np
+
+
+@dtu.unit_test
+def color_balance_thresholds_same_as_minmax():
+    np.random.seed(11)
+    ai = AntiInstagram()
+    ThLow = [30, 10, 52]
+    ThHi = [200, 240, 181]
+    for shape in [(120, 160, 3), (48, 64, 3)]:
+        img = np.random.randint(0, 256, size=shape).astype('uint8')
+        # make sure that the image has values outside the thresholds
+        img[0, 0, :] = 0
+        img[0, 1, :] = 255
+        a = ai.applyColorBalance(img, ThLow, ThHi)
+        b = ai.applyColorBalanceThresholds(img, ThLow, ThHi)
+        assert a.shape == b.shape and b.dtype == np.uint8
+        diff = np.abs(a.astype('int32') - b.astype('int32'))
+        assert diff.max() <= 1, diff.max()
+
+
+@dtu.unit_test
+def color_balance_thresholds_crop():
+    """ Applying after cropping is the same as cropping after applying. """
+    np.random.seed(12)
+    ai = AntiInstagram()
+    ThLow = [30, 10, 52]
+    ThHi = [200, 240, 181]
+    img = np.random.randint(0, 256, size=(120, 160, 3)).astype('uint8')
+    full = ai.applyColorBalanceThresholds(img, ThLow, ThHi)
+    cropped = ai.applyColorBalanceThresholds(img[40:, :, :], ThLow, ThHi)
+    assert np.array_equal(full[40:, :, :], cropped)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
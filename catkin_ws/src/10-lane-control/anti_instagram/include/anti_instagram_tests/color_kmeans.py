@@ -0,0 +1,62 @@
+import duckietown_utils as dtu
+from anti_instagram.color_kmeans import ColorKMeans, closest_center
+from anti_instagram.kmeans_rebuild import kMeansClass
+import numpy as np
+
+TRUE_CENTERS = np.array([[60, 60, 60], [60, 60, 240], [50, 240, 240], [240, 240, 240]])
+
+
+def synthetic_pixels(seed, centers=TRUE_CENTERS, n=3000, noise=6):
+    random = np.random.RandomState(seed)
+    pixels = [c + random.normal(0, noise, (n, 3)) for c in centers]
+    return np.clip(np.vstack(pixels), 0, 255).astype('uint8')
+
+
+def assert_close_to_true(centers, true_centers=TRUE_CENTERS, tolerance=5):
+    for c in true_centers:
+        d = np.min(np.linalg.norm(centers - c, axis=1))
+        assert d < tolerance, (c, centers)
+
+
+@dtu.unit_test
+def color_kmeans_finds_clusters():
+    pixels = synthetic_pixels(18)
+    km = ColorKMeans(4, seed=0)
+    km.fit(pixels, max_it=10)
+    assert_close_to_true(km.centers)
+
+    # the lookup table gives the closest center
+    labels = km.assign(pixels)
+    assert np.mean(labels == closest_center(pixels.astype('float64'), km.centers)) > 0.99
+
+
+@dtu.unit_test
+def color_kmeans_warm_start():
+    km = ColorKMeans(4, seed=0)
+    km.fit(synthetic_pixels(19), max_it=10)
+    # the colors drift: a few iterations from the previous centers are enough
+    drifted = TRUE_CENTERS + 10
+    km.fit(synthetic_pixels(20, centers=drifted), max_it=2)
+    assert_close_to_true(km.centers, drifted)
+
+
+@dtu.unit_test
+def color_kmeans_time_budget():
+    km = ColorKMeans(4, seed=0, time_budget=0)
+    n = km.fit(synthetic_pixels(21), max_it=100)
+    assert n == 1
+    assert_close_to_true(km.centers, tolerance=50)
+
+
+@dtu.unit_test
+def kmeans_class_apply():
+    img = synthetic_pixels(22).reshape((60, 200, 3))
+    KM = kMeansClass(4, 'none', 1, 5)
+    KM.applyKM(img, 10)
+    assert_close_to_true(KM.trained_centers)
+    assert sum(KM.labelcount.values()) == 60 * 200
+    assert KM.labels.shape == (60 * 200,)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
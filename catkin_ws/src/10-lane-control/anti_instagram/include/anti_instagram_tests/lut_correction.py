@@ -0,0 +1,94 @@
+import duckietown_utils as dtu
+from anti_instagram.AntiInstagram_rebuild import AntiInstagram
+from anti_instagram.anti_instagram_imp import AntiInstagram as AntiInstagramImp
+from anti_instagram.scale_and_shift import scaleandshift
+import numpy as np
+
+
+def random_parameters(ai):
+    ai.scale = list(np.random.uniform(0.5, 2, 3))
+    ai.shift = list(np.random.uniform(-50, 50, 3))
+    ai.ThLow = list(np.random.uniform(0, 120, 3))
+    ai.ThHi = list(np.random.uniform(130, 255, 3))
+
+
+def random_image(shape=(48, 64, 3)):
+    low = np.random.randint(0, 60)
+    high = np.random.randint(150, 256)
+    return np.random.randint(low, high, size=shape).astype('uint8')
+
+
+def linear_transform(img, scale, shift):
+    """ The original applyTransform() """
+    return np.clip(scaleandshift(img, scale, shift), 0, 255).astype('uint8')
+
+
+@dtu.unit_test
+def lut_transform_same_as_linear():
+    np.random.seed(13)
+    ai = AntiInstagram()
+    ai2 = AntiInstagramImp()
+    for _ in range(20):
+        random_parameters(ai)
+        ai2.scale, ai2.shift = ai.scale, ai.shift
+        img = random_image()
+        expected = linear_transform(img, ai.scale, ai.shift)
+        assert np.array_equal(ai.applyTransform(img), expected)
+        assert np.array_equal(ai2.applyTransform(img), expected)
+        # float images use the original path
+        assert np.array_equal(ai.applyTransform(img.astype('float32')), expected)
+
+
+@dtu.unit_test
+def lut_color_balance_same_as_normalize():
+    np.random.seed(14)
+    ai = AntiInstagram()
+    for i in range(20):
+        random_parameters(ai)
+        if i % 2:
+            ai.ThLow = [int(x) for x in ai.ThLow]
+            ai.ThHi = [int(x) for x in ai.ThHi]
+        img = random_image()
+        expected = ai.applyTrafo(img, ai.ThLow, ai.ThHi)
+        assert np.array_equal(ai.applyColorBalance(img, ai.ThLow, ai.ThHi), expected)
+
+
+@dtu.unit_test
+def lut_correction_same_as_two_steps():
+    np.random.seed(15)
+    ai = AntiInstagram()
+    for _ in range(20):
+        random_parameters(ai)
+        img = random_image()
+        cb = ai.applyTrafo(img, ai.ThLow, ai.ThHi)
+        both = linear_transform(cb, ai.scale, ai.shift)
+        assert np.array_equal(ai.applyCorrection(img, 'both'), both)
+        assert np.array_equal(ai.applyCorrection(img, 'cb'), cb)
+        assert np.array_equal(ai.applyCorrection(img, 'lin'),
+                              linear_transform(img, ai.scale, ai.shift))
+
+        cb2 = ai.applyColorBalanceThresholds(img, ai.ThLow, ai.ThHi)
+        both2 = linear_transform(cb2, ai.scale, ai.shift)
+        assert np.array_equal(ai.applyCorrection(img, 'both', stretch_image=False), both2)
+
+
+@dtu.unit_test
+def lut_correction_interleaved():
+    """ The combined table must follow the color balance table of each image. """
+    np.random.seed(16)
+    ai = AntiInstagram()
+    random_parameters(ai)
+    for _ in range(200):
+        img, img2, img3 = random_image(), random_image(), random_image()
+        ai.applyCorrection(img, 'both')
+        if np.random.randint(2):
+            ai.applyColorBalance(img2, ai.ThLow, ai.ThHi)
+        else:
+            ai.applyCorrection(img2, 'cb')
+        res = ai.applyCorrection(img3, 'both')
+        expected = linear_transform(ai.applyTrafo(img3, ai.ThLow, ai.ThHi), ai.scale, ai.shift)
+        assert np.array_equal(res, expected)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,69 @@
+import math
+
+import duckietown_utils as dtu
+from anti_instagram.simpleColorBalanceClass import simpleColorBalanceClass
+import numpy as np
+
+
+def thresholds_by_sorting(img, percent):
+    """ The original thresholdAnalysis() (with the index of the high threshold clamped) """
+    halfPercent = percent / 200.0
+    ThLow = []
+    ThHi = []
+    for idx in range(3):
+        flat = np.sort(img[:, :, idx].ravel())
+        n = flat.shape[0]
+        ThLow.append(flat[int(math.floor(n * halfPercent))])
+        ThHi.append(flat[min(int(math.ceil(n * (1.0 - halfPercent))), n - 1)])
+    return ThLow, ThHi
+
+
+@dtu.unit_test
+def percentile_thresholds_same_as_sorting():
+    np.random.seed(16)
+    for shape in [(1, 7, 3), (48, 64, 3), (33, 65, 3)]:
+        img = np.random.randint(20, 230, size=shape).astype('uint8')
+        for percent in [1, 5, 50, 80, 100]:
+            CB = simpleColorBalanceClass()
+            ThLow, ThHi = CB.thresholdAnalysis(img, percent)
+            expected_low, expected_hi = thresholds_by_sorting(img, percent)
+            assert list(ThLow) == expected_low, (ThLow, expected_low)
+            assert list(ThHi) == expected_hi, (ThHi, expected_hi)
+
+
+@dtu.unit_test
+def percentile_thresholds_subsample():
+    np.random.seed(17)
+    img = np.random.randint(0, 256, size=(48, 64, 3)).astype('uint8')
+    CB = simpleColorBalanceClass(subsample=4)
+    ThLow, ThHi = CB.thresholdAnalysis(img, 10)
+    expected_low, expected_hi = thresholds_by_sorting(img[::4, ::4, :], 10)
+    assert list(ThLow) == expected_low
+    assert list(ThHi) == expected_hi
+
+
+@dtu.unit_test
+def percentile_thresholds_smoothing():
+    dark = np.empty((10, 10, 3), 'uint8')
+    dark.fill(40)
+    bright = np.empty((10, 10, 3), 'uint8')
+    bright.fill(200)
+
+    CB = simpleColorBalanceClass(smoothing=0.75)
+    ThLow, _ = CB.thresholdAnalysis(dark, 10)
+    # the first image is not smoothed
+    assert list(ThLow) == [40, 40, 40]
+    ThLow, ThHi = CB.thresholdAnalysis(bright, 10)
+    assert list(ThLow) == [80, 80, 80]
+    assert list(ThHi) == [80, 80, 80]
+    for _ in range(50):
+        ThLow, _ = CB.thresholdAnalysis(bright, 10)
+    assert list(ThLow) == [200, 200, 200]
+
+    CB.resetSmoothing()
+    ThLow, _ = CB.thresholdAnalysis(dark, 10)
+    assert list(ThLow) == [40, 40, 40]
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
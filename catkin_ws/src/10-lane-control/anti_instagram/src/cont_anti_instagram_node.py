@@ -4,13 +4,14 @@ from anti_instagram.AntiInstagram_rebuild import *
 from anti_instagram.kmeans_rebuild import *
 from cv_bridge import CvBridge  # @UnresolvedImport
 from duckietown_msgs.msg import (AntiInstagramHealth, AntiInstagramTransform, AntiInstagramTransform_CB, BoolStamped)
-from duckietown_utils.jpg import bgr_from_jpg
+from duckietown_utils.jpg import bgr_from_jpg, bgr_from_jpg_resized
 from line_detector.timekeeper import TimeKeeper
 from sensor_msgs.msg import CompressedImage, Image  # @UnresolvedImport
 import numpy as np
 import rospy
 import os
 from anti_instagram.geom import processGeom2
+import threading
 import time
 
 """
@@ -56,7 +57,15 @@ class ContAntiInstagramNode():
         self.blur = self.setupParameter("~blur", 'median')
         self.resize = self.setupParameter("~resize", 0.2)
         self.blur_kernel = self.setupParameter("~blur_kernel", 5)
+        # maximum time for the k-means in each update, in seconds (0: no limit)
+        self.km_time_budget = self.setupParameter("~km_time_budget", 0.0)
         self.cb_percentage = self.setupParameter("~cb_percentage", 50)
+        # compute the color balance thresholds on every image instead of on the timer
+        self.cb_every_frame = self.setupParameter("~cb_every_frame", False)
+        # use one pixel out of cb_subsample x cb_subsample for the thresholds
+        self.cb_subsample = self.setupParameter("~cb_subsample", 1)
+        # weight of the previous thresholds in the exponential smoothing (0: no smoothing)
+        self.cb_smoothing = self.setupParameter("~cb_smoothing", 0.0)
         self.trafo_mode = self.setupParameter("~trafo_mode", 'cb')
         if not (self.trafo_mode == "cb" or self.trafo_mode == "lin" or self.trafo_mode == "both"):
             rospy.loginfo("cannot understand argument 'trafo_mode'. set to 'both' ")
@@ -76,7 +85,12 @@ class ContAntiInstagramNode():
 
         # initialize AI class
         self.ai = AntiInstagram()
-        self.ai.setupKM(self.n_centers, self.blur, 1, self.blur_kernel)
+        self.ai.setupKM(self.n_centers, self.blur, 1, self.blur_kernel,
+                        time_budget=self.km_time_budget if self.km_time_budget > 0 else None)
+        self.ai.setupCB(self.cb_subsample, self.cb_smoothing)
+        # with cb_every_frame the thresholds are updated in the image callback
+        # and read by the timer: the lock keeps ThLow and ThHi consistent
+        self.cb_lock = threading.Lock()
 
         # initialize msg bridge
         self.bridge = CvBridge()
@@ -111,6 +125,38 @@ class ContAntiInstagramNode():
         # memorize image
         self.image_msg = image_msg
 
+        if self.cb_every_frame and (self.trafo_mode == "cb" or self.trafo_mode == "both"):
+            tk = TimeKeeper(image_msg)
+            # the thresholds are percentiles of the resized image:
+            # the full resolution is not needed, so decode at reduced size
+            try:
+                resized_img = bgr_from_jpg_resized(image_msg.data, float(self.resize))
+            except ValueError as e:
+                rospy.loginfo('Anti_instagram cannot decode image: %s' % e)
+                return
+            H, W, D = resized_img.shape
+            # remove upper part of the image
+            geomImage = resized_img[int(H * 0.3):(H - 1), :, :]
+            self.updateColorBalance(geomImage)
+            tk.completed('colorBalance analysis')
+            if self.verbose:
+                rospy.loginfo('ai:\n' + tk.getall())
+
+    def updateColorBalance(self, geomImage):
+        with self.cb_lock:
+            # find color balance thresholds
+            self.ai.calculateColorBalanceThreshold(geomImage, self.cb_percentage)
+
+            # store color balance thresholds to ros message
+            self.transform_CB.th[0], self.transform_CB.th[1], self.transform_CB.th[2] = self.ai.ThLow
+            self.transform_CB.th[3], self.transform_CB.th[4], self.transform_CB.th[5] = self.ai.ThHi
+            self.transform_CB.th[3]=255
+            self.transform_CB.th[4]=255
+            self.transform_CB.th[5]=255
+
+            # publish color balance thresholds
+            self.pub_trafo_CB.publish(self.transform_CB)
+
     def processImage(self, event):
         # processes image with either color balance, linear trafo or both
 
@@ -151,23 +197,11 @@ class ContAntiInstagramNode():
                 tk.completed('notFancyGeom')
 
             # apply color balance if required
-            if self.trafo_mode == "cb" or self.trafo_mode == "both":
-                # find color balance thresholds
-
+            # (unless it is computed on every image)
+            if (self.trafo_mode == "cb" or self.trafo_mode == "both") and not self.cb_every_frame:
                 start_cb = time.time()
-                self.ai.calculateColorBalanceThreshold(self.geomImage, self.cb_percentage)
+                self.updateColorBalance(self.geomImage)
                 end_cb = time.time()
-                tk.completed('calculateColorBalanceThresholds')
-
-                # store color balance thresholds to ros message
-                self.transform_CB.th[0], self.transform_CB.th[1], self.transform_CB.th[2] = self.ai.ThLow
-                self.transform_CB.th[3], self.transform_CB.th[4], self.transform_CB.th[5] = self.ai.ThHi
-                self.transform_CB.th[3]=255
-                self.transform_CB.th[4]=255
-                self.transform_CB.th[5]=255
-
-                # publish color balance thresholds
-                self.pub_trafo_CB.publish(self.transform_CB)
             #    rospy.loginfo('ai: Color balance thresholds published.')
 
                 tk.completed('colorBalance analysis')
@@ -178,7 +212,8 @@ class ContAntiInstagramNode():
                 # take in account the previous color balance
                 if self.trafo_mode == "both":
                     # apply color balance
-                    colorBalanced_image = self.ai.applyColorBalance(self.geomImage, self.ai.ThLow, self.ai.ThHi)
+                    with self.cb_lock:
+                        colorBalanced_image = self.ai.applyColorBalance(self.geomImage, self.ai.ThLow, self.ai.ThHi)
                     rospy.loginfo('TRANSFORMATION!!!!!!!!!!!!!!!!!!!!!!!!!!!!!')
                 else:
                     # pass image without color balance trafo
@@ -235,7 +270,7 @@ class ContAntiInstagramNode():
 
             #if self.verbose:
             #    rospy.loginfo('ai:\n' + tk.getall())
-            if self.trafo_mode == "cb" or self.trafo_mode == "both":
+            if (self.trafo_mode == "cb" or self.trafo_mode == "both") and not self.cb_every_frame:
                 cb_time = end_cb - start_cb
                 #print('CB took: ' + str(cb_time))
             if self.trafo_mode == "lin" or self.trafo_mode == "both":
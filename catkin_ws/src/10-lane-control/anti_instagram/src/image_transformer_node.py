@@ -4,11 +4,11 @@ from anti_instagram.AntiInstagram_rebuild import *
 from cv_bridge import CvBridge  # @UnresolvedImport
 from duckietown_msgs.msg import (AntiInstagramHealth, AntiInstagramTransform, AntiInstagramTransform_CB, BoolStamped)
 from duckietown_utils.jpg import bgr_from_jpg
+from duckietown_utils.latest_frame import LatestFrameWorker
 from line_detector.timekeeper import TimeKeeper
 from sensor_msgs.msg import CompressedImage, Image  # @UnresolvedImport
 import numpy as np
 import time
-import threading
 import cv2
 
 """
@@ -36,7 +36,9 @@ class ImageTransformerNode():
 
         self.active = True
         self.locked = False
-        self.thread_lock = threading.Lock()
+        # A single worker transforms the newest image; the images that
+        # arrive while it is busy replace each other.
+        self.worker = LatestFrameWorker(process=self.cbNewImage, name='image_transformer_node')
         self.r = rospy.Rate(5) # Rate in Hz
         self.scale_percent=40
         rospy.set_param("~scale_percent", self.scale_percent)
@@ -85,15 +87,11 @@ class ImageTransformerNode():
 
     def callbackImage(self, image_msg):
         #use this to avoid lag!
-        thread = threading.Thread(target=self.cbNewImage,args=(image_msg,))
-        thread.setDaemon(True)
-        thread.start()
+        self.worker.put(image_msg)
 
     def cbNewImage(self, image_msg):
         # this callback proceeds the latest image, i.e. it applies the current transformation to the image and publishes it
         # begin2=rospy.Time.now()
-        if not self.thread_lock.acquire(False):
-                return
 
         # memorize image
         self.image_msg = image_msg
@@ -120,26 +118,11 @@ class ImageTransformerNode():
 
 
 
-        if self.trafo_mode == "cb" or self.trafo_mode == "both":
-            # apply color balance using latest thresholds
-            # begin1=rospy.Time.now()
-            colorBalanced_image_cv2 = self.ai.applyColorBalance(img=cv_image, ThLow=self.ai.ThLow, ThHi=self.ai.ThHi)
-            tk.completed('applyColorBalance')
-            # end1=rospy.Time.now()
-            # duration=end1-begin1
-
-            # rospy.loginfo('Complete CB-Trafo Duration: %s' % duration)
-        else:
-            # pass input image
-            colorBalanced_image_cv2 = cv_image
-
-        if self.trafo_mode == "lin" or self.trafo_mode == "both":
-            # apply color Transform using latest parameters
-            corrected_image_cv2 = self.ai.applyTransform(colorBalanced_image_cv2)
-            tk.completed('applyTransform')
-        else:
-            # pass input image
-            corrected_image_cv2 = colorBalanced_image_cv2
+        # color balance (if trafo_mode is "cb" or "both") and linear
+        # transform (if "lin" or "both") with the latest parameters,
+        # combined in one lookup table
+        corrected_image_cv2 = self.ai.applyCorrection(cv_image, self.trafo_mode)
+        tk.completed('applyCorrection')
         # begin3=rospy.Time.now()
         # store image to ros message
         self.corrected_image = self.bridge.cv2_to_compressed_imgmsg(
@@ -158,9 +141,9 @@ class ImageTransformerNode():
 
         if self.verbose:
             rospy.loginfo('ai:\n' + tk.getall())
+            rospy.loginfo('ai worker: %s' % self.worker.info())
 
         #self.r.sleep() #to keep the rate
-        self.thread_lock.release()
         # end4=rospy.Time.now()
         # duration4=end4-begin4
         # rospy.loginfo('END OF FUNCTION: %s' % duration4)
@@ -11,14 +11,14 @@ import duckietown_utils as dtu
 from easy_algo import get_easy_algo_db
 from easy_node.utils.timing import ProcessingTimingStats, FakeContext
 from ground_projection import GroundProjection
-from ground_projection.ground_projection_interface import find_ground_coordinates
+from ground_projection.ground_lut import find_ground_coordinates_lut
 from ground_projection.segment import rectify_segments
 from lane_filter import FAMILY_LANE_FILTER
 from lane_filter_generic import LaneFilterMoreGeneric
 from line_detector.line_detector_interface import FAMILY_LINE_DETECTOR
 from line_detector.visual_state_fancy_display import vs_fancy_display, normalized_to_image
 from line_detector2.image_prep import ImagePrep
-from localization_templates import FAMILY_LOC_TEMPLATES
+from localization_templates import get_localization_template
 import numpy as np
 
 
@@ -79,14 +79,17 @@ def run_pipeline(image, gp, line_detector_name, image_prep_name, lane_filter_nam
 
     with pts.phase('edge detection'):
         # note: do not apply transform twice!
+        # as arrays: passed to ground projection and lane filter
+        # without creating the Segment objects
         segment_list2 = image_prep.process(pts, image,
-                                           line_detector, transform=ai.applyTransform)
+                                           line_detector, transform=ai.applyTransform,
+                                           as_arrays=True)
 
         if all_details:
 
             res['resized and corrected'] = image_prep.image_corrected
 
-    dtu.logger.debug('segment_list2: %s' % len(segment_list2.segments))
+    dtu.logger.debug('segment_list2: %s' % len(segment_list2))
 
     if all_details:
         res['segments_on_image_input_transformed'] = \
@@ -106,9 +109,10 @@ def run_pipeline(image, gp, line_detector_name, image_prep_name, lane_filter_nam
     with pts.phase('rectify_segments'):
         segment_list2_rect = rectify_segments(gpg, segment_list2)
 
-    # Project to ground
+    # Project to ground, directly from the distorted image
     with pts.phase('find_ground_coordinates'):
-        sg = find_ground_coordinates(gpg, segment_list2_rect)
+        ground_lut = gpg.get_ground_lut(image_prep.shape, image_prep.top_cutoff)
+        sg = find_ground_coordinates_lut(ground_lut, segment_list2)
 
     lane_filter.initialize()
     if all_details:
@@ -116,25 +120,19 @@ def run_pipeline(image, gp, line_detector_name, image_prep_name, lane_filter_nam
 
     with pts.phase('lane filter update'):
         print type(lane_filter).__name__
-        if type(lane_filter).__name__ == 'LaneFilterHistogram':
-            # XXX merging pain
-            _likelihood = lane_filter.update(sg.segments)
-        else:
-            _likelihood = lane_filter.update(sg)
+        # all the lane filters accept the SegmentArrayList
+        _likelihood = lane_filter.update(sg)
 
     if not quick:
         with pts.phase('lane filter plot'):
             res['likelihood'] = lane_filter.get_plot_phi_d(ground_truth=ground_truth)
-    easy_algo_db = get_easy_algo_db()
-
     if isinstance(lane_filter, LaneFilterMoreGeneric):
         template_name = lane_filter.localization_template
     else:
         template_name = 'DT17_template_straight_straight'
         dtu.logger.debug('Using default template %r for visualization' % template_name)
 
-    localization_template = \
-        easy_algo_db.create_instance(FAMILY_LOC_TEMPLATES, template_name)
+    localization_template = get_localization_template(template_name)
 
     with pts.phase('lane filter get_estimate()'):
         est = lane_filter.get_estimate()
@@ -3,3 +3,6 @@ from . import synthetic
 from . import synthetic_intersection
 from . import synthetic_curve
 from . import synthetic_stopline_xy
+from . import batch_projection
+from . import ground_lut_test
+from . import invert_map_test
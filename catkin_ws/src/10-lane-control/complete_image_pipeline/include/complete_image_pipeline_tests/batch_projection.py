@@ -0,0 +1,117 @@
+from numpy.testing.utils import assert_allclose
+
+from duckietown_msgs.msg import Pixel, Segment, SegmentList, Vector2D
+import duckietown_utils as dtu
+from geometry_msgs.msg import Point
+from ground_projection.ground_projection_interface import (find_ground_coordinates,
+                                                           get_ground_projection_geometry_for_robot)
+from ground_projection.segment import rectify_segment, rectify_segments
+import numpy as np
+
+
+robot_name = dtu.DuckietownConstants.ROBOT_NAME_FOR_TESTS
+
+
+def get_random_vectors(N, seed=0):
+    """ N random normalized coordinates in the lower part of the image. """
+    r = np.random.RandomState(seed)
+    vectors = np.empty((N, 2), dtype='float64')
+    vectors[:, 0] = r.uniform(0, 1, N)
+    vectors[:, 1] = r.uniform(0.6, 1, N)
+    return vectors
+
+
+def get_random_segment_list(N, seed=0):
+    vectors = get_random_vectors(2 * N, seed=seed)
+    segments = []
+    for k in range(N):
+        pixels_normalized = [Vector2D(vectors[2 * k, 0], vectors[2 * k, 1]),
+                             Vector2D(vectors[2 * k + 1, 0], vectors[2 * k + 1, 1])]
+        segments.append(Segment(color=k % 3, pixels_normalized=pixels_normalized))
+    return SegmentList(segments=segments)
+
+
+def check_batch_projection(N):
+    gpg = get_ground_projection_geometry_for_robot(robot_name)
+    vectors = get_random_vectors(N)
+
+    # vectors2pixels
+    pixels = gpg.vectors2pixels(vectors)
+    expected = [gpg.vector2pixel(Vector2D(x, y)) for x, y in vectors]
+    assert_allclose(pixels, np.array([(p.u, p.v) for p in expected]).reshape((N, 2)))
+
+    # rectify_points
+    rectified = gpg.rectify_points(pixels)
+    expected = [gpg.rectify_point((u, v)) for u, v in pixels]
+    assert_allclose(rectified, np.array(expected).reshape((N, 2)), atol=1e-6)
+
+    # pixels2ground and vectors2ground
+    ground = gpg.pixels2ground(rectified)
+    expected = [gpg.pixel2ground(Pixel(u, v)) for u, v in rectified]
+    assert_allclose(ground, np.array([(p.x, p.y) for p in expected]).reshape((N, 2)))
+
+    ground2 = gpg.vectors2ground(vectors)
+    expected = [gpg.vector2ground(Vector2D(x, y)) for x, y in vectors]
+    assert_allclose(ground2, np.array([(p.x, p.y) for p in expected]).reshape((N, 2)))
+
+    # ground2pixels
+    pixels2 = gpg.ground2pixels(ground)
+    expected = [gpg.ground2pixel(Point(x, y, 0.0)) for x, y in ground]
+    assert_allclose(pixels2, np.array([(p.u, p.v) for p in expected]).reshape((N, 2)))
+    assert_allclose(pixels2, rectified, atol=1e-6)
+
+
+def check_batch_segments(N):
+    gpg = get_ground_projection_geometry_for_robot(robot_name)
+    sl = get_random_segment_list(N)
+
+    # rectify_segments
+    sl_rect = rectify_segments(gpg, sl)
+    expected = [rectify_segment(gpg, s) for s in sl.segments]
+    assert len(sl_rect.segments) == N
+    for s, e in zip(sl_rect.segments, expected):
+        assert s.color == e.color
+        for i in (0, 1):
+            assert_allclose([s.pixels_normalized[i].x, s.pixels_normalized[i].y],
+                            [e.pixels_normalized[i].x, e.pixels_normalized[i].y], atol=1e-8)
+
+    # find_ground_coordinates, as it was done one point at a time
+    sg = find_ground_coordinates(gpg, sl_rect)
+    expected = []
+    for s in sl_rect.segments:
+        points = [gpg.vector2ground(v) for v in s.pixels_normalized]
+        if points[0].x < 0.01 or points[1].x < 0.01:
+            continue
+        expected.append((s, points))
+    assert len(sg.segments) == len(expected)
+    for s2, (s, points) in zip(sg.segments, expected):
+        assert s2.color == s.color
+        for i in (0, 1):
+            assert_allclose([s2.points[i].x, s2.points[i].y, s2.points[i].z],
+                            [points[i].x, points[i].y, 0.0])
+            assert s2.pixels_normalized[i].x == s.pixels_normalized[i].x
+            assert s2.pixels_normalized[i].y == s.pixels_normalized[i].y
+
+
+@dtu.unit_test
+def batch_projection_random_points():
+    check_batch_projection(N=200)
+
+
+@dtu.unit_test
+def batch_projection_no_points():
+    check_batch_projection(N=0)
+
+
+@dtu.unit_test
+def batch_projection_random_segments():
+    check_batch_segments(N=100)
+
+
+@dtu.unit_test
+def batch_projection_no_segments():
+    check_batch_segments(N=0)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
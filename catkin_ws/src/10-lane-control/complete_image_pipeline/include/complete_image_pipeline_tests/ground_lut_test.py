@@ -0,0 +1,83 @@
+from duckietown_msgs.msg import Segment, SegmentList, Vector2D
+import duckietown_utils as dtu
+from easy_algo import get_easy_algo_db
+from ground_projection.ground_lut import find_ground_coordinates_lut
+from ground_projection.ground_projection_interface import get_ground_projection_geometry_for_robot
+from line_detector2.image_prep import ImagePrep
+import numpy as np
+
+
+robot_name = dtu.DuckietownConstants.ROBOT_NAME_FOR_TESTS
+
+
+def get_exact_ground(gpg, vectors):
+    """ The ground coordinates of the (distorted) vectors, without the LUT. """
+    return gpg.pixels2ground(gpg.rectify_points(gpg.vectors2pixels(vectors)))
+
+
+@dtu.unit_test
+def ground_lut_error():
+    gpg = get_ground_projection_geometry_for_robot(robot_name)
+    image_prep = get_easy_algo_db().create_instance(ImagePrep.FAMILY, 'baseline')
+    lut = gpg.get_ground_lut(image_prep.shape, image_prep.top_cutoff)
+    h1, w1 = image_prep.shape
+
+    # random pixels of the cropped image, all below the horizon
+    r = np.random.RandomState(0)
+    N = 1000
+    u = r.uniform(0, w1, N)
+    v = r.uniform(image_prep.top_cutoff, h1, N)
+    vectors = np.column_stack((u / float(w1), v / float(h1)))
+
+    ground = lut.vectors2ground(vectors)
+    expected = get_exact_ground(gpg, vectors)
+    assert np.all(np.isfinite(ground))
+    error = np.max(np.hypot(ground[:, 0] - expected[:, 0], ground[:, 1] - expected[:, 1]))
+    dtu.logger.info('max error of the ground LUT: %.4f mm' % (error * 1000))
+    assert error < 0.001, error
+
+
+@dtu.unit_test
+def ground_lut_above_horizon():
+    gpg = get_ground_projection_geometry_for_robot(robot_name)
+    image_prep = get_easy_algo_db().create_instance(ImagePrep.FAMILY, 'baseline')
+    # the whole image, so that the top of it is above the horizon
+    top_cutoff = 0
+    lut = gpg.get_ground_lut(image_prep.shape, top_cutoff)
+
+    # the top rows of the image look above the horizon
+    r = np.random.RandomState(1)
+    N = 100
+    above = np.column_stack((r.uniform(0, 1, N), r.uniform(0, 0.15, N)))
+    assert np.all(np.isnan(lut.vectors2ground(above)))
+    # (the homography alone would put them behind the robot)
+    assert np.all(get_exact_ground(gpg, above)[:, 0] < 0)
+
+    below = np.column_stack((r.uniform(0, 1, N), r.uniform(0.7, 1, N)))
+    assert np.all(np.isfinite(lut.vectors2ground(below)))
+
+    def segment(p, q, color):
+        pixels_normalized = [Vector2D(p[0], p[1]), Vector2D(q[0], q[1])]
+        return Segment(color=color, pixels_normalized=pixels_normalized)
+
+    # only the segments with both points below the horizon are kept
+    segments = []
+    for k in range(N):
+        segments.append(segment(below[k], below[N - 1 - k], Segment.WHITE))
+        segments.append(segment(above[k], below[k], Segment.YELLOW))
+        segments.append(segment(above[k], above[N - 1 - k], Segment.RED))
+    sl = SegmentList(segments=segments)
+
+    sg = find_ground_coordinates_lut(lut, sl)
+    assert len(sg.segments) == N
+    for k, s in enumerate(sg.segments):
+        assert s.color == Segment.WHITE
+        expected = get_exact_ground(gpg, np.array([below[k], below[N - 1 - k]]))
+        for i in (0, 1):
+            assert abs(s.points[i].x - expected[i, 0]) < 0.001
+            assert abs(s.points[i].y - expected[i, 1]) < 0.001
+            assert s.points[i].z == 0
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,83 @@
+from numpy.testing.utils import assert_equal
+
+import duckietown_utils as dtu
+from ground_projection.ground_projection_geometry import (GroundProjectionGeometry, fill_holes,
+                                                          get_camera_info_hash, invert_map)
+from ground_projection.ground_projection_interface import get_ground_projection_geometry_for_robot
+import numpy as np
+
+
+robot_name = dtu.DuckietownConstants.ROBOT_NAME_FOR_TESTS
+
+
+@dtu.unit_test
+def fill_holes_nearest():
+    H, W = 12, 16
+    y, x = np.mgrid[0:H, 0:W]
+    rmapx = (x + 100 * y).astype('float32')
+    rmapy = (x * y).astype('float32')
+    holes = np.zeros((H, W), dtype='bool')
+    holes[0, 0] = True  # corner
+    holes[5, 7] = True  # isolated
+    holes[2:5, 10:14] = True  # block
+    holes[:, 15] = True  # border column
+    rmapx0 = rmapx.copy()
+    rmapy0 = rmapy.copy()
+    rmapx[holes] = np.nan
+    rmapy[holes] = np.nan
+
+    fill_holes(rmapx, rmapy)
+
+    # the pixels that are not holes are untouched
+    assert_equal(rmapx[~holes], rmapx0[~holes])
+    assert_equal(rmapy[~holes], rmapy0[~holes])
+
+    # the holes take the value of (one of) the nearest valid pixels
+    vi, vj = np.nonzero(~holes)
+    for i, j in zip(*np.nonzero(holes)):
+        d2 = (vi - i) ** 2 + (vj - j) ** 2
+        nearest = d2 == np.min(d2)
+        candidates = zip(rmapx0[vi[nearest], vj[nearest]], rmapy0[vi[nearest], vj[nearest]])
+        assert (rmapx[i, j], rmapy[i, j]) in candidates, (i, j)
+
+
+@dtu.unit_test
+def invert_map_shift():
+    # the rectified pixel (x, y) comes from (x + 2, y) in the distorted image
+    H, W = 10, 20
+    y, x = np.mgrid[0:H, 0:W]
+    mapx = (x + 2).astype('float32')
+    mapy = y.astype('float32')
+
+    rmapx, rmapy = invert_map(mapx, mapy)
+
+    # the distorted pixel (x, y) comes from (x - 2, y)
+    assert_equal(rmapx[:, 2:], x[:, 2:] - 2)
+    assert_equal(rmapy[:, 2:], y[:, 2:])
+    # the first two columns are holes, filled from the third one
+    assert_equal(rmapx[:, 0:2], 0)
+    assert_equal(rmapy[:, 0:2], y[:, 0:2])
+
+
+@dtu.unit_test
+def inverted_maps_cached():
+    gpg = get_ground_projection_geometry_for_robot(robot_name)
+    cache_name = 'invert_map-%s' % get_camera_info_hash(gpg.ci)
+    dtu.get_cached(cache_name, lambda: None, just_delete=True)
+
+    gpg._init_rectify_maps()
+    rmapx, rmapy = gpg._get_inverted_maps()
+    expected = invert_map(gpg.mapx, gpg.mapy)
+    assert_equal(rmapx, expected[0])
+    assert_equal(rmapy, expected[1])
+
+    # a new object with the same calibration does not have the rectification
+    # maps, so it can only get the inverted ones from the cache
+    gpg2 = GroundProjectionGeometry(gpg.ci, gpg.H)
+    rmapx2, rmapy2 = gpg2._get_inverted_maps()
+    assert_equal(rmapx2, rmapx)
+    assert_equal(rmapy2, rmapy)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -10,6 +10,7 @@ FAMILY_LOC_TEMPLATES = 'localization_template'
 __all__ = [
     'LocalizationTemplate',
     'FAMILY_LOC_TEMPLATES',
+    'get_localization_template',
 ]
 
 class LocalizationTemplate(object):
@@ -37,4 +38,14 @@ class LocalizationTemplate(object):
         return self._map
     
     def get_coords_datatype(self):
-        return self.dt 
\ No newline at end of file
+        return self.dt 
+
+
+@dtu.memoize_simple
+def get_localization_template(template_name):
+    """
+        Returns the instance of the localization template with the given
+        name. The instance is created only once and shared in the process.
+    """
+    db = get_easy_algo_db()
+    return db.create_instance(FAMILY_LOC_TEMPLATES, template_name)
@@ -1,5 +1,7 @@
 from .configuration import *
 from .ground_projection_geometry import *
+from .ground_lut import *
 from .ground_projection_interface import *
 from .segment import *
+from .segment_array_list import *
 
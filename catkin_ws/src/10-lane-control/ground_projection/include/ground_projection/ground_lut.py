@@ -0,0 +1,178 @@
+from duckietown_msgs.msg import SegmentList
+import duckietown_utils as dtu
+import numpy as np
+
+from .ground_projection_geometry import get_camera_info_hash
+from .segment_array_list import SegmentArrayList, segment_array_list_from_segment_list
+
+__all__ = [
+    'GroundLUT',
+    'get_ground_lut',
+    'find_ground_coordinates_lut',
+]
+
+
+class GroundLUT(object):
+    """
+        A dense lookup table from the pixels of the cropped, resized
+        image used by ImagePrep to the ground plane.
+
+        The image is the *distorted* one, so the table folds
+        rectification and homography in one step.
+
+        lut has shape (h + 1, w + 1, 2), where (h, w) is the shape of
+        the cropped image: lut[v, u] contains the ground (x, y) of the
+        pixel (u, v) of the cropped image. The extra row and column
+        cover the right and bottom borders of the image.
+        Pixels that do not project on the ground (above the horizon)
+        are NaN.
+    """
+
+    @dtu.contract(shape='seq[2](int)', top_cutoff=int, lut='array[HxWx2](float32)')
+    def __init__(self, shape, top_cutoff, lut):
+        self.shape = tuple(shape)
+        self.top_cutoff = top_cutoff
+        self.lut = lut
+        self.lut.flags.writeable = False
+
+    @dtu.contract(vectors='array[Nx2]', returns='array[Nx2]')
+    def vectors2ground(self, vectors):
+        """
+            Converts normalized coordinates (as in Segment.pixels_normalized,
+            in the distorted image) to the ground plane, using bilinear
+            interpolation in the table.
+
+            Returns NaN for the points that do not project on the ground.
+        """
+        h1, w1 = self.shape
+        u = vectors[:, 0] * w1
+        v = vectors[:, 1] * h1 - self.top_cutoff
+        return self.pixels2ground(np.column_stack((u, v)))
+
+    @dtu.contract(pixels='array[Nx2]', returns='array[Nx2]')
+    def pixels2ground(self, pixels):
+        """
+            Converts pixels (u, v) of the cropped image to the ground plane,
+            using bilinear interpolation in the table.
+
+            Points outside of the image are clipped to the border.
+        """
+        lut = self.lut
+        h = lut.shape[0] - 1
+        w = lut.shape[1] - 1
+        u = np.clip(pixels[:, 0], 0, w)
+        v = np.clip(pixels[:, 1], 0, h)
+
+        # cell of each point; the last row/column uses the previous cell
+        j0 = np.minimum(np.floor(u).astype('int64'), w - 1)
+        i0 = np.minimum(np.floor(v).astype('int64'), h - 1)
+        fu = (u - j0)[:, np.newaxis]
+        fv = (v - i0)[:, np.newaxis]
+
+        # gather the four corners from the flattened table
+        flat = lut.reshape((-1, 2))
+        k00 = i0 * (w + 1) + j0
+        k10 = k00 + (w + 1)
+        top = np.take(flat, k00, axis=0) * (1 - fu) + np.take(flat, k00 + 1, axis=0) * fu
+        bottom = np.take(flat, k10, axis=0) * (1 - fu) + np.take(flat, k10 + 1, axis=0) * fu
+        return top * (1 - fv) + bottom * fv
+
+
+def compute_ground_lut(gpg, shape, top_cutoff):
+    """ Computes the GroundLUT for the images prepared by ImagePrep. """
+    h1, w1 = shape
+    h = h1 - top_cutoff
+    w = w1
+
+    v, u = np.mgrid[0:h + 1, 0:w + 1]
+    vectors = np.column_stack((u.ravel() / float(w1),
+                               (v.ravel() + top_cutoff) / float(h1)))
+
+    pixels = gpg.vectors2pixels(vectors)
+    rectified = gpg.rectify_points(pixels)
+    ground = gpg.pixels2ground(rectified)
+
+    # The homography is defined up to scale: the points on the ground
+    # are the ones on the same side of the horizon as the bottom center
+    # of the image.
+    H = gpg.H
+    z = np.dot(rectified, H[2, 0:2]) + H[2, 2]
+    bottom_center = gpg.rectify_points(np.array([[gpg.ci.width * 0.5, gpg.ci.height]]))[0]
+    z_ref = np.dot(bottom_center, H[2, 0:2]) + H[2, 2]
+    ground[np.sign(z) != np.sign(z_ref), :] = np.nan
+
+    lut = ground.reshape((h + 1, w + 1, 2)).astype('float32')
+    return GroundLUT(shape=(h1, w1), top_cutoff=top_cutoff, lut=lut)
+
+
+def get_ground_lut_hash(gpg, shape, top_cutoff):
+    """ A hash of the calibration (intrinsics and homography) and of the image shape. """
+    parts = [get_camera_info_hash(gpg.ci),
+             np.asarray(gpg.H, dtype='float64').tostring(),
+             '%s %s' % (tuple(shape), top_cutoff)]
+    return dtu.get_md5("".join(parts))
+
+
+_ground_luts = {}
+
+
+def get_ground_lut(gpg, shape, top_cutoff):
+    """
+        Returns the GroundLUT for the given calibration and ImagePrep
+        parameters.
+
+        The table is computed once and saved in the Duckietown cache
+        directory, keyed by the hash of the calibration.
+    """
+    shape = tuple(int(x) for x in shape)
+    key = get_ground_lut_hash(gpg, shape, top_cutoff)
+    if not key in _ground_luts:
+        cache_name = 'ground_lut-%s' % key
+
+        def f():
+            return compute_ground_lut(gpg, shape, top_cutoff).lut
+
+        lut = dtu.get_cached(cache_name, f, quiet=True)
+        _ground_luts[key] = GroundLUT(shape=shape, top_cutoff=top_cutoff, lut=lut)
+    return _ground_luts[key]
+
+
+@dtu.contract(lut=GroundLUT)
+def find_ground_coordinates_lut(lut, sl, skip_not_on_ground=True):
+    """
+        Same as rectify_segments() followed by find_ground_coordinates(),
+        using the lookup table. The segments are in the distorted image.
+
+        sl can be a SegmentList or a SegmentArrayList; the result has
+        the same type.
+
+        Note that the pixels_normalized of the result are not rectified.
+    """
+    if isinstance(sl, SegmentArrayList):
+        return _find_ground_coordinates_lut_arrays(lut, sl, skip_not_on_ground)
+
+    dtu.check_isinstance(sl, SegmentList)
+    sal = segment_array_list_from_segment_list(sl)
+    sal2 = _find_ground_coordinates_lut_arrays(lut, sal, skip_not_on_ground)
+    return sal2.to_segment_list()
+
+
+def _find_ground_coordinates_lut_arrays(lut, sal, skip_not_on_ground):
+    cutoff = 0.01
+    num = len(sal)
+    vectors = sal.pixels_normalized.reshape((2 * num, 2)).astype('float64')
+    ground = lut.vectors2ground(vectors).reshape((num, 2, 2))
+
+    if skip_not_on_ground:
+        # also skips the NaNs
+        with np.errstate(invalid='ignore'):
+            keep = np.logical_and(ground[:, 0, 0] >= cutoff, ground[:, 1, 0] >= cutoff)
+        ground = ground[keep]
+        sal2 = sal.select(keep)
+    else:
+        sal2 = SegmentArrayList(sal.data.copy(), header=sal.header)
+
+    points = sal2.points
+    points[:, :, 0:2] = ground
+    points[:, :, 2] = 0.0
+    return sal2
@@ -1,6 +1,5 @@
-import itertools
-
 import cv2
+from scipy.ndimage.morphology import distance_transform_edt
 
 from duckietown_msgs.msg import Pixel, Vector2D
 import duckietown_utils as dtu
@@ -11,6 +10,7 @@ from sensor_msgs.msg import CameraInfo
 
 __all__ = [
     'GroundProjectionGeometry',
+    'get_camera_info_hash',
 ]
 
 
@@ -133,6 +133,73 @@ class GroundProjectionGeometry(object):
 #         print res1, res2
         return res1
 
+    # Batch versions of the methods above. They take and return arrays of
+    # shape (N, 2), with one point per row, and do not allocate messages.
+
+    @dtu.contract(vectors='array[Nx2]', returns='array[Nx2]')
+    def vectors2pixels(self, vectors):
+        """ Converts [0,1]*[0,1] representations to [0, W]x[0, H]. """
+        scale = np.array([self.ci.width, self.ci.height], dtype='float64')
+        return vectors * scale
+
+    @dtu.contract(pixels='array[Nx2]', returns='array[Nx2]')
+    def pixels2vectors(self, pixels):
+        """ Converts [0,W]*[0,H] representations to [0, 1]x[0, 1]. """
+        scale = np.array([self.ci.width, self.ci.height], dtype='float64')
+        return pixels / scale
+
+    @dtu.contract(vectors='array[Nx2]', returns='array[Nx2]')
+    def vectors2ground(self, vectors):
+        """ Converts normalized coordinates to the ground plane. """
+        return self.pixels2ground(self.vectors2pixels(vectors))
+
+    @dtu.contract(pixels='array[Nx2]', returns='array[Nx2]')
+    def pixels2ground(self, pixels):
+        """
+            Projects the (rectified) pixels on the ground plane.
+
+            Returns the (x, y) coordinates in the axle frame (z = 0).
+        """
+        H = self.H
+        # same as np.dot(self.H, [u, v, 1]) for each row
+        ground_points = np.dot(pixels, H[:, 0:2].T) + H[:, 2]
+        return ground_points[:, 0:2] / ground_points[:, 2:3]
+
+    @dtu.contract(points='array[Nx2]', returns='array[Nx2]')
+    def ground2pixels(self, points):
+        """
+            Projects the ground points (x, y, z=0) on the (rectified) image.
+        """
+        num = points.shape[0]
+        ground_points = np.ones((3, num), dtype='float64')
+        ground_points[0:2, :] = points.T
+        image_points = np.linalg.solve(self.H, ground_points)
+        return (image_points[0:2, :] / image_points[2, :]).T
+
+    @dtu.contract(pixels='array[Nx2]', returns='array[Nx2]')
+    def rectify_points(self, pixels):
+        """
+            Rectifies the pixels of the raw image.
+
+            Same as rectify_point(), with one call to cv2.undistortPoints.
+        """
+        num = pixels.shape[0]
+        if num == 0:
+            return np.zeros((0, 2), dtype='float64')
+        pcm = self.pcm
+        src = np.asarray(pixels, dtype='float64').reshape((num, 1, 2))
+        dst = cv2.undistortPoints(src, pcm.K, pcm.D, R=pcm.R, P=pcm.P)
+        return dst.reshape((num, 2)).astype('float64')
+
+    def get_ground_lut(self, shape, top_cutoff):
+        """
+            Returns a GroundLUT that maps the pixels of the image prepared
+            by ImagePrep (resized to shape, cropped at top_cutoff; not
+            rectified) directly to the ground plane.
+        """
+        from .ground_lut import get_ground_lut
+        return get_ground_lut(self, shape, top_cutoff)
+
     def _init_rectify_maps(self):
         W = self.pcm.width
         H = self.pcm.height
@@ -165,12 +232,21 @@ class GroundProjectionGeometry(object):
         if not self._rectify_inited:
             self._init_rectify_maps()
         if not self._distort_inited:
-            self.rmapx, self.rmapy = invert_map(self.mapx, self.mapy)
+            self.rmapx, self.rmapy = self._get_inverted_maps()
             self._distort_inited = True
         distorted = np.zeros(np.shape(rectified))
         res = cv2.remap(rectified, self.rmapx, self.rmapy, cv2.INTER_NEAREST, distorted)
         return res
 
+    def _get_inverted_maps(self):
+        """ Returns invert_map(mapx, mapy), cached on disk per calibration. """
+        cache_name = 'invert_map-%s' % get_camera_info_hash(self.ci)
+
+        def f():
+            return invert_map(self.mapx, self.mapy)
+
+        return dtu.get_cached(cache_name, f, quiet=True)
+
     def rectify_full(self, cv_image_raw, interpolation=cv2.INTER_NEAREST, ratio=1):
         '''
 
@@ -206,89 +282,64 @@ class GroundProjectionGeometry(object):
 
 
 def invert_map(mapx, mapy):
+    """
+        Inverts the maps given by cv2.initUndistortRectifyMap: the pixel
+        (x, y) of the rectified image, which comes from (mapx, mapy) in the
+        distorted image, is scattered to the rounded target position.
+
+        If more than one pixel lands on the same target, the last one in
+        row-major order is kept. The holes are then filled with
+        fill_holes().
+    """
     H, W = mapx.shape[0:2]
     rmapx = np.empty_like(mapx)
     rmapx.fill(np.nan)
     rmapy = np.empty_like(mapx)
     rmapy.fill(np.nan)
 
-    for y, x in itertools.product(range(H), range(W)):
-        tx = mapx[y, x]
-        ty = mapy[y, x]
+    y, x = np.mgrid[0:H, 0:W]
+    tx = np.round(mapx.reshape((H, W))).ravel()
+    ty = np.round(mapy.reshape((H, W))).ravel()
+    x = x.ravel()
+    y = y.ravel()
 
-        tx = int(np.round(tx))
-        ty = int(np.round(ty))
+    valid = (0 <= tx) & (tx < W) & (0 <= ty) & (ty < H)
+    targets = ty[valid].astype('int64') * W + tx[valid].astype('int64')
+    x = x[valid]
+    y = y[valid]
 
-        if (0 <= tx < W) and (0 <= ty < H):
-            rmapx[ty, tx] = x
-            rmapy[ty, tx] = y
+    # keep the last source for each target
+    _, first_in_reversed = np.unique(targets[::-1], return_index=True)
+    last = len(targets) - 1 - first_in_reversed
 
-    # fill holes
-#     if False:
+    rmapx.reshape((H * W,))[targets[last]] = x[last]
+    rmapy.reshape((H * W,))[targets[last]] = y[last]
 
     fill_holes(rmapx, rmapy)
 
-#     D = 4
-#     for y, x in itertools.product(range(H), range(W)):
-#         v0 = max(y-D, 0)
-#         v1 = max(y+D, H-1)
-#         u0 = max(x-D, 0)
-#         u1 = max(x+D, W-1)
-#
-#         rmapx[y,x] = np.median(rmapx[v0:v1,u0:u1].flatten())
-#         rmapy[y,x] = np.median(rmapy[v0:v1,u0:u1].flatten())
-
     return rmapx, rmapy
 
 
 def fill_holes(rmapx, rmapy):
+    """ Fills the holes (NaNs) of the maps in place with the value of the nearest valid pixel. """
     H, W = rmapx.shape[0:2]
-
-    nholes = 0
-
-    R = 2
-    F = R * 2 + 1
-
-    def norm(x):
-        return np.hypot(x[0], x[1])
-
-    deltas0 = [ (i - R - 1, j - R - 1) for i, j in itertools.product(range(F), range(F))]
-    deltas0 = [x for x in deltas0 if norm(x) <= R]
-    deltas0.sort(key=norm)
-
-    def get_deltas():
-#         deltas = list(deltas0)
-#
-        return deltas0
-
-    holes = set()
-
-    for i, j in itertools.product(range(H), range(W)):
-        if np.isnan(rmapx[i, j]):
-            holes.add((i, j))
-
-    while holes:
-        nholes = len(holes)
-        nholes_filled = 0
-
-        for i, j in list(holes):
-            # there is nan
-            nholes += 1
-            for di, dj in get_deltas():
-                u = i + di
-                v = j + dj
-                if (0 <= u < H) and (0 <= v < W):
-                    if not np.isnan(rmapx[u, v]):
-                        rmapx[i, j] = rmapx[u, v]
-                        rmapy[i, j] = rmapy[u, v]
-                        nholes_filled += 1
-                        holes.remove((i, j))
-                        break
-
-#         print('holes %s filled: %s' % (nholes, nholes_filled))
-        if nholes_filled == 0:
-            break
-
-#     print('holes: %s' % holes)
-#     print('deltas: %s' % get_deltas())
-
+    rmapx = rmapx.reshape((H, W))
+    rmapy = rmapy.reshape((H, W))
+
+    holes = np.isnan(rmapx)
+    if not np.any(holes) or np.all(holes):
+        return
+
+    # for each pixel, the indices of the nearest pixel that is not a hole
+    _, (i, j) = distance_transform_edt(holes, return_indices=True)
+    rmapx[holes] = rmapx[i[holes], j[holes]]
+    rmapy[holes] = rmapy[i[holes], j[holes]]
+
+
+@dtu.contract(ci=CameraInfo, returns=str)
+def get_camera_info_hash(ci):
+    """ Returns a hash of the intrinsic calibration. """
+    parts = [np.asarray(x, dtype='float64').tostring()
+             for x in [ci.K, ci.D, ci.R, ci.P]]
+    parts.append('%s %s %s' % (ci.width, ci.height, ci.distortion_model))
+    return dtu.get_md5("".join(parts))
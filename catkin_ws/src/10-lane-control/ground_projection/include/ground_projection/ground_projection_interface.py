@@ -5,6 +5,7 @@ import cv2
 
 from duckietown_msgs.msg import Segment, SegmentList
 import duckietown_utils as dtu
+from geometry_msgs.msg import Point
 from ground_projection.configuration import get_extrinsics_filename
 import numpy as np
 from pi_camera import get_camera_info_for_robot
@@ -164,15 +165,23 @@ def find_ground_coordinates(gpg, sl, skip_not_on_ground=True):
     sl2 = SegmentList()
     sl2.header = sl.header
 
-    # Get ground truth of segmentList
-    for s1 in sl.segments:
-        g0 = gpg.vector2ground(s1.pixels_normalized[0])
-        g1 = gpg.vector2ground(s1.pixels_normalized[1])
+    segments = sl.segments
+    num = len(segments)
+
+    # Get ground truth of segmentList, two rows per segment
+    vectors = np.array([(v.x, v.y)
+                        for s1 in segments
+                        for v in s1.pixels_normalized], dtype='float64')
+    vectors = vectors.reshape((2 * num, 2))
+    ground = gpg.vectors2ground(vectors).reshape((num, 4))
+
+    for k, s1 in enumerate(segments):
+        x0, y0, x1, y1 = ground[k, :]
         if skip_not_on_ground:
-            if g0.x < cutoff or g1.x < cutoff:
+            if x0 < cutoff or x1 < cutoff:
                 continue
 
-        points = [g0, g1]
+        points = [Point(x0, y0, 0.0), Point(x1, y1, 0.0)]
         pixels_normalized = [s1.pixels_normalized[0], s1.pixels_normalized[1]]
         color = s1.color
         s2 = Segment(points=points, pixels_normalized=pixels_normalized, color=color)
@@ -1,6 +1,9 @@
-from duckietown_msgs.msg import Pixel, Segment, SegmentList
+from duckietown_msgs.msg import Pixel, Segment, SegmentList, Vector2D
 import duckietown_utils as dtu
 from ground_projection.ground_projection_geometry import GroundProjectionGeometry
+import numpy as np
+
+from .segment_array_list import SegmentArrayList
 
 
 @dtu.contract(gpg=GroundProjectionGeometry, s1=Segment, returns=Segment)
@@ -24,14 +27,40 @@ def rectify_segment(gpg, s1):
     return s2
 
 
-@dtu.contract(gpg=GroundProjectionGeometry, segment_list=SegmentList,
-              returns=SegmentList)
+@dtu.contract(gpg=GroundProjectionGeometry, returns=SegmentList)
 def rectify_segments(gpg, segment_list):
-    res = []
+    """
+        Same as rectify_segment() for each segment, in one batch.
+
+        segment_list can be a SegmentList or a SegmentArrayList.
+    """
+    if isinstance(segment_list, SegmentArrayList):
+        colors = segment_list.color.tolist()
+        num = len(colors)
+        vectors = segment_list.pixels_normalized.reshape((2 * num, 2)).astype('float64')
+    else:
+        dtu.check_isinstance(segment_list, SegmentList)
+        segments = segment_list.segments
+        colors = [segment.color for segment in segments]
+        num = len(segments)
 
-    for segment in segment_list.segments:
-        s2 = rectify_segment(gpg, segment)
+        # normalized coordinates, two rows per segment
+        vectors = np.array([(v.x, v.y)
+                            for segment in segments
+                            for v in segment.pixels_normalized], dtype='float64')
+        vectors = vectors.reshape((2 * num, 2))
+    # get pixel coordinates
+    pixels = gpg.vectors2pixels(vectors)
+    # rectify
+    rectified = gpg.rectify_points(pixels)
+    # recompute normalized coordinates
+    vectors2 = gpg.pixels2vectors(rectified)
+
+    res = []
+    for k, color in enumerate(colors):
+        pixels_normalized = [Vector2D(vectors2[2 * k, 0], vectors2[2 * k, 1]),
+                             Vector2D(vectors2[2 * k + 1, 0], vectors2[2 * k + 1, 1])]
+        s2 = Segment(color=color, pixels_normalized=pixels_normalized)
         res.append(s2)
 
     return SegmentList(segments=res)
-
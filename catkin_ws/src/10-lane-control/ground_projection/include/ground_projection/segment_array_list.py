@@ -0,0 +1,209 @@
+import struct
+
+from duckietown_msgs.msg import Segment, SegmentList, Vector2D
+import duckietown_utils as dtu
+from geometry_msgs.msg import Point
+import numpy as np
+
+__all__ = [
+    'SegmentArrayList',
+    'segment_array_list_from_lines',
+    'segment_array_list_from_segment_list',
+    'concatenate_segment_array_lists',
+    'deserialize_segment_array_list',
+]
+
+# The layout of one duckietown_msgs/Segment in the ROS wire format:
+#
+#   uint8 color
+#   duckietown_msgs/Vector2D[2] pixels_normalized  (float32 x, y)
+#   duckietown_msgs/Vector2D normal                 (float32 x, y)
+#   geometry_msgs/Point[2] points                   (float64 x, y, z)
+#
+# (little endian, no padding: 73 bytes)
+SEGMENT_WIRE_DTYPE = np.dtype([('color', '<u1'),
+                               ('pixels_normalized', '<f4', (2, 2)),
+                               ('normal', '<f4', (2,)),
+                               ('points', '<f8', (2, 3))])
+assert SEGMENT_WIRE_DTYPE.itemsize == 73
+
+_struct_I = struct.Struct('<I')
+_struct_3I = struct.Struct('<3I')
+
+
+class SegmentArrayList(object):
+    """
+        An array-backed SegmentList.
+
+        The segments are stored in one structured array (data) that has
+        the same memory layout as the segments in the SegmentList wire
+        format, so that serializing is a single copy, and the fields
+        are available as arrays:
+
+            color               (N,) uint8
+            pixels_normalized   (N, 2, 2) float32: [k, i] = (x, y) of the i-th point
+            normal              (N, 2) float32
+            points              (N, 2, 3) float64: [k, i] = (x, y, z) of the i-th point
+
+        The Segment objects are created only if the "segments" attribute
+        is accessed, so an object of this class can be used where a
+        SegmentList is read.
+
+        To publish it without creating the Segment objects, use
+        as_message().
+    """
+
+    def __init__(self, data, header=None):
+        dtu.check_isinstance(data, np.ndarray)
+        if data.dtype != SEGMENT_WIRE_DTYPE or data.ndim != 1:
+            msg = 'Expected 1D array of dtype %s, got %s %s.' % (SEGMENT_WIRE_DTYPE, data.dtype, data.shape)
+            raise ValueError(msg)
+        if header is None:
+            header = SegmentList().header
+        self.header = header
+        self.data = data
+        self._segments = None
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def color(self):
+        return self.data['color']
+
+    @property
+    def pixels_normalized(self):
+        return self.data['pixels_normalized']
+
+    @property
+    def normal(self):
+        return self.data['normal']
+
+    @property
+    def points(self):
+        return self.data['points']
+
+    @property
+    def segments(self):
+        """ The list of Segments (created at the first access). """
+        if self._segments is None:
+            self._segments = self._create_segments()
+        return self._segments
+
+    def _create_segments(self):
+        colors = self.color.tolist()
+        pixels_normalized = self.pixels_normalized.tolist()
+        normals = self.normal.tolist()
+        points = self.points.tolist()
+        segments = []
+        for k in range(len(colors)):
+            (a, b) = pixels_normalized[k]
+            (p, q) = points[k]
+            segment = Segment(color=colors[k],
+                              pixels_normalized=[Vector2D(a[0], a[1]), Vector2D(b[0], b[1])],
+                              normal=Vector2D(normals[k][0], normals[k][1]),
+                              points=[Point(p[0], p[1], p[2]), Point(q[0], q[1], q[2])])
+            segments.append(segment)
+        return segments
+
+    def select(self, which):
+        """
+            Returns a new SegmentArrayList with a copy of the segments
+            selected by "which" (a boolean mask or an array of indices),
+            with the same header.
+        """
+        return SegmentArrayList(self.data[which], header=self.header)
+
+    def to_segment_list(self):
+        """ Returns a SegmentList message with new Segment objects. """
+        return SegmentList(header=self.header, segments=self._create_segments())
+
+    def as_message(self):
+        """
+            Returns a SegmentList message that can be given to
+            rospy.Publisher.publish(); it is serialized directly from
+            the arrays. Its "segments" field is empty.
+        """
+        return _SegmentListFromArrays(self)
+
+    def serialize(self, buff):
+        """ Writes the SegmentList wire format to the buffer. """
+        header = self.header
+        buff.write(_struct_3I.pack(header.seq, header.stamp.secs, header.stamp.nsecs))
+        frame_id = header.frame_id
+        if isinstance(frame_id, unicode):
+            frame_id = frame_id.encode('utf-8')
+        buff.write(_struct_I.pack(len(frame_id)))
+        buff.write(frame_id)
+        buff.write(_struct_I.pack(len(self)))
+        buff.write(self.data.tostring())
+
+
+class _SegmentListFromArrays(SegmentList):
+    """ A SegmentList whose serialize() writes the arrays of a SegmentArrayList. """
+
+    __slots__ = ['_arrays']
+
+    def __init__(self, arrays):
+        # The header is shared, so that the sequence number set by
+        # the publisher is the one written.
+        SegmentList.__init__(self, header=arrays.header, segments=[])
+        self._arrays = arrays
+
+    def serialize(self, buff):
+        self._arrays.serialize(buff)
+
+
+def deserialize_segment_array_list(s):
+    """ Reads a SegmentArrayList from a string in the SegmentList wire format. """
+    header = SegmentList().header
+    seq, secs, nsecs = _struct_3I.unpack_from(s, 0)
+    header.seq = seq
+    header.stamp.secs = secs
+    header.stamp.nsecs = nsecs
+    start = _struct_3I.size
+    length, = _struct_I.unpack_from(s, start)
+    start += _struct_I.size
+    header.frame_id = s[start:start + length]
+    start += length
+    num, = _struct_I.unpack_from(s, start)
+    start += _struct_I.size
+    data = np.frombuffer(s, dtype=SEGMENT_WIRE_DTYPE, count=num, offset=start).copy()
+    return SegmentArrayList(data, header=header)
+
+
+@dtu.contract(lines='array[Nx4]', normals='array[Nx2]', color=int)
+def segment_array_list_from_lines(lines, normals, color, header=None):
+    """
+        Creates the segments of one color from the detector output:
+        lines[k] = (x1, y1, x2, y2) in normalized coordinates.
+    """
+    num = lines.shape[0]
+    data = np.zeros(num, dtype=SEGMENT_WIRE_DTYPE)
+    data['color'] = color
+    data['pixels_normalized'] = lines.reshape((num, 2, 2))
+    data['normal'] = normals
+    return SegmentArrayList(data, header=header)
+
+
+def concatenate_segment_array_lists(sals, header=None):
+    """ Concatenates the segments of a sequence of SegmentArrayLists. """
+    if sals:
+        data = np.concatenate([sal.data for sal in sals])
+    else:
+        data = np.zeros(0, dtype=SEGMENT_WIRE_DTYPE)
+    return SegmentArrayList(data, header=header)
+
+
+@dtu.contract(segment_list=SegmentList, returns=SegmentArrayList)
+def segment_array_list_from_segment_list(segment_list):
+    """ Converts a SegmentList message (the header is shared). """
+    segments = segment_list.segments
+    num = len(segments)
+    data = np.zeros(num, dtype=SEGMENT_WIRE_DTYPE)
+    if num:
+        data['color'] = [s.color for s in segments]
+        data['pixels_normalized'] = [[(p.x, p.y) for p in s.pixels_normalized] for s in segments]
+        data['normal'] = [(s.normal.x, s.normal.y) for s in segments]
+        data['points'] = [[(p.x, p.y, p.z) for p in s.points] for s in segments]
+    return SegmentArrayList(data, header=segment_list.header)
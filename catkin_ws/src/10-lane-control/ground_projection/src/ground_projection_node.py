@@ -3,9 +3,11 @@
 from cv_bridge import CvBridge, CvBridgeError
 from duckietown_msgs.msg import (Segment, SegmentList)
 import duckietown_utils as dtu
+from geometry_msgs.msg import Point
 from ground_projection.ground_projection_interface import GroundProjection, \
     get_ground_projection_geometry_for_robot
 from ground_projection.srv import EstimateHomography, EstimateHomographyResponse, GetGroundCoord, GetGroundCoordResponse, GetImageCoord, GetImageCoordResponse  #@UnresolvedImport
+import numpy as np
 import rospy
 from sensor_msgs.msg import (Image, CameraInfo)
 
@@ -51,10 +53,17 @@ class GroundProjectionNode(object):
     def lineseglist_cb(self, seglist_msg):
         seglist_out = SegmentList()
         seglist_out.header = seglist_msg.header
-        for received_segment in seglist_msg.segments:
+        segments = seglist_msg.segments
+        num = len(segments)
+        # project all the endpoints at once, two rows per segment
+        vectors = np.array([(v.x, v.y)
+                            for received_segment in segments
+                            for v in received_segment.pixels_normalized], dtype='float64')
+        ground = self.gpg.vectors2ground(vectors.reshape((2 * num, 2)))
+        for k, received_segment in enumerate(segments):
             new_segment = Segment()
-            new_segment.points[0] = self.gpg.vector2ground(received_segment.pixels_normalized[0])
-            new_segment.points[1] = self.gpg.vector2ground(received_segment.pixels_normalized[1])
+            new_segment.points[0] = Point(ground[2 * k, 0], ground[2 * k, 1], 0.0)
+            new_segment.points[1] = Point(ground[2 * k + 1, 0], ground[2 * k + 1, 1], 0.0)
             new_segment.color = received_segment.color
             # TODO what about normal and points
             seglist_out.segments.append(new_segment)
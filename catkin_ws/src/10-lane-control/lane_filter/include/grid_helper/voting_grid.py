@@ -1,6 +1,7 @@
 from collections import OrderedDict
 import collections
 import itertools
+import threading
 
 import duckietown_utils as dtu
 import numpy as np
@@ -9,6 +10,7 @@ import warnings
 
 __all__ = [
     'GridHelper',
+    'get_grid_helper',
 ]
 
 VotingGridVarSpec = collections.namedtuple('VotingGridVarSpec',
@@ -42,10 +44,8 @@ class GridHelper(object):
         
         H, W = self.shape = self._mgrids[0].shape 
         self._centers = [np.zeros(shape=(H, W)),np.zeros(shape=(H, W))]
-        
-        for i, j in itertools.product(range(H), range(W)):
-            self._centers[0][i,j] = s0.min + (i+0.5)*s0.resolution
-            self._centers[1][i,j] = s1.min + (j+0.5)*s1.resolution
+        self._centers[0][:, :] = (s0.min + (np.arange(H) + 0.5) * s0.resolution)[:, np.newaxis]
+        self._centers[1][:, :] = (s1.min + (np.arange(W) + 0.5) * s1.resolution)[np.newaxis, :]
 
         # these are the bounds you would give to pcolor
         # there is one row and one column more
@@ -73,6 +73,13 @@ class GridHelper(object):
         
         self.K0 = K0
         self.K1 = K1
+
+        # scratch buffers for add_vote_faster(), reused across calls
+        self._local = threading.local()
+
+        # the grids are shared by all the users of get_grid_helper()
+        for grid in self._mgrids + self._mgrids_plus + self._centers:
+            grid.flags.writeable = False
         # self.K0 = lambda x: gaussian_kernel(x, self._specs[0].resolution)
 #         self.K1 = lambda x: gaussian_kernel(x, self._specs[1].resolution)
         
@@ -146,169 +153,113 @@ class GridHelper(object):
         return len(targets)
 
 
-    def multiply(self, values, weights, F):
-        N = values.shape[1]
-        
-        factor = {0: 1, 1: 9, 2: 25}[F]
-        M = N * factor
-        values2 = np.empty(shape=(2,M), dtype=self.precision)
-        weights2 = np.empty(shape=M, dtype=self.precision)
-        values_ref2 = np.empty(shape=(2,M), dtype=self.precision)
-        group = np.empty(shape=M, dtype='int16')
-        
-        cell_size_0 = self._specs[0].resolution
-        cell_size_1 = self._specs[1].resolution
-            
-        nd = 0
-        
-        for k, (di, dj) in enumerate(itertools.product(range(-F,F+1), range(-F,F+1))):
-            off = N*k
-            # same value ref
-            values_ref2[:, off:off+N] = values
-            weights2[off:off+N] = weights
-            values2[:, off:off+N] = values
-            values2[0, off:off+N] += di * cell_size_0 
-            values2[1, off:off+N] += dj * cell_size_1 
-            
-#             print('di %s %s  diffco \n%s\n%s' %(di, dj, 
-#                                                 values2[0, off:off+N] - values_ref2[0, off:off+N],
-#                                                 values2[1, off:off+N] - values_ref2[1, off:off+N]  ))
-            group[off:off+N] = np.array(range(N))
-            nd += 1
-            
-        assert nd == factor
-        return factor, values_ref2, values2, weights2, group
-        
+    def _scratch(self, name, shape, dtype='float64'):
+        """
+            Returns a buffer of the given shape that is reused
+            across calls (it is reallocated only if it needs to grow).
+        """
+        # one set of buffers per thread, as the GridHelper can be shared
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        size = int(np.prod(shape))
+        buf = buffers.get(name, None)
+        if buf is None or buf.size < size or buf.dtype != np.dtype(dtype):
+            buf = np.empty(shape=size, dtype=dtype)
+            buffers[name] = buf
+        return buf[:size].reshape(shape)
+
+    def _kernel_stencil(self, a, values, offsets):
+        """
+            Computes the separable part of the kernel along axis a.
+
+            Returns the cell indices (N x D) and the normalized kernel
+            weights (N x D) of the D = 2F+1 cells around each value.
+        """
+        spec = self._specs[a]
+        N = values.shape[0]
+        D = offsets.shape[0]
+
+        # continuous coordinates, in cells
+        x = self._scratch('x%d' % a, N)
+        np.subtract(values, spec.min, out=x)
+        np.multiply(x, 1.0 / spec.resolution, out=x)
+        base = self._scratch('base%d' % a, N)
+        np.floor(x, out=base)
+
+        cells = self._scratch('cells%d' % a, (N, D), 'int64')
+        np.add(base[:, np.newaxis], offsets[np.newaxis, :], out=cells, casting='unsafe')
+
+        # distance from the cell centers, in cells: K(x) = exp(-(x/res)^2)
+        k = self._scratch('k%d' % a, (N, D))
+        np.subtract(x[:, np.newaxis], base[:, np.newaxis] + (offsets + 0.5)[np.newaxis, :], out=k)
+        np.multiply(k, k, out=k)
+        np.negative(k, out=k)
+        np.exp(k, out=k)
+        # normalizing each axis normalizes the product over the D x D cells
+        np.divide(k, np.sum(k, axis=1)[:, np.newaxis], out=k)
+        return cells, k
+
     @dtu.contract(target='array', values='array[2xN]', weights='array[N]')
     def add_vote_faster(self, target, values, weights, F = 1, counts=None):
-        
-        with dtu.timeit_clock("adding additional votes (orig: %s)" % values.shape[1]):
-            _factor, values_ref, values, weights, group = self.multiply(values, weights, F)
-        
-#         cells_in_group = np.zeros(len(group))
-#         for i in range(len(group)):
-#             cells_in_group[group[i]] += 1
-#         print('cells_in_group: %s' % cells_in_group)
-        
-       
-        
-#         diff = values - values_ref
-#         for a in [0,1]:
-#             print('diff %s min %s max %s res %s' % (a, np.min(diff[a,:]), np.max(diff[a,:]),
-#                                                     self._specs[a].resolution))
-        
-        with dtu.timeit_clock("computing coordinates (nvalid = %s)" % values.shape[1]):
-                
-            nvalid = values.shape[1]
-            
-            coords = np.zeros((2, nvalid), dtype='int32')
-            K = [self.K0, self.K1]
-            
-            
-            for a in range(2):
-                spec = self._specs[a]
-                inv_resolution  = 1.0 / spec.resolution
-                x = (values[a, :] - spec.min) * inv_resolution
-                
-    #             print('values[%d] = %s' % (a, values[a, :]))
-    #             print('x = %s' % x)
-                coords[a, :] = np.floor(x)
-    #             print('coords[%d] = %s' % (a, coords[a, :]))
-                xr = (values_ref[a, :] - spec.min) * inv_resolution
-                
-                dc = (xr - (coords[a, :] + 0.5))
-                
-    #             print('dc[%d] = %s' % (a, dc)) 
-                dr = dc * spec.resolution 
-            
-                k = 1
-                k = K[a](dr)
-                
-                weights *= k
-        
-        if nvalid == 0:
+        """
+            Same as calling add_vote() for each column of values.
+
+            As in add_vote(), the kernel weights of each vote are
+            normalized, so that each vote adds a total of 1 to the cells
+            around it (minus what falls outside of the grid); votes with
+            zero weight are ignored.
+
+            The Gaussian kernel is separable, so it is evaluated only on
+            the 2F+1 cells along each axis, and the (2F+1)^2 weights of
+            each vote are their outer product. All the contributions are
+            then accumulated with a single np.bincount.
+        """
+        N = values.shape[1]
+        D = 2 * F + 1
+        nvalid = N * D * D
+        if N == 0:
             return 0
-                
-        with dtu.timeit_clock("normalizing weights"):
-                
-            ngroups = np.max(group) + 1
-            
-            weight_group = np.zeros(ngroups)
-            if False:
-                for i in range(len(weights)):
-                    weight_group[group[i]] += weights[i]
-            else:    
-                np.add.at(weight_group, group, weights)
-    
-                
-            assert len(weights) == nvalid
-            weights_normalized = weights / weight_group[group]
-            
-     
-        with dtu.timeit_clock("selecting valid (using %d)" % values.shape[1]):
-            AND = np.logical_and
-            inside0 = AND(self._specs[0].min <= values[0, :],  values[0, :] <= self._specs[0].max)
-            inside1 = AND(self._specs[1].min <= values[1, :],  values[1, :] <= self._specs[1].max)
-            inside = AND(inside0, inside1)
-    #         hits = np.sum(inside)
-    #         misses = len(inside) - hits
-    #         print('num hit: %s (eq %d)  misses %s (eq %d) ' % (hits, hits/_factor, misses, misses/_factor))
-            
-            # only consider inside
-            values = values[:, inside]
-            values_ref = values_ref[:, inside]
-            weights = weights[inside]
-            weights_normalized = weights_normalized[inside]
-            group = group[inside]
-            
-            coords = coords[:, inside]
-            
-            
-        with dtu.timeit_clock("using numpy.at"):
-            np.add.at(target, tuple(coords), weights_normalized)
-        
+
+        H, W = self.shape
+        offsets = np.arange(-F, F + 1)
+
+        with dtu.timeit_clock("computing kernel weights", details="orig: %s" % N):
+            cells0, k0 = self._kernel_stencil(0, values[0, :], offsets)
+            cells1, k1 = self._kernel_stencil(1, values[1, :], offsets)
+
+            w0 = self._scratch('w0', (N, D))
+            np.multiply(k0, (weights > 0)[:, np.newaxis], out=w0)
+            w = self._scratch('w', (N, D, D))
+            np.multiply(w0[:, :, np.newaxis], k1[:, np.newaxis, :], out=w)
+
+        with dtu.timeit_clock("selecting valid", details="using %d" % nvalid):
+            inside0 = self._scratch('inside0', (N, D), 'bool')
+            np.less(cells0, H, out=inside0)
+            inside0 &= cells0 >= 0
+            inside1 = self._scratch('inside1', (N, D), 'bool')
+            np.less(cells1, W, out=inside1)
+            inside1 &= cells1 >= 0
+            inside = self._scratch('inside', (N, D, D), 'bool')
+            np.logical_and(inside0[:, :, np.newaxis], inside1[:, np.newaxis, :], out=inside)
+
+            # the cells outside get weight 0 and are sent to cell 0
+            flat = self._scratch('flat', (N, D, D), 'int64')
+            np.multiply(cells0[:, :, np.newaxis], W, out=flat)
+            np.add(flat, cells1[:, np.newaxis, :], out=flat)
+            np.multiply(flat, inside, out=flat)
+            np.multiply(w, inside, out=w)
+
+        with dtu.timeit_clock("using bincount"):
+            flat = flat.reshape(-1)
+            votes = np.bincount(flat, weights=w.reshape(-1), minlength=H * W)
+            target += votes.reshape((H, W))
+
         if counts is not None:
             with dtu.timeit_clock("update counts"):
-                for i in range(nvalid):
-                    counts[coords[0, i], coords[1, i]] += 1
-        
+                hits = np.bincount(flat, weights=inside.reshape(-1), minlength=H * W)
+                counts += hits.reshape((H, W)).astype(counts.dtype)
+
         return nvalid
-     
-            
-#         print('cells_in_group: %s' % cells_in_group)
-#         print(weight_group)
-#         
-#         for i in range(len(weights)):
-#             print('i %s weight %s group weight %s' % (i, weights[i], weight_group[group[i]]))
-# #     
-             
-#         print('weight weights_normalized %s' % weights_normalized)
 
-#         print('weight group %s' % list(weight_group))
-#         weights_normalized = weights 
-        
-#         nonz = weights_normalized > 0 
-#         print('weights_normalized: min %s max %s' % (
-#                                                         np.min(weights_normalized[nonz]),
-#                                                         np.max(weights_normalized[nonz])))
-#
-#         target0 = target.copy()
-#         with dtu.timeit_clock("adding using indices"):
-#             # One of the bottlenecks is here
-#             
-#             for i in range(nvalid):
-#                 target0[coords[0, i], coords[1, i]] += weights_normalized[i]
-            # XXX: not equivalent! (think about same coords)          
-            # target[coords[0, :], coords[1, :]] += weights_normalized
-                
-#         if False:
-#             with dtu.timeit_clock(pre + "using histogramdd"):
-#                 bins = [np.arange(d + 1) for d in target.shape]
-#                 out, _ = np.histogramdd(coords.T, bins, weights=weights_normalized)
-#                 target += out
-#             
-    
-    
     def get_max(self, target):
         """ Returns a dictionary """
         assert self.shape == target.shape
@@ -322,38 +273,54 @@ class GridHelper(object):
         return d
     
     def get_max_weighted(self, target, F=1):
+        """
+            Returns the average of the cell centers around the maximum,
+            weighted by the values of target (in a (2F+1)x(2F+1) window).
+        """
         assert self.shape == target.shape
         check_no_nans(target)
         amax = target.argmax()
         maxids = np.unravel_index(amax, target.shape)
         i, j = maxids
         H, W = self.shape
-        v0 = []
-        v1 = []
-        weights = []
 
-        for di, dj in itertools.product(range(-F,F+1), range(-F,F+1)):
-            u = i + di
-            v = j + dj
-            
-            if not ((0<=u<H) and (0<=v<W)):
-                continue
-            
-            v0.append(self._centers[0][u,v])
-            v1.append(self._centers[1][u,v])
-            weights.append(target[u, v])
-        
-        v0 = np.array(v0)
-        v1 = np.array(v1)
+        # the window, clipped to the grid
+        window = (slice(max(i - F, 0), min(i + F + 1, H)),
+                  slice(max(j - F, 0), min(j + F + 1, W)))
+        weights = target[window]
+
         s = np.sum(weights)
-        mean0 = np.sum(v0*weights) / s 
-        mean1 = np.sum(v1*weights) / s
-            
+        mean0 = np.sum(self._centers[0][window] * weights) / s
+        mean1 = np.sum(self._centers[1][window] * weights) / s
+
         d = OrderedDict()
         d[self._names[0]] = mean0
         d[self._names[1]] = mean1
         return d
 
+
+@dtu.contract(variables='dict(str:dict)')
+def get_grid_helper(variables, precision='float32'):
+    """
+        Returns a GridHelper for the given variables.
+
+        GridHelpers are cached by their specification, so asking again
+        for the same grid (for example when a filter is re-created)
+        does not recompute the grids.
+    """
+    dtu.check_isinstance(variables, OrderedDict)
+    key = tuple((name, spec_from_yaml(spec)) for name, spec in variables.items())
+    return _get_grid_helper_cached(key, precision)
+
+
+@dtu.memoize_simple
+def _get_grid_helper_cached(key, precision):
+    variables = OrderedDict()
+    for name, spec in key:
+        variables[name] = dict(spec._asdict())
+    return GridHelper(variables, precision=precision)
+
+
 def gaussian_kernel(x, sigma):
     d = x/sigma
     return np.exp(-np.power(d, 2))
@@ -1,5 +1,6 @@
 import collections
 import os
+import time
 
 from numpy.testing.utils import assert_equal, assert_almost_equal
 
@@ -119,5 +120,65 @@ def compare_faster2():
     assert_almost_equal(val_fast, val_slow)
 
 
+def get_test_grid_helper():
+    variables = collections.OrderedDict()
+    variables['d'] = dict(min=-0.15, max=0.3, description="distance", resolution=0.01,
+                          units='m', units_display='cm')
+    variables['dstop'] = dict(min=-0.1, max=0.5, description="distance", resolution=0.01,
+                              units='m', units_display='cm')
+    return GridHelper(variables, precision='float64')
+
+
+@dtu.unit_test
+def compare_faster_many():
+    gh = get_test_grid_helper()
+    np.random.seed(6)
+    N = 200
+    # add_vote() only works away from the borders
+    values = np.zeros((2, N))
+    values[0, :] = np.random.uniform(-0.12, 0.27, N)
+    values[1, :] = np.random.uniform(-0.07, 0.47, N)
+    weights = np.random.uniform(0.5, 2, N)
+
+    for F in [0, 1, 2]:
+        val_slow = gh.create_new()
+        val_slow.fill(0)
+        counts_slow = np.zeros(gh.shape, dtype='int')
+        for i in range(N):
+            value = dict(d=values[0, i], dstop=values[1, i])
+            gh.add_vote(val_slow, value, weights[i], F, counts=counts_slow)
+
+        val_fast = gh.create_new()
+        val_fast.fill(0)
+        counts_fast = np.zeros(gh.shape, dtype='int')
+        gh.add_vote_faster(val_fast, values, weights, F, counts=counts_fast)
+
+        assert_almost_equal(val_fast, val_slow)
+        assert_equal(counts_fast, counts_slow)
+
+
+@dtu.unit_test
+def benchmark_faster():
+    gh = get_test_grid_helper()
+    np.random.seed(7)
+    N = 20000
+    values = np.zeros((2, N))
+    values[0, :] = np.random.uniform(-0.15, 0.3, N)
+    values[1, :] = np.random.uniform(-0.1, 0.5, N)
+    weights = np.random.uniform(0, 1, N)
+    target = gh.create_new('float32')
+    target.fill(0)
+    ntimes = 10
+    for F in [0, 1, 2]:
+        # first call allocates the scratch buffers
+        gh.add_vote_faster(target, values, weights, F)
+        t0 = time.time()
+        for _ in range(ntimes):
+            gh.add_vote_faster(target, values, weights, F)
+        delta = (time.time() - t0) / ntimes
+        print('F = %d: %8.0f votes/s (%d votes in %.2f ms)' %
+              (F, N / delta, N, delta * 1000))
+
+
 if __name__ == '__main__':
     dtu.run_tests_for_this_module()
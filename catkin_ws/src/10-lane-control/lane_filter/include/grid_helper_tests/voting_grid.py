@@ -6,7 +6,7 @@ from numpy.testing.utils import assert_equal, assert_almost_equal
 import duckietown_utils as dtu
 from grid_helper.grid_helper_visualization import grid_helper_plot,\
     grid_helper_plot_field, grid_helper_annotate_axes, grid_helper_mark_point
-from grid_helper.voting_grid import GridHelper
+from grid_helper.voting_grid import GridHelper, get_grid_helper
 import numpy as np
 
 
@@ -34,6 +34,28 @@ def grid1():
     assert_equal(gh._mgrids_plus[0].shape, (shape[0]+1, shape[1] +1))
 
 
+@dtu.unit_test
+def grid_cached():
+    variables = collections.OrderedDict()
+    variables['x'] = dict(min=1, max=2, description="X variable", resolution=0.1,
+                          units='m', units_display='cm')
+    variables['y'] = dict(min=3, max=5, description="Y variable", resolution=0.2,
+                          units='m', units_display='cm')
+    gh = get_grid_helper(variables)
+    assert gh is get_grid_helper(collections.OrderedDict(variables))
+
+    H, W = gh.get_shape()
+    for i in range(H):
+        for j in range(W):
+            assert gh._centers[0][i, j] == 1 + (i + 0.5) * 0.1
+            assert gh._centers[1][i, j] == 3 + (j + 0.5) * 0.2
+
+    variables['y'] = dict(variables['y'], resolution=0.1)
+    gh2 = get_grid_helper(variables)
+    assert gh2 is not gh
+    assert_equal(gh2.get_shape(), (10, 20))
+
+
 @dtu.unit_test
 def grid_visualization():
     variables = collections.OrderedDict()
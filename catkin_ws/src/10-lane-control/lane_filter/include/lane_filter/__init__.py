@@ -2,5 +2,7 @@ FAMILY_LANE_FILTER = 'lane_filter'
 
 from .lane_filter import *
 from .lane_filter_classic import *
+from .histogram_predict import *
 from .lane_filter_interface import *
+from .segment_arrays import *
 
@@ -0,0 +1,62 @@
+from scipy.ndimage.filters import gaussian_filter
+
+import numpy as np
+
+__all__ = [
+    'predict_histogram_beliefs',
+]
+
+
+def predict_histogram_beliefs(beliefs, d, phi, dt, v, w,
+                              d_min, d_max, phi_min, phi_max,
+                              delta_d, delta_phi, cov_mask):
+    """
+        Applies the process model to a stack of (d, phi) histograms at once.
+
+        beliefs: array of shape (K, H, W), one histogram per belief
+        d, phi: the (H, W) grids of the lower corners of the cells
+
+        Every cell is moved to the cell that contains
+        (d + v * dt * sin(phi), phi + w * dt); cells that land outside
+        of the histogram are dropped. The target indices are computed
+        once for all beliefs, the mass is binned with a single
+        np.bincount, and the Gaussian diffusion (standard deviation
+        cov_mask, in cells) is applied to the whole stack in one call.
+
+        Returns the diffused, non-normalized beliefs, shape (K, H, W).
+
+        The result is the same as moving each cell in a Python loop and
+        then calling gaussian_filter() on each belief separately: the
+        mass is accumulated in the same order as the loop.
+    """
+    K = beliefs.shape[0]
+    H, W = d.shape
+
+    d_t = d + v * dt * np.sin(phi)
+    phi_t = phi + w * dt
+
+    inside = (d_t >= d_min) & (d_t <= d_max) & \
+             (phi_t >= phi_min) & (phi_t <= phi_max)
+
+    i_new = np.floor((d_t - d_min) / delta_d).astype('int64')
+    j_new = np.floor((phi_t - phi_min) / delta_phi).astype('int64')
+    # the upper bound can round to one cell past the end of the grid
+    inside &= (i_new < H) & (j_new < W)
+
+    targets = (i_new * W + j_new)[inside]
+    n = H * W
+
+    # only positive cells carry mass (this also drops NaNs)
+    sources = beliefs[:, inside]
+    sources = np.where(sources > 0, sources, 0.0)
+
+    offsets = np.arange(K, dtype='int64')[:, np.newaxis] * n
+    indices = (offsets + targets[np.newaxis, :]).ravel()
+    p_beliefs = np.bincount(indices, weights=sources.ravel(), minlength=K * n)
+    p_beliefs = p_beliefs.reshape((K, H, W))
+
+    s_beliefs = np.zeros((K, H, W))
+    # a zero sigma along the first axis keeps the beliefs separate
+    sigma = [0] + list(cov_mask)
+    gaussian_filter(p_beliefs, sigma, output=s_beliefs, mode='constant')
+    return s_beliefs
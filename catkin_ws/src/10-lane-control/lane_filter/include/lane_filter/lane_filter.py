@@ -3,22 +3,23 @@ from collections import OrderedDict
 from math import floor
 
 from numpy.testing.utils import assert_almost_equal
-from scipy.ndimage.filters import gaussian_filter
 from scipy.stats import multivariate_normal, entropy
 
-from duckietown_msgs.msg import SegmentList
+from duckietown_msgs.msg import Segment, SegmentList
 import duckietown_utils as dtu
 
 from duckietown_utils.parameters import Configurable
 
 import numpy as np
 
+from .histogram_predict import predict_histogram_beliefs
+from .lane_filter_classic import generate_votes_d_phi
 from .lane_filter_interface import LaneFilterInterface
+from .segment_arrays import get_segment_arrays
 
 from .visualization import plot_phi_d_diagram_bgr
 
 from scipy.stats import multivariate_normal
-from scipy.ndimage.filters import gaussian_filter
 from math import floor, sqrt
 import copy
 
@@ -130,31 +131,20 @@ class LaneFilterHistogram(Configurable, LaneFilterInterface):
     #
 
     def predict(self, dt, v, w):
-        delta_t = dt
-        d_t = self.d + v * delta_t * np.sin(self.phi)
-        phi_t = self.phi + w * delta_t
+        # the process model is applied to all curvature beliefs at once
+        beliefs = np.array(self.beliefArray[:self.curvature_res])
+        if len(beliefs) == 0:
+            return
+
+        s_beliefs = predict_histogram_beliefs(beliefs, self.d, self.phi,
+                                              dt=dt, v=v, w=w,
+                                              d_min=self.d_min, d_max=self.d_max,
+                                              phi_min=self.phi_min, phi_max=self.phi_max,
+                                              delta_d=self.delta_d, delta_phi=self.delta_phi,
+                                              cov_mask=self.cov_mask)
 
         for k in range(self.curvature_res):
-            p_belief = np.zeros(self.beliefArray[k].shape)
-
-            # there has got to be a better/cleaner way to do this - just applying the process model to translate each cell value
-            for i in range(self.beliefArray[k].shape[0]):
-                for j in range(self.beliefArray[k].shape[1]):
-                    if self.beliefArray[k][i, j] > 0:
-                        if d_t[i, j] > self.d_max or d_t[i, j] < self.d_min or phi_t[i, j] < self.phi_min or phi_t[i, j] > self.phi_max:
-                            continue
-
-                        i_new = int(
-                            floor((d_t[i, j] - self.d_min) / self.delta_d))
-                        j_new = int(
-                            floor((phi_t[i, j] - self.phi_min) / self.delta_phi))
-
-                        p_belief[i_new, j_new] += self.beliefArray[k][i, j]
-
-            s_belief = np.zeros(self.beliefArray[k].shape)
-            gaussian_filter(p_belief, self.cov_mask,
-                            output=s_belief, mode='constant')
-
+            s_belief = s_beliefs[k]
             if np.sum(s_belief) == 0:
                 return
             self.beliefArray[k] = s_belief / np.sum(s_belief)
@@ -224,11 +214,11 @@ class LaneFilterHistogram(Configurable, LaneFilterInterface):
 
     # generate the belief arrays
     def update(self, segments):
-        # prepare the segments for each belief array
-        segmentsRangeArray = self.prepareSegments(segments)
+        # the likelihoods for all the belief arrays are generated in one pass
+        measurement_likelihoods = self.generate_measurement_likelihoods(segments)
         # generate all belief arrays
         for i in range(self.curvature_res + 1):
-            measurement_likelihood = self.generate_measurement_likelihood(segmentsRangeArray[i])
+            measurement_likelihood = measurement_likelihoods[i]
 
             if measurement_likelihood is not None:
                 self.beliefArray[i] = np.multiply(self.beliefArray[i], measurement_likelihood)
@@ -261,6 +251,96 @@ class LaneFilterHistogram(Configurable, LaneFilterInterface):
             np.sum(measurement_likelihood)
         return measurement_likelihood
 
+    def generate_measurement_likelihoods(self, segments):
+        """
+            Batched version of prepareSegments() followed by
+            generate_measurement_likelihood() for each belief array.
+
+            The segments are converted to arrays once; the votes and the
+            range buckets of all segments are computed in a single
+            vectorized pass, and all the histograms are filled with
+            one call to np.bincount.
+
+            As in prepareSegments(), the RED segments are reported as
+            WHITE in filtered_segments if red_to_white is set; they are
+            copies, the given segments are not modified.
+
+            Returns a list with curvature_res + 1 elements,
+            each either a likelihood or None.
+        """
+        arrays = get_segment_arrays(segments)
+        color, p1, p2 = arrays.color, arrays.p1, arrays.p2
+
+        # Optional transform from RED to WHITE
+        recolor = None
+        if self.red_to_white:
+            recolor = color == Segment.RED
+            color = np.where(recolor, Segment.WHITE, color)
+
+        # we don't care about RED ones for now
+        keep = (color == Segment.WHITE) | (color == Segment.YELLOW)
+        # Optional filtering out YELLOW
+        if not self.use_yellow:
+            keep &= (color != Segment.YELLOW)
+        # filter out any segments that are behind us
+        keep &= (p1[:, 0] >= 0) & (p2[:, 0] >= 0)
+
+        if hasattr(segments, 'select'):
+            # array-backed (SegmentArrayList)
+            self.filtered_segments = segments.select(keep)
+            if recolor is not None:
+                self.filtered_segments.color[recolor[keep]] = Segment.WHITE
+        else:
+            self.filtered_segments = [segments[k] for k in np.flatnonzero(keep)]
+            if recolor is not None:
+                for k in np.flatnonzero(recolor[keep]):
+                    segment = copy.copy(self.filtered_segments[k])
+                    segment.color = Segment.WHITE
+                    self.filtered_segments[k] = segment
+        color = color[keep]
+        p1 = p1[keep, :]
+        p2 = p2[keep, :]
+
+        # in_range[i, k] is True if segment k is used for the belief array i
+        num_beliefs = self.curvature_res + 1
+        point_range = self.getSegmentDistances(p1, p2)
+        in_range = np.zeros((num_beliefs, len(color)), dtype='bool')
+        in_range[0, :] = (point_range < self.range_est) & \
+                         (point_range > self.range_est_min)
+        if self.curvature_res != 0:
+            lower = self.range_arr[:self.curvature_res, np.newaxis]
+            upper = self.range_arr[1:self.curvature_res + 1, np.newaxis]
+            in_range[1:, :] = (point_range < upper) & (point_range > lower)
+
+        d_i, phi_i = self.generateVotes(color, p1, p2)
+
+        # if the vote lands outside of the histogram discard it
+        H, W = self.d.shape
+        with np.errstate(invalid='ignore'):
+            valid = (d_i <= self.d_max) & (d_i >= self.d_min) & \
+                    (phi_i >= self.phi_min) & (phi_i <= self.phi_max)
+        i = np.zeros(len(d_i), dtype='int64')
+        j = np.zeros(len(d_i), dtype='int64')
+        i[valid] = np.floor((d_i[valid] - self.d_min) / self.delta_d)
+        j[valid] = np.floor((phi_i[valid] - self.phi_min) / self.delta_phi)
+        valid &= (i < H) & (j < W)
+
+        belief_index, segment_index = np.nonzero(in_range & valid)
+        n = H * W
+        cells = belief_index * n + i[segment_index] * W + j[segment_index]
+        counts = np.bincount(cells, minlength=num_beliefs * n)
+        counts = counts.reshape((num_beliefs, H, W)).astype('float64')
+
+        measurement_likelihoods = []
+        for measurement_likelihood in counts:
+            if np.linalg.norm(measurement_likelihood) == 0:
+                measurement_likelihoods.append(None)
+            else:
+                measurement_likelihood = measurement_likelihood / \
+                    np.sum(measurement_likelihood)
+                measurement_likelihoods.append(measurement_likelihood)
+        return measurement_likelihoods
+
     # get the maximal values d_max and phi_max from the belief array. The first belief array (beliefArray[0]) includes the actual belief of the Duckiebots position. The further belief arrays are used for the curvature estimation.
     def getEstimate(self):
         d_max = np.zeros(self.curvature_res + 1)
@@ -358,6 +438,12 @@ class LaneFilterHistogram(Configurable, LaneFilterInterface):
         weight = 1
         return d_i, phi_i, l_i, weight
 
+    # generate the votes for arrays of segments (same as generateVote)
+    def generateVotes(self, color, p1, p2):
+        return generate_votes_d_phi(color, p1, p2,
+                                    linewidth_white=self.linewidth_white,
+                                    linewidth_yellow=self.linewidth_yellow,
+                                    lanewidth=self.lanewidth)
 
     # get the distance from the center of the Duckiebot to the center point of a segment
     def getSegmentDistance(self, segment):
@@ -365,7 +451,14 @@ class LaneFilterHistogram(Configurable, LaneFilterInterface):
         y_c = (segment.points[0].y + segment.points[1].y) / 2
         return sqrt(x_c**2 + y_c**2)
 
+    # same as getSegmentDistance, for arrays of end points
+    def getSegmentDistances(self, p1, p2):
+        x_c = (p1[:, 0] + p2[:, 0]) / 2
+        y_c = (p1[:, 1] + p2[:, 1]) / 2
+        return np.sqrt(x_c**2 + y_c**2)
+
     def get_plot_phi_d(self, ground_truth=None):  # @UnusedVariable
         d, phi = self.getEstimate()
         belief = self.beliefArray[0]
         return plot_phi_d_diagram_bgr(self, belief, phi=phi, d=d)
+
@@ -5,15 +5,17 @@ from numpy.testing.utils import assert_almost_equal
 from scipy.ndimage.filters import gaussian_filter
 from scipy.stats import multivariate_normal, entropy
 
-from duckietown_msgs.msg import SegmentList
+from duckietown_msgs.msg import Segment
 import duckietown_utils as dtu
 import numpy as np
 
 from .lane_filter_interface import LaneFilterInterface
+from .segment_arrays import get_segment_arrays
 from .visualization import plot_phi_d_diagram_bgr
 
 __all__ = [
     'LaneFilterClassic',
+    'generate_votes_d_phi',
 ]
 
 
@@ -143,28 +145,33 @@ class LaneFilterClassic(dtu.Configurable, LaneFilterInterface):
 
         return measurement_likelihood
 
-    @dtu.contract(segment_list=SegmentList)
     def generate_measurement_likelihood(self, segment_list):
-        segments = segment_list.segments
-        # initialize measurement likelihood to all zeros
-        measurement_likelihood = np.zeros(self.d.shape, dtype='float32')
-        for segment in segments:
-            # we don't care about RED ones for now
-            if segment.color != segment.WHITE and segment.color != segment.YELLOW:
-                continue
-            # filter out any segments that are behind us
-            if segment.points[0].x < 0 or segment.points[1].x < 0:
-                continue
-            d_i, phi_i, _l_i, weight = self.generateVote(segment)
-            # if the vote lands outside of the histogram discard it
-            if d_i > self.d_max or \
-                d_i < self.d_min or \
-                phi_i < self.phi_min or \
-                phi_i > self.phi_max:
-                continue
-            i = int(floor((d_i - self.d_min) / self.delta_d))
-            j = int(floor((phi_i - self.phi_min) / self.delta_phi))
-            measurement_likelihood[i, j] += weight
+        """ segment_list: a SegmentList, a list of Segments or a SegmentArrayList """
+        arrays = get_segment_arrays(segment_list)
+        color, p1, p2 = arrays.color, arrays.p1, arrays.p2
+
+        # we don't care about RED ones for now
+        keep = (color == Segment.WHITE) | (color == Segment.YELLOW)
+        # filter out any segments that are behind us
+        keep &= (p1[:, 0] >= 0) & (p2[:, 0] >= 0)
+
+        d_i, phi_i = generate_votes_d_phi(color[keep], p1[keep, :], p2[keep, :],
+                                          linewidth_white=self.linewidth_white,
+                                          linewidth_yellow=self.linewidth_yellow,
+                                          lanewidth=self.lanewidth)
+
+        # if the vote lands outside of the histogram discard it
+        H, W = self.d.shape
+        with np.errstate(invalid='ignore'):
+            valid = (d_i <= self.d_max) & (d_i >= self.d_min) & \
+                    (phi_i >= self.phi_min) & (phi_i <= self.phi_max)
+        i = np.floor((d_i[valid] - self.d_min) / self.delta_d).astype('int64')
+        j = np.floor((phi_i[valid] - self.phi_min) / self.delta_phi).astype('int64')
+        inside = (i < H) & (j < W)
+
+        # all the votes have weight 1
+        counts = np.bincount(i[inside] * W + j[inside], minlength=H * W)
+        measurement_likelihood = counts.reshape((H, W)).astype('float32')
         if np.linalg.norm(measurement_likelihood) == 0:
             return None
         measurement_likelihood = measurement_likelihood / np.sum(measurement_likelihood)
@@ -240,3 +247,44 @@ class LaneFilterClassic(dtu.Configurable, LaneFilterInterface):
     def get_plot_phi_d(self, ground_truth=None):  # @UnusedVariable
         est = self.get_estimate()
         return plot_phi_d_diagram_bgr(self, self.belief, phi=est['phi'], d=est['d'])
+
+
+def generate_votes_d_phi(color, p1, p2, linewidth_white, linewidth_yellow, lanewidth):
+    """
+        Same as LaneFilterClassic.generateVote(), for arrays of segments.
+
+        color: (N,), p1, p2: (N, 2)
+
+        Returns d_i, phi_i (arrays of shape (N,)).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_hat = (p2 - p1) / np.linalg.norm(p2 - p1, axis=1)[:, np.newaxis]
+        phi_i = np.arcsin(t_hat[:, 1])
+
+    n_hat = np.column_stack((-t_hat[:, 1], t_hat[:, 0]))
+    d1 = np.sum(n_hat * p1, axis=1)
+    d2 = np.sum(n_hat * p2, axis=1)
+    d_i = (d1 + d2) / 2
+
+    white = color == Segment.WHITE
+    yellow = color == Segment.YELLOW
+    p1_ahead = p1[:, 0] > p2[:, 0]
+    p2_ahead = p2[:, 0] > p1[:, 0]
+
+    # right lane is white
+    white_right = white & p1_ahead  # right edge of white lane
+    white_left = white & ~p1_ahead  # left edge of white lane
+    d_i[white_right] = d_i[white_right] - linewidth_white
+    d_i[white_left] = -d_i[white_left]
+    phi_i[white_left] = -phi_i[white_left]
+    d_i[white] = d_i[white] - lanewidth / 2
+
+    # left lane is yellow
+    yellow_left = yellow & p2_ahead  # left edge of yellow lane
+    yellow_right = yellow & ~p2_ahead  # right edge of yellow lane
+    d_i[yellow_left] = d_i[yellow_left] - linewidth_yellow
+    phi_i[yellow_left] = -phi_i[yellow_left]
+    d_i[yellow_right] = -d_i[yellow_right]
+    d_i[yellow] = lanewidth / 2 - d_i[yellow]
+
+    return d_i, phi_i
@@ -0,0 +1,89 @@
+from collections import namedtuple, deque
+import threading
+
+import numpy as np
+
+__all__ = [
+    'SegmentArrays',
+    'get_segment_arrays',
+    'segment_arrays_from_segments',
+    'segment_arrays_from_points',
+]
+
+# Struct-of-arrays representation of a list of Segment messages:
+#
+#   color: (N,) uint8
+#   p1, p2: (N, 2) float64, the two points on the ground
+#   normal: (N, 2) float64, outward normal, as get_normal_outward_for_segment(p2, p1)
+#           (NaN for segments of length 0)
+#   length: (N,) float64, distance between p1 and p2
+SegmentArrays = namedtuple('SegmentArrays', 'color p1 p2 normal length')
+
+# The last few lists converted; messages use __slots__, so we cannot
+# attach the arrays to them directly.
+_recent = deque(maxlen=4)
+_recent_lock = threading.Lock()
+
+
+def get_segment_arrays(segments):
+    """
+        Returns the SegmentArrays for a SegmentList, a list of Segments,
+        or an array-backed list of segments (ground_projection.SegmentArrayList),
+        whose arrays are used directly.
+
+        The conversion is done once per message: the result is cached,
+        so that the different consumers of the same message
+        (ground projection, lane filters, visualization) share it.
+        The segments are assumed not to change after they are converted.
+    """
+    # array-backed: do not create the Segment objects
+    array_backed = isinstance(getattr(segments, 'points', None), np.ndarray)
+    if not array_backed and hasattr(segments, 'segments'):
+        segments = segments.segments
+
+    with _recent_lock:
+        for cached_segments, arrays in _recent:
+            if cached_segments is segments and len(arrays.color) == len(segments):
+                return arrays
+
+    if array_backed:
+        points = segments.points
+        arrays = segment_arrays_from_points(segments.color, points[:, 0, 0:2], points[:, 1, 0:2])
+    else:
+        arrays = segment_arrays_from_segments(segments)
+
+    with _recent_lock:
+        # keep a reference to the list, so that its id() is not reused
+        _recent.append((segments, arrays))
+    return arrays
+
+
+def segment_arrays_from_segments(segments):
+    """ Converts a list of Segments to SegmentArrays (not cached). """
+    num = len(segments)
+    color = np.array([segment.color for segment in segments], dtype='uint8')
+    points = np.array([(segment.points[0].x, segment.points[0].y,
+                        segment.points[1].x, segment.points[1].y)
+                       for segment in segments], dtype='float64')
+    points = points.reshape((num, 4))
+    return segment_arrays_from_points(color, points[:, 0:2], points[:, 2:4])
+
+
+def segment_arrays_from_points(color, p1, p2):
+    """ Creates the SegmentArrays from the colors and the two (N, 2) arrays of points. """
+    num = len(color)
+    color = np.array(color, dtype='uint8')
+    p1 = np.array(p1, dtype='float64').reshape((num, 2))
+    p2 = np.array(p2, dtype='float64').reshape((num, 2))
+
+    diff = p1 - p2
+    length = np.hypot(diff[:, 0], diff[:, 1])
+    normal = np.empty(shape=(num, 2), dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normal[:, 0] = +diff[:, 1] / length
+        normal[:, 1] = -diff[:, 0] / length
+
+    for a in [color, p1, p2, normal, length]:
+        a.flags.writeable = False
+
+    return SegmentArrays(color=color, p1=p1, p2=p2, normal=normal, length=length)
@@ -7,12 +7,11 @@ from scipy.stats import entropy
 from duckietown_segmaps.maps import get_normal_outward_for_segment, SegmentsMap
 import duckietown_utils as dtu
 from duckietown_utils.matplotlib_utils import CreateImageFromPylab
-from easy_algo import get_easy_algo_db
-from grid_helper import GridHelper, grid_helper_annotate_axes,\
+from grid_helper import get_grid_helper, grid_helper_annotate_axes,\
     grid_helper_plot_field, grid_helper_mark_point, convert_unit,\
     grid_helper_set_axes
-from lane_filter import LaneFilterInterface
-from localization_templates import FAMILY_LOC_TEMPLATES
+from lane_filter import LaneFilterInterface, get_segment_arrays
+from localization_templates import get_localization_template
 import numpy as np
 import math
 from grid_helper.voting_grid import array_as_string_sign
@@ -42,7 +41,7 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
         dtu.Configurable.__init__(self, param_names, configuration)
 
 
-        self.grid_helper = GridHelper(OrderedDict(self.variables), precision=self.precision)
+        self.grid_helper = get_grid_helper(OrderedDict(self.variables), precision=self.precision)
 
         self.initialize_belief()
         self.last_segments_used = None
@@ -59,14 +58,14 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
         assert_almost_equal(self.belief.flatten().sum(), 1.0)
 
     def initialize(self):
-        easy_algo_db = get_easy_algo_db()
+        # the template and its sampled map are shared in the process,
+        # so that re-initializing only resets the belief
         self._localization_template = \
-            easy_algo_db.create_instance(FAMILY_LOC_TEMPLATES,
-                                         self.localization_template)
+            get_localization_template(self.localization_template)
         self.initialize_belief()
 
-        sm = self._localization_template.get_map()
-        self.rep_map = get_compat_representation_map(sm, self.delta_segment)
+        self.rep_map = get_cached_representation_map(self.localization_template,
+                                                     self.delta_segment)
 
     def predict(self, dt, v, w):
         pass
@@ -82,14 +81,15 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
     def update(self, segment_list):
         """ Returns the likelihood """
 
-        self.last_segments_used = segment_list.segments
+        self.last_segments_used = segment_list
 
 
         with dtu.timeit_clock('generating likelihood'):
             if not self.optimize:
                 measurement_likelihood = self.generate_measurement_likelihood(segment_list.segments)
             else:
-                measurement_likelihood = self.generate_measurement_likelihood_faster(segment_list.segments)
+                # works on arrays: a SegmentArrayList is used without creating the Segments
+                measurement_likelihood = self.generate_measurement_likelihood_faster(segment_list)
 
         with dtu.timeit_clock('multiply belief'):
             if measurement_likelihood is not None:
@@ -103,33 +103,17 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
         return measurement_likelihood
 
     def generate_measurement_likelihood_faster(self, segments):
-        with dtu.timeit_clock("get_compat_representation_obs (%d segments)" % len(segments) ):
+        with dtu.timeit_clock("get_compat_representation_obs"):
             rep_obs = get_compat_representation_obs(segments)
             rep_map = self.rep_map
 
 
-        with dtu.timeit_clock("generate_votes_faster (map: %d, obs: %d)" % (len(rep_map.weight),
-                                                                            len(rep_obs.weight)) ):
-            votes = generate_votes_faster(rep_map, rep_obs)
-
-            if self.bounds_theta_deg is not None:
-                weight = votes.weight.copy()
-                theta_min = np.deg2rad(self.bounds_theta_deg[0])
-                theta_max = np.deg2rad(self.bounds_theta_deg[1])
-                num_outside = 0
-                for i in range(weight.shape[0]):
-
-                    theta = votes.theta[i]
-
-                    if not (theta_min<=theta<=theta_max):
-                        weight[i] = 0
-                        num_outside += 1
+        with dtu.timeit_clock("generate_votes_faster",
+                              details="map: %d, obs: %d" % (len(rep_map.weight), len(rep_obs.weight))):
+            votes = generate_votes_faster(rep_map, rep_obs,
+                                          bounds_theta_deg=self.bounds_theta_deg)
 
-                # print('Removed %d of %d because outside box' % (num_outside, len(weight)))
-                votes = remove_zero_weight(votes._replace(weight=weight))
-
-
-        with dtu.timeit_clock("compute pos iterative (%d)" % len(votes.weight) ):
+        with dtu.timeit_clock("compute pos iterative", details="%d" % len(votes.weight)):
             locations = self._localization_template.coords_from_position_orientation(votes.p, votes.theta)
 
             num = len(locations)
@@ -143,7 +127,7 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
 
         compare = False
 
-        with dtu.timeit_clock("add voting faster (%d)" %  len(votes.weight)):
+        with dtu.timeit_clock("add voting faster", details="%d" % len(votes.weight)):
             measurement_likelihood = self.grid_helper.create_new('float32')
             measurement_likelihood.fill(0)
 
@@ -205,7 +189,7 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
 
         adjust_by_number = False # add to configuration
 
-        with dtu.timeit_clock("pose gen for %s segs" % len(segments)):
+        with dtu.timeit_clock("pose gen", details="%s segs" % len(segments)):
 
             for segment in segments:
                 num_by_color[segment.color] += 1
@@ -228,13 +212,13 @@ class LaneFilterMoreGeneric(dtu.Configurable, LaneFilterInterface):
                     pose_weight.append((pose, weight_adjusted))
 
         values = []
-        with dtu.timeit_clock("generating coords for %s votes" % len(pose_weight)):
+        with dtu.timeit_clock("generating coords", details="%s votes" % len(pose_weight)):
             for pose, weight in pose_weight:
                 est = self._localization_template.coords_from_pose(pose)
                 value = dict((k, float(est[k])) for k in self.variables)
                 values.append((value, weight))
 
-        with dtu.timeit_clock("add voting for %s votes" % len(pose_weight)):
+        with dtu.timeit_clock("add voting", details="%s votes" % len(pose_weight)):
             for value, weight in values:
 #                 if value['dstop'] > 0.3:
 #                     print('value:%s' % value)
@@ -413,23 +397,53 @@ PNRep = namedtuple('PNRep', 't n color weight')
 
 
 def get_compat_representation_map(sm, delta_segment):
-    sections = []
+    """
+        Samples all the segments of the map every delta_segment,
+        in the same way as iterate_segment_sections().
+    """
+    num_segments = len(sm.segments)
+    W1 = np.zeros(shape=(num_segments, 3), dtype='float64')
+    W2 = np.zeros(shape=(num_segments, 3), dtype='float64')
+    colors = np.zeros(shape=num_segments, dtype='uint8')
+    for i, map_segment in enumerate(sm.segments):
+        w1 = sm.points[map_segment.points[0]].coords
+        w2 = sm.points[map_segment.points[1]].coords
+        W1[i, :len(w1)] = w1
+        W2[i, :len(w2)] = w2
+        colors[i] = map_segment.color
+
+    diff = W2 - W1
+    dist = np.linalg.norm(diff, axis=1)
+    dist_xy = np.hypot(diff[:, 0], diff[:, 1])
+    degenerate = (dist == 0) | (dist_xy == 0)
+    if np.any(degenerate):
+        i = np.flatnonzero(degenerate)[0]
+        msg = 'Could not use degenerate segment (points: %s %s) ' % (W1[i], W2[i])
+        raise ValueError(msg)
 
-    for map_segment in sm.segments:
-        for p, n in iterate_segment_sections(sm, map_segment, delta_segment):
-            sections.append((map_segment.color, p, n))
-    n = len(sections)
-    C = np.empty(shape=n, dtype='uint8')
+    # normal outward, as in get_normal_outward_for_segment(w1, w2)
+    normals = np.zeros(shape=(num_segments, 2), dtype='float64')
+    normals[:, 0] = diff[:, 1] / dist_xy
+    normals[:, 1] = -diff[:, 0] / dist_xy
+    # going from w1 to w2
+    dirv = diff / dist[:, np.newaxis]
+    num_sections = np.ceil(dist / delta_segment).astype('int64')
+
+    # one row per section: which segment, and which section in the segment
+    segment_index = np.repeat(np.arange(num_segments), num_sections)
+    starts = np.cumsum(num_sections) - num_sections
+    section_index = np.arange(len(segment_index)) - np.repeat(starts, num_sections)
+    s = section_index + 0.5  # take middle of segment
+    points = W1[segment_index, :] + \
+        dirv[segment_index, :] * delta_segment * s[:, np.newaxis]
+
+    n = len(segment_index)
+    C = colors[segment_index]
     T = np.empty(shape=(2, n), dtype='float32')
     N = np.empty(shape=(2, n), dtype='float32')
-    W = np.empty(shape=n, dtype='float32')
-    for i, (col, p, n) in enumerate(sections):
-        C[i] = col
-        T[0, i] = p[0]
-        T[1, i] = p[1]
-        N[0, i] = n[0]
-        N[1, i] = n[1]
-        W[i] = 1
+    W = np.ones(shape=n, dtype='float32')
+    T[:, :] = points[:, :2].T
+    N[:, :] = normals[segment_index, :].T
 
     C.flags.writeable = False
     T.flags.writeable = False
@@ -438,48 +452,31 @@ def get_compat_representation_map(sm, delta_segment):
 
     return PNRep(t=T, color=C, n=N, weight=W)
 
-def get_compat_representation_obs(segments, precision='float32'):
-    num = len(segments)
-    C = np.empty(shape=num, dtype='uint8') # color
-    T = np.empty(shape=(2, num), dtype=precision) # position
-    N = np.empty(shape=(2, num), dtype=precision) # normal
-    W = np.empty(shape=num, dtype=precision) # weight
-
-    for i in range(num):
-        segment = segments[i]
-        points = segment.points
-        color = segment.color
-
-        p1 = np.array((points[0].x, points[0].y))
-        p2 = np.array((points[1].x, points[1].y))
-        p_hat = p1 * 0.5 + p2 * 0.5
-
-        diff = p1 - p2
-        distance = np.hypot(diff[0], diff[1])
-
-        weight = distance
-
-        C[i] = color
-        T[0, i] = p_hat[0]
-        T[1, i] = p_hat[1]
-        N[0, i] = +diff[1] / distance
-        N[1, i] = -diff[0] / distance
-        W[i] = weight
 
+def get_cached_representation_map(template_name, delta_segment):
+    """
+        Returns the PNRep of the map of the localization template,
+        sampled every delta_segment.
 
-        if False:
-            diffn = diff / distance
-            n_hat = np.array((diffn[1], -diffn[0], 0))
-            n_hat_slow = get_normal_outward_for_segment(p2, p1)
-            assert_almost_equal(n_hat, n_hat_slow)
+        It is computed only once in the process for each
+        (template_name, delta_segment).
+    """
+    return _get_cached_representation_map(template_name, float(delta_segment))
 
-            assert segment.points[0].z == 0
-            assert segment.points[1].z == 0
 
+@dtu.memoize_simple
+def _get_cached_representation_map(template_name, delta_segment):
+    sm = get_localization_template(template_name).get_map()
+    return get_compat_representation_map(sm, delta_segment)
 
+def get_compat_representation_obs(segments, precision='float32'):
+    arrays = get_segment_arrays(segments)
 
+    C = arrays.color # color
+    T = ((arrays.p1 + arrays.p2) * 0.5).T.astype(precision) # position
+    N = arrays.normal.T.astype(precision) # normal
+    W = arrays.length.astype(precision) # weight
 
-    C.flags.writeable = False
     T.flags.writeable = False
     N.flags.writeable = False
     W.flags.writeable = False
@@ -488,56 +485,80 @@ def get_compat_representation_obs(segments, precision='float32'):
 
 PNVotes = namedtuple('PNVotes', 'p theta weight')
 
-def generate_votes_faster(rep_map, rep_obs, precision='float32'):
-    num_map = len(rep_map.color)
-    num_obs = len(rep_obs.color)
-    max_votes = num_map * num_obs
-    vote_p = np.zeros(dtype=precision, shape=(2, max_votes))
-    vote_theta = np.zeros(dtype=precision, shape= max_votes)
-    vote_weight = np.zeros(dtype=precision, shape= max_votes)
-    k = 0
-
-    for i in range(num_map):
-        c1 = rep_map.color[i]
-        w1 = rep_map.weight[i]
-        t0, t1 = rep_map.t[:, i]
-        n0, n1 = rep_map.n[:, i]
-
-        for j in range(num_obs):
-            c2 = rep_obs.color[j]
-
-            if c2 != c1:
-                vote_weight[k] = 0
-                vote_theta[k] = np.nan
-                vote_p[0, k] = np.nan
-                vote_p[1, k] = np.nan
-
-            else:
-                w2 = rep_obs.weight[j]
-                W = w1 * w2
-
-                t_est0, t_est1 = rep_obs.t[:, j]
-                n_est0, n_est1 = rep_obs.n[:, j]
-
-                C = n0 * n_est0 + n1 * n_est1
-                S = n0 * n_est1 - n1 * n_est0
-
-                xy0 = t0 - C*t_est0 - S*t_est1
-                xy1 = t1 + S*t_est0 - C*t_est1
+def generate_votes_faster(rep_map, rep_obs, precision='float32', bounds_theta_deg=None):
+    """
+        Generates one vote for each pair (map section, observation)
+        of the same color.
+
+        The pairs are generated one color at a time with broadcasting,
+        so only the votes of matching colors are allocated.
+        If bounds_theta_deg = [min, max] is given, the votes whose
+        theta is outside of the bounds are discarded as well.
+    """
+    if bounds_theta_deg is not None:
+        theta_min = np.deg2rad(bounds_theta_deg[0])
+        theta_max = np.deg2rad(bounds_theta_deg[1])
+
+    vote_p0 = []
+    vote_p1 = []
+    vote_theta = []
+    vote_weight = []
+
+    for color in np.unique(rep_map.color):
+        i_map = np.flatnonzero(rep_map.color == color)
+        i_obs = np.flatnonzero(rep_obs.color == color)
+        if len(i_obs) == 0:
+            continue
+
+        # map sections along the rows, observations along the columns
+        t0 = rep_map.t[0, i_map][:, np.newaxis]
+        t1 = rep_map.t[1, i_map][:, np.newaxis]
+        n0 = rep_map.n[0, i_map][:, np.newaxis]
+        n1 = rep_map.n[1, i_map][:, np.newaxis]
+        w1 = rep_map.weight[i_map][:, np.newaxis]
+
+        t_est0 = rep_obs.t[0, i_obs][np.newaxis, :]
+        t_est1 = rep_obs.t[1, i_obs][np.newaxis, :]
+        n_est0 = rep_obs.n[0, i_obs][np.newaxis, :]
+        n_est1 = rep_obs.n[1, i_obs][np.newaxis, :]
+        w2 = rep_obs.weight[i_obs][np.newaxis, :]
+
+        C = n0 * n_est0 + n1 * n_est1
+        S = n0 * n_est1 - n1 * n_est0
+
+        xy0 = t0 - C*t_est0 - S*t_est1
+        xy1 = t1 + S*t_est0 - C*t_est1
+
+        # compensate imprecision or arccos(C) fails
+        C = np.clip(C, -1, 1)
+        theta = -np.arccos(C) * np.sign(S)
+
+        W = w1 * w2
+
+        keep = W > 0
+        if bounds_theta_deg is not None:
+            keep &= (theta_min <= theta) & (theta <= theta_max)
+
+        vote_p0.append(xy0[keep])
+        vote_p1.append(xy1[keep])
+        vote_theta.append(theta[keep])
+        vote_weight.append(W[keep])
+
+    if not vote_weight:
+        vote_p = np.zeros(dtype=precision, shape=(2, 0))
+        vote_theta = np.zeros(dtype=precision, shape=0)
+        vote_weight = np.zeros(dtype=precision, shape=0)
+    else:
+        vote_p = np.vstack((np.concatenate(vote_p0),
+                            np.concatenate(vote_p1))).astype(precision)
+        vote_theta = np.concatenate(vote_theta).astype(precision)
+        vote_weight = np.concatenate(vote_weight).astype(precision)
 
-                C = min(C, 1) # compensate imprecision or acos(C) fails
-
-                theta = -math.acos(C) * np.sign(S)
-
-                vote_theta[k] = theta
-                vote_weight[k] = W
-                vote_p[0, k] = xy0
-                vote_p[1, k] = xy1
-
-            k += 1
+    vote_p.flags.writeable = False
+    vote_theta.flags.writeable = False
+    vote_weight.flags.writeable = False
 
-    res =  PNVotes(p=vote_p, theta=vote_theta, weight=vote_weight)
-    return remove_zero_weight(res)
+    return PNVotes(p=vote_p, theta=vote_theta, weight=vote_weight)
 
 def remove_zero_weight(pnvotes):
     nonzeros = pnvotes.weight > 0
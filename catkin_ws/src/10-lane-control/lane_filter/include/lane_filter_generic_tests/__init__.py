@@ -1,3 +1,3 @@
 
 from .math import *
-from .faster_math import *
\ No newline at end of file
+from .faster_math import *from .caches import *
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+from numpy.testing.utils import assert_equal
+
+import duckietown_utils as dtu
+from lane_filter_generic import LaneFilterMoreGeneric
+from lane_filter_generic.lane_filter_more_generic import get_compat_representation_map
+
+
+def get_configuration(resolution_d=0.02, delta_segment=1.0):
+    """ Same as moregeneric_straight, with a given resolution of d and delta_segment """
+    variables = OrderedDict()
+    variables['d'] = dict(min=-0.15, max=+0.3025, resolution=resolution_d,
+                          units='m', units_display='cm', description='d')
+    variables['phi'] = dict(min=-1.5, max=+1.5125, resolution=0.1,
+                            units='rad', units_display='deg', description='phi')
+    return dict(variables=variables,
+                localization_template='DT17_template_straight',
+                delta_segment=delta_segment,
+                F=1, optimize=True, bounds_theta_deg=None, precision='float32')
+
+
+def create_filter(**kwargs):
+    lane_filter = LaneFilterMoreGeneric(get_configuration(**kwargs))
+    lane_filter.initialize()
+    return lane_filter
+
+
+@dtu.unit_test
+def caches_same_parameters_reuse():
+    f1 = create_filter()
+    f2 = create_filter()
+    assert f1 is not f2
+    # the template, its sampled map and the grid are shared
+    assert f1._localization_template is f2._localization_template
+    assert f1.rep_map is f2.rep_map
+    assert f1.grid_helper is f2.grid_helper
+    # but not the belief
+    assert f1.belief is not f2.belief
+
+    # re-initializing does not recompute them
+    f1.initialize()
+    assert f1.rep_map is f2.rep_map
+
+
+@dtu.unit_test
+def caches_different_parameters():
+    f1 = create_filter()
+
+    # a different resolution gets a different grid
+    f2 = create_filter(resolution_d=0.01)
+    assert f2.grid_helper is not f1.grid_helper
+    assert f2.belief.shape != f1.belief.shape
+    assert f2.belief.shape == f2.grid_helper.create_new().shape
+
+    # a different delta_segment gets a different sampling of the same template
+    f3 = create_filter(delta_segment=0.1)
+    assert f3._localization_template is f1._localization_template
+    assert f3.rep_map is not f1.rep_map
+    sm = f3._localization_template.get_map()
+    expected = get_compat_representation_map(sm, 0.1)
+    assert_equal(f3.rep_map.t, expected.t)
+    assert_equal(f3.rep_map.n, expected.n)
+    assert_equal(f3.rep_map.color, expected.color)
+    assert len(f3.rep_map.color) > len(f1.rep_map.color)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -1,8 +1,8 @@
 import numpy as np
 import duckietown_utils as dtu
-from numpy.testing.utils import assert_almost_equal
+from numpy.testing.utils import assert_almost_equal, assert_equal
 from lane_filter_generic.lane_filter_more_generic import get_estimate,\
-    get_estimate_2
+    get_estimate_2, generate_votes_faster, PNRep
 
 @dtu.unit_test
 def test_faster_math():
@@ -24,6 +24,54 @@ def test_faster_math():
 
 
 
+def generate_votes_loop(rep_map, rep_obs, bounds_theta_deg):
+    """ Reference implementation: one vote at a time """
+    votes = []
+    for i in range(len(rep_map.color)):
+        for j in range(len(rep_obs.color)):
+            if rep_map.color[i] != rep_obs.color[j]:
+                continue
+            W = rep_map.weight[i] * rep_obs.weight[j]
+            xy, theta = get_estimate_2(rep_map.t[:, i], rep_map.n[:, i],
+                                       rep_obs.t[:, j], rep_obs.n[:, j])
+            if bounds_theta_deg is not None:
+                theta_deg = np.rad2deg(theta)
+                if not (bounds_theta_deg[0] <= theta_deg <= bounds_theta_deg[1]):
+                    continue
+            if W > 0:
+                votes.append((xy[0], xy[1], theta, W))
+    return np.array(votes).reshape((len(votes), 4))
+
+
+def random_rep(n, colors):
+    alpha = np.random.uniform(-np.pi, np.pi, size=n)
+    return PNRep(t=np.random.randn(2, n),
+                 n=np.array([np.cos(alpha), np.sin(alpha)]),
+                 color=np.random.choice(colors, size=n).astype('uint8'),
+                 weight=np.random.choice([0, 0.5, 1], size=n))
+
+
+def sorted_votes(votes):
+    a = np.vstack((votes[:, 0], votes[:, 1], votes[:, 2], votes[:, 3]))
+    return votes[np.lexsort(a), :]
+
+
+@dtu.unit_test
+def test_generate_votes_faster():
+    np.random.seed(5)
+    rep_map = random_rep(40, colors=[0, 1, 2])
+    rep_obs = random_rep(30, colors=[0, 1])
+
+    for bounds_theta_deg in [None, [-45, 45]]:
+        votes = generate_votes_faster(rep_map, rep_obs, precision='float64',
+                                      bounds_theta_deg=bounds_theta_deg)
+        fast = np.vstack((votes.p[0, :], votes.p[1, :], votes.theta, votes.weight)).T
+        slow = generate_votes_loop(rep_map, rep_obs, bounds_theta_deg)
+
+        assert_equal(fast.shape, slow.shape)
+        assert_almost_equal(sorted_votes(fast), sorted_votes(slow))
+
+
 if __name__ == '__main__':
     dtu.run_tests_for_this_module()
     
@@ -0,0 +1,3 @@
+from .predict_faster import *
+from .likelihood_faster import *
+from .segment_arrays import *
@@ -0,0 +1,95 @@
+import time
+
+from numpy.testing.utils import assert_almost_equal
+
+from duckietown_msgs.msg import Segment
+import duckietown_utils as dtu
+from lane_filter import LaneFilterHistogram
+import numpy as np
+
+
+def get_histogram_configuration(curvature_res):
+    """ Same as lane_filter_hist_default, with a given curvature_res """
+    return dict(mean_d_0=0, mean_phi_0=0, sigma_d_0=0.1, sigma_phi_0=0.1,
+                delta_d=0.02, delta_phi=0.1, d_max=0.3, d_min=-0.15,
+                phi_min=-1.5, phi_max=1.5, cov_v=0.5,
+                linewidth_white=0.05, linewidth_yellow=0.025, lanewidth=0.23,
+                min_max=0.1, sigma_d_mask=1.0, sigma_phi_mask=2.0,
+                curvature_res=curvature_res, range_min=0.2, range_est=0.33,
+                range_max=0.6, curvature_right=-0.054, curvature_left=0.025)
+
+
+def random_segments(n):
+    segments = []
+    for _ in range(n):
+        s = Segment()
+        s.color = np.random.choice([Segment.WHITE, Segment.YELLOW, Segment.RED])
+        x0, x1 = np.random.uniform(-0.05, 0.6, size=2)
+        y0, y1 = np.random.uniform(-0.3, 0.3, size=2)
+        s.points[0].x = x0
+        s.points[0].y = y0
+        s.points[1].x = x1
+        s.points[1].y = y1
+        segments.append(s)
+    return segments
+
+
+def likelihoods_per_segment(lf, segments):
+    """ The original path of LaneFilterHistogram.update() """
+    segmentsRangeArray = lf.prepareSegments(segments)
+    return [lf.generate_measurement_likelihood(segmentsRangeArray[i])
+            for i in range(lf.curvature_res + 1)]
+
+
+@dtu.unit_test
+def likelihood_same_as_per_segment():
+    np.random.seed(3)
+    for curvature_res in [0, 4]:
+        lf = LaneFilterHistogram(get_histogram_configuration(curvature_res))
+        for n in [0, 1, 10, 300]:
+            segments = random_segments(n)
+            slow = likelihoods_per_segment(lf, segments)
+            fast = lf.generate_measurement_likelihoods(segments)
+            assert len(slow) == len(fast) == curvature_res + 1
+            for a, b in zip(slow, fast):
+                assert (a is None) == (b is None)
+                if a is not None:
+                    assert_almost_equal(a, b)
+
+
+@dtu.unit_test
+def likelihood_red_to_white():
+    np.random.seed(5)
+    lf = LaneFilterHistogram(get_histogram_configuration(0))
+    lf.red_to_white = True
+    segments = random_segments(100)
+    colors = [s.color for s in segments]
+    lf.generate_measurement_likelihoods(segments)
+    fast = [s.color for s in lf.filtered_segments]
+    # the given segments are not modified
+    assert [s.color for s in segments] == colors
+    # prepareSegments() recolors them in place
+    lf.prepareSegments(segments)
+    slow = [s.color for s in lf.filtered_segments]
+    assert Segment.RED not in fast
+    assert fast == slow
+
+
+@dtu.unit_test
+def likelihood_benchmark():
+    np.random.seed(4)
+    lf = LaneFilterHistogram(get_histogram_configuration(4))
+    for n in [50, 200, 1000]:
+        segments = random_segments(n)
+        t0 = time.time()
+        likelihoods_per_segment(lf, segments)
+        t_slow = time.time() - t0
+        t0 = time.time()
+        lf.generate_measurement_likelihoods(segments)
+        t_fast = time.time() - t0
+        print('%5d segments: per segment %8.2f ms  batched %8.2f ms' %
+              (n, t_slow * 1000, t_fast * 1000))
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
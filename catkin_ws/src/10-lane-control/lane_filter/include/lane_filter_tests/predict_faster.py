@@ -0,0 +1,109 @@
+from math import floor
+import time
+
+from numpy.testing.utils import assert_almost_equal
+from scipy.ndimage.filters import gaussian_filter
+from scipy.stats import multivariate_normal
+
+import duckietown_utils as dtu
+from lane_filter.histogram_predict import predict_histogram_beliefs
+import numpy as np
+
+
+class Grid(object):
+    """ The (d, phi) grid of LaneFilterHistogram. """
+
+    def __init__(self, delta_d, delta_phi, d_min=-0.15, d_max=0.3,
+                 phi_min=-1.5, phi_max=1.5, cov_mask=(1.0, 2.0)):
+        self.delta_d = delta_d
+        self.delta_phi = delta_phi
+        self.d_min = d_min
+        self.d_max = d_max
+        self.phi_min = phi_min
+        self.phi_max = phi_max
+        self.cov_mask = list(cov_mask)
+        self.d, self.phi = np.mgrid[d_min:d_max:delta_d,
+                                    phi_min:phi_max:delta_phi]
+
+    def random_beliefs(self, K):
+        pos = np.empty(self.d.shape + (2,))
+        pos[:, :, 0] = self.d
+        pos[:, :, 1] = self.phi
+        beliefs = []
+        for _ in range(K):
+            mean = [np.random.uniform(self.d_min, self.d_max),
+                    np.random.uniform(self.phi_min, self.phi_max)]
+            RV = multivariate_normal(mean, [[0.1, 0], [0, 0.1]])
+            beliefs.append(RV.pdf(pos))
+        return np.array(beliefs)
+
+    def predict_fast(self, beliefs, dt, v, w):
+        return predict_histogram_beliefs(beliefs, self.d, self.phi,
+                                         dt=dt, v=v, w=w,
+                                         d_min=self.d_min, d_max=self.d_max,
+                                         phi_min=self.phi_min, phi_max=self.phi_max,
+                                         delta_d=self.delta_d, delta_phi=self.delta_phi,
+                                         cov_mask=self.cov_mask)
+
+    def predict_slow(self, beliefs, dt, v, w):
+        """ The original per-cell loop of LaneFilterHistogram.predict() """
+        d_t = self.d + v * dt * np.sin(self.phi)
+        phi_t = self.phi + w * dt
+        res = []
+        for belief in beliefs:
+            p_belief = np.zeros(belief.shape)
+            for i in range(belief.shape[0]):
+                for j in range(belief.shape[1]):
+                    if belief[i, j] > 0:
+                        if d_t[i, j] > self.d_max or d_t[i, j] < self.d_min or \
+                           phi_t[i, j] < self.phi_min or phi_t[i, j] > self.phi_max:
+                            continue
+                        i_new = int(floor((d_t[i, j] - self.d_min) / self.delta_d))
+                        j_new = int(floor((phi_t[i, j] - self.phi_min) / self.delta_phi))
+                        p_belief[i_new, j_new] += belief[i, j]
+            s_belief = np.zeros(belief.shape)
+            gaussian_filter(p_belief, self.cov_mask, output=s_belief, mode='constant')
+            res.append(s_belief)
+        return np.array(res)
+
+
+@dtu.unit_test
+def predict_same_as_loop():
+    np.random.seed(1)
+    grid = Grid(delta_d=0.02, delta_phi=0.1)
+    beliefs = grid.random_beliefs(K=4)
+    # make sure that we also have empty cells
+    beliefs[1][beliefs[1] < np.median(beliefs[1])] = 0
+    for dt, v, w in [(0.1, 0.2, 0.0), (0.1, 0.2, 3.0), (0.5, -0.4, -2.0), (0, 0, 0)]:
+        slow = grid.predict_slow(beliefs, dt, v, w)
+        fast = grid.predict_fast(beliefs, dt, v, w)
+        assert_almost_equal(fast, slow)
+
+
+@dtu.unit_test
+def predict_benchmark():
+    np.random.seed(2)
+    dt, v, w = 0.1, 0.2, 1.0
+    K = 5
+    for delta_d, delta_phi in [(0.02, 0.1), (0.01, 0.05), (0.005, 0.025)]:
+        grid = Grid(delta_d=delta_d, delta_phi=delta_phi)
+        beliefs = grid.random_beliefs(K=K)
+
+        t0 = time.time()
+        slow = grid.predict_slow(beliefs, dt, v, w)
+        t_slow = time.time() - t0
+
+        n = 10
+        t0 = time.time()
+        for _ in range(n):
+            fast = grid.predict_fast(beliefs, dt, v, w)
+        t_fast = (time.time() - t0) / n
+
+        assert_almost_equal(fast, slow)
+        print('grid %4d x %4d, %d beliefs: loop %8.2f ms  vectorized %8.2f ms  (x%.1f)' %
+              (grid.d.shape[0], grid.d.shape[1], K,
+               t_slow * 1000, t_fast * 1000, t_slow / t_fast))
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,93 @@
+from numpy.testing.utils import assert_almost_equal
+
+from duckietown_msgs.msg import SegmentList
+import duckietown_utils as dtu
+from ground_projection.segment_array_list import segment_array_list_from_segment_list
+from lane_filter import get_segment_arrays, LaneFilterClassic, LaneFilterHistogram
+from lane_filter_tests.likelihood_faster import random_segments, get_histogram_configuration
+import numpy as np
+
+
+@dtu.unit_test
+def segment_arrays_cached():
+    np.random.seed(5)
+    segment_list = SegmentList()
+    segment_list.segments = random_segments(20)
+    a = get_segment_arrays(segment_list)
+    # the same message gives the same arrays
+    assert get_segment_arrays(segment_list) is a
+    assert get_segment_arrays(segment_list.segments) is a
+    # another list gives new arrays
+    assert get_segment_arrays(list(segment_list.segments)) is not a
+
+    for i, segment in enumerate(segment_list.segments):
+        p1 = np.array((segment.points[0].x, segment.points[0].y))
+        p2 = np.array((segment.points[1].x, segment.points[1].y))
+        assert a.color[i] == segment.color
+        assert_almost_equal(a.p1[i], p1)
+        assert_almost_equal(a.p2[i], p2)
+        assert_almost_equal(a.length[i], np.linalg.norm(p1 - p2))
+        diff = (p1 - p2) / np.linalg.norm(p1 - p2)
+        assert_almost_equal(a.normal[i], [diff[1], -diff[0]])
+
+
+@dtu.unit_test
+def classic_likelihood_same_as_per_segment():
+    np.random.seed(6)
+    configuration = get_histogram_configuration(0)
+    for k in ['curvature_res', 'range_min', 'range_est', 'range_max',
+              'curvature_right', 'curvature_left']:
+        del configuration[k]
+    lf = LaneFilterClassic(configuration)
+    for n in [0, 1, 10, 300]:
+        segment_list = SegmentList()
+        segment_list.segments = random_segments(n)
+        fast = lf.generate_measurement_likelihood(segment_list)
+
+        # the original per-segment loop
+        slow = np.zeros(lf.d.shape, dtype='float32')
+        for segment in segment_list.segments:
+            if segment.color not in [segment.WHITE, segment.YELLOW]:
+                continue
+            if segment.points[0].x < 0 or segment.points[1].x < 0:
+                continue
+            d_i, phi_i, _l_i, weight = lf.generateVote(segment)
+            if d_i > lf.d_max or d_i < lf.d_min or \
+               phi_i < lf.phi_min or phi_i > lf.phi_max:
+                continue
+            i = int(np.floor((d_i - lf.d_min) / lf.delta_d))
+            j = int(np.floor((phi_i - lf.phi_min) / lf.delta_phi))
+            slow[i, j] += weight
+
+        if np.linalg.norm(slow) == 0:
+            assert fast is None
+        else:
+            assert_almost_equal(fast, slow / np.sum(slow))
+
+
+@dtu.unit_test
+def segment_arrays_from_segment_array_list():
+    np.random.seed(7)
+    for n in [0, 1, 30]:
+        segment_list = SegmentList()
+        segment_list.segments = random_segments(n)
+        sal = segment_array_list_from_segment_list(segment_list)
+
+        a = get_segment_arrays(segment_list)
+        b = get_segment_arrays(sal)
+        assert get_segment_arrays(sal) is b
+        # the Segment objects were not created
+        assert sal._segments is None
+        for f in a._fields:
+            assert_almost_equal(getattr(a, f), getattr(b, f))
+
+        lf = LaneFilterHistogram(get_histogram_configuration(4))
+        for l1, l2 in zip(lf.generate_measurement_likelihoods(segment_list.segments),
+                          lf.generate_measurement_likelihoods(sal)):
+            assert (l1 is None) == (l2 is None)
+            if l1 is not None:
+                assert_almost_equal(l1, l2)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -1,2 +1,3 @@
 from .line_detector1 import *
 from .line_detector2 import *
+from .thread_pool import *
@@ -3,7 +3,15 @@ import duckietown_utils as dtu
 
 import numpy as np
 
-from .line_detector_interface import Detections, LineDetectorInterface
+from .line_detector_interface import (COLORS, Detections, LineDetectorInterface,
+                                      map_colors, phase)
+
+
+@dtu.memoize_simple
+def get_dilation_kernel(dilation_kernel_size):
+    """ The elliptic structuring element used to dilate the color masks. """
+    size = (dilation_kernel_size, dilation_kernel_size)
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, size)
 
 
 class LineDetectorHSV(dtu.Configurable, LineDetectorInterface):
@@ -33,6 +41,8 @@ class LineDetectorHSV(dtu.Configurable, LineDetectorInterface):
 
         dtu.Configurable.__init__(self, param_names, configuration)
 
+        self._hsv_luts = None
+
     def _colorFilter(self, color):
         # threshold colors in HSV space
         if color == 'white':
@@ -47,8 +57,7 @@ class LineDetectorHSV(dtu.Configurable, LineDetectorInterface):
             raise Exception('Error: Undefined color strings...')
 
         # binary dilation
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE,
-                                           (self.dilation_kernel_size, self.dilation_kernel_size))
+        kernel = get_dilation_kernel(self.dilation_kernel_size)
         bw = cv2.dilate(bw, kernel)
 
         # refine edge for certain color
@@ -56,6 +65,65 @@ class LineDetectorHSV(dtu.Configurable, LineDetectorInterface):
 
         return bw, edge_color
 
+    # Bits of the pixel classes. Red has two boxes in HSV space.
+    _WHITE, _YELLOW, _RED_A, _RED_B = 1, 2, 4, 8
+
+    def _get_hsv_luts(self):
+        """
+            Returns the lookup tables used for the pixel classification:
+            one for each of the H, S, V channels and one for each color.
+
+            The thresholds are boxes in HSV space, so a pixel is in a box
+            if each of its channels is in the box's range: the channel
+            tables give the boxes that contain each channel value, and the
+            class bits of a pixel are the AND over its three channels.
+            This is the same as a full HSV -> class table, in 768 bytes.
+            The color tables map the class bits to the binary masks.
+        """
+        if self._hsv_luts is None:
+            boxes = [(self._WHITE, self.hsv_white1, self.hsv_white2),
+                     (self._YELLOW, self.hsv_yellow1, self.hsv_yellow2),
+                     (self._RED_A, self.hsv_red1, self.hsv_red2),
+                     (self._RED_B, self.hsv_red3, self.hsv_red4)]
+            values = np.arange(256)
+            channel_luts = [np.zeros(256, dtype='uint8') for _ in range(3)]
+            for bit, lower, upper in boxes:
+                for channel in range(3):
+                    # same bounds as cv2.inRange()
+                    inside = (lower[channel] <= values) & (values <= upper[channel])
+                    channel_luts[channel][inside] |= bit
+
+            color_luts = []
+            for bits in [self._WHITE, self._YELLOW, self._RED_A | self._RED_B]:
+                color_lut = np.zeros(256, dtype='uint8')
+                color_lut[(values & bits) > 0] = 255
+                color_luts.append(color_lut)
+
+            self._hsv_luts = channel_luts, color_luts
+        return self._hsv_luts
+
+    def _colorFilterAll(self):
+        """
+            Same as _colorFilter() for white, yellow and red,
+            classifying each pixel once.
+
+            Returns a list of (bw, edge_color) for the three colors.
+        """
+        channel_luts, color_luts = self._get_hsv_luts()
+        h, s, v = [cv2.LUT(plane, lut)
+                   for plane, lut in zip(cv2.split(self.hsv), channel_luts)]
+        bits = cv2.bitwise_and(cv2.bitwise_and(h, s), v)
+
+        kernel = get_dilation_kernel(self.dilation_kernel_size)
+        res = []
+        for color_lut in color_luts:
+            # binary dilation
+            bw = cv2.dilate(cv2.LUT(bits, color_lut), kernel)
+            # refine edge for certain color
+            edge_color = cv2.bitwise_and(bw, self.edges)
+            res.append((bw, edge_color))
+        return res
+
     def _findEdge(self, gray):
         edges = cv2.Canny(gray, self.canny_thresholds[0], self.canny_thresholds[1], apertureSize=3)
         return edges
@@ -131,6 +199,22 @@ class LineDetectorHSV(dtu.Configurable, LineDetectorInterface):
             centers, normals = self._findNormal(bw, lines)
         return Detections(lines=lines, normals=normals, area=bw, centers=centers)
 
+    def detectLinesAll(self, context=None, pool=None):
+        with phase(context, 'colorFilterAll'):
+            with dtu.timeit_clock('_colorFilterAll'):
+                filtered = self._colorFilterAll()
+
+        def detect(color_filtered):
+            color, (bw, edge_color) = color_filtered
+            with phase(context, 'Hough+normals %s' % color):
+                lines = self._HoughLine(edge_color)
+                centers, normals = self._findNormal(bw, lines)
+            return Detections(lines=lines, normals=normals, area=bw, centers=centers)
+
+        with phase(context, 'Hough+normals'):
+            white, yellow, red = map_colors(detect, zip(COLORS, filtered), pool)
+        return white, yellow, red
+
     def setImage(self, bgr):
 
         with dtu.timeit_clock('np.copy'):
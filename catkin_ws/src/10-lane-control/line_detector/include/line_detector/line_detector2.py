@@ -1,6 +1,7 @@
 import numpy as np
 import cv2
 
+from .line_detector1 import get_dilation_kernel
 from .line_detector_interface import Detections, LineDetectorInterface
 import duckietown_utils as dtu
 
@@ -44,7 +45,7 @@ class LineDetector2Dense(dtu.Configurable, LineDetectorInterface):
             raise Exception('Error: Undefined color strings...')
 
         # binary dilation
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(self.dilation_kernel_size, self.dilation_kernel_size))
+        kernel = get_dilation_kernel(self.dilation_kernel_size)
 
         # refine edge for certain color
         edge_color = cv2.bitwise_and(cv2.dilate(bw, kernel), self.edges)
@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
 from collections import namedtuple
+from contextlib import contextmanager
 
 FAMILY_LINE_DETECTOR = 'line_detector'
 
@@ -18,4 +19,40 @@ class LineDetectorInterface():
     def detectLines(self, color):
         """ Returns a tuple of class Detections """
 
+    def detectLinesAll(self, context=None, pool=None):
+        """
+            Returns the Detections for white, yellow and red, in this order.
 
+            If pool (see get_line_detector_pool()) is given, the colors
+            are processed in parallel by its threads. If context is given,
+            the time of each color is reported with context.phase().
+
+            Subclasses can override this to share work between the colors.
+        """
+        def detect(color):
+            with phase(context, 'detectLines %s' % color):
+                return self.detectLines(color)
+
+        white, yellow, red = map_colors(detect, COLORS, pool)
+        return white, yellow, red
+
+
+COLORS = ['white', 'yellow', 'red']
+
+
+def map_colors(f, args, pool):
+    """ Same as map(f, args), in parallel if pool is not None. """
+    if pool is None:
+        return map(f, args)
+    else:
+        return pool.map(f, args)
+
+
+@contextmanager
+def phase(context, name):
+    """ Same as context.phase(name), or nothing if context is None. """
+    if context is None:
+        yield
+    else:
+        with context.phase(name):
+            yield
@@ -0,0 +1,19 @@
+from multiprocessing.pool import ThreadPool
+
+import duckietown_utils as dtu
+
+__all__ = [
+    'get_line_detector_pool',
+]
+
+
+@dtu.memoize_simple
+def get_line_detector_pool(num_threads):
+    """
+        Returns a persistent pool of num_threads threads, shared by all
+        the line detectors of the process.
+
+        OpenCV releases the GIL, so the per-color Hough transforms
+        run in parallel on a multi-core CPU.
+    """
+    return ThreadPool(processes=num_threads)
@@ -8,9 +8,17 @@ def asms(s):
         
 
 class TimeKeeper():
-    def __init__(self,  image_msg):
+    def __init__(self,  image_msg, stats=None):
+        """
+            If stats (a ProcessingTimingStats) is given, the message is
+            counted as processed and the duration of each phase is recorded
+            there as well.
+        """
         self.t_acquisition = image_msg.header.stamp.to_sec()
         self.t_started = time.time()
+        self.stats = stats
+        if stats is not None:
+            stats.decided_to_process(image_msg)
 
         self.latencies = []
 
@@ -32,6 +40,9 @@ class TimeKeeper():
             delta_wall_ms = None
             delta_clock_ms = None
 
+        if self.stats is not None and self.latencies:
+            self.stats.record_phase(phase, t - last_t, c - last_c, latency)
+
         self.latencies.append((phase, 
             dict(t=t, c=c, delta_wall_ms=delta_wall_ms, delta_clock_ms=delta_clock_ms,
              latency_ms=latency_ms)))
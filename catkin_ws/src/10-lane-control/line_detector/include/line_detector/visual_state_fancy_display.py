@@ -1,15 +1,17 @@
 import cv2
 
-from duckietown_msgs.msg import Segment, SegmentList
+from duckietown_msgs.msg import Segment
 import numpy as np
 
 import duckietown_utils as dtu
 AA = cv2.LINE_AA  # @UndefinedVariable
 
-@dtu.contract(bgr='array', segment_list=SegmentList, width='int,>=1')
+@dtu.contract(bgr='array', width='int,>=1')
 def vs_fancy_display(bgr, segment_list, width=2):
     """
          Writes on a bgr image.
+
+         segment_list: a SegmentList or a SegmentArrayList.
          
          Returns a new image.
     """
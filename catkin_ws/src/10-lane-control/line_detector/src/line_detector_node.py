@@ -1,20 +1,25 @@
 #!/usr/bin/env python
 from anti_instagram.AntiInstagram_rebuild import AntiInstagram
 from cv_bridge import CvBridge, CvBridgeError
-from duckietown_msgs.msg import (AntiInstagramTransform, BoolStamped, FSMState, Segment,
-    SegmentList, Vector2D)
+from duckietown_msgs.msg import (AntiInstagramTransform, AntiInstagramTransform_CB, BoolStamped,
+    FSMState, Segment, SegmentList, Vector2D)
 from duckietown_utils.instantiate_utils import instantiate
 from duckietown_utils.jpg import bgr_from_jpg
+from duckietown_utils.latest_frame import LatestFrameWorker
 from geometry_msgs.msg import Point
+from ground_projection.segment_array_list import (segment_array_list_from_lines,
+                                                  concatenate_segment_array_lists)
 from sensor_msgs.msg import CompressedImage, Image
 from visualization_msgs.msg import Marker
 
 from line_detector.timekeeper import TimeKeeper
+from easy_node.utils.diagnostics import TimingDiagnosticsPublisher
+from easy_node.utils.timing import ProcessingTimingStats
 import cv2
 import rospy
-import threading
 import time
 from line_detector.line_detector_plot import color_segment, drawLines
+from line_detector.thread_pool import get_line_detector_pool
 import numpy as np
 
 
@@ -22,8 +27,10 @@ class LineDetectorNode(object):
     def __init__(self):
         self.node_name = "LineDetectorNode"
 
-        # Thread lock
-        self.thread_lock = threading.Lock()
+        # A single worker processes the newest image; the images that
+        # arrive while it is busy replace each other.
+        self.worker = LatestFrameWorker(process=self.processImage_, name=self.node_name,
+                                        on_drop=self.onDrop)
 
         # Constructor of line detector
         self.bridge = CvBridge()
@@ -32,12 +39,26 @@ class LineDetectorNode(object):
 
         self.stats = Stats()
 
+        # latency and frequency statistics, published on /diagnostics
+        self.timing = ProcessingTimingStats()
+        diagnostics_interval = rospy.get_param('~diagnostics_interval', 5.0)
+        if diagnostics_interval > 0:
+            self.diagnostics = TimingDiagnosticsPublisher(diagnostics_interval, hardware_id=rospy.get_name())
+            self.diagnostics.add('line_detector_node: image', self.timing)
+
         # Only be verbose every 10 cycles
         self.intermittent_interval = 100
         self.intermittent_counter = 0
 
         # color correction
         self.ai = AntiInstagram()
+        # If true, the color correction is done here, on the resized and
+        # cropped image, and the node subscribes to the camera image
+        # instead of the image_transformer_node output: this avoids
+        # decoding and encoding the JPEG once more per frame.
+        self.apply_ai = rospy.get_param('~apply_ai', False)
+        # 'cb', 'lin' or 'both', as for the image_transformer_node
+        self.ai_trafo_mode = rospy.get_param('~ai_trafo_mode', 'cb')
 
         # these will be added if it becomes verbose
         self.pub_edge = None
@@ -60,12 +81,17 @@ class LineDetectorNode(object):
         self.pub_image = rospy.Publisher("~image_with_lines", Image, queue_size=1)
 
         # Subscribers
-        self.sub_image = rospy.Subscriber("~corrected_image/compressed", CompressedImage, self.cbImage, queue_size=1)
+        if self.apply_ai:
+            self.sub_image = rospy.Subscriber("~image/compressed", CompressedImage, self.cbImage, queue_size=1)
+        else:
+            self.sub_image = rospy.Subscriber("~corrected_image/compressed", CompressedImage, self.cbImage, queue_size=1)
         self.sub_transform = rospy.Subscriber("~transform", AntiInstagramTransform, self.cbTransform, queue_size=1)
+        if self.apply_ai:
+            self.sub_transform_CB = rospy.Subscriber("~colorBalanceTrafo", AntiInstagramTransform_CB, self.cbTransformCB, queue_size=1)
         self.sub_switch = rospy.Subscriber("~switch", BoolStamped, self.cbSwitch, queue_size=1)
         self.sub_fsm = rospy.Subscriber("~fsm_mode", FSMState, self.cbFSM, queue_size=1)
 
-        rospy.loginfo("[%s] Initialized (verbose = %s)." %(self.node_name, self.verbose))
+        rospy.loginfo("[%s] Initialized (verbose = %s, apply_ai = %s)." %(self.node_name, self.verbose, self.apply_ai))
 
         rospy.Timer(rospy.Duration.from_sec(2.0), self.updateParams)
 
@@ -87,6 +113,7 @@ class LineDetectorNode(object):
             self.loginfo('Verbose is now %r' % self.verbose)
 
         self.image_size = rospy.get_param('~img_size')
+        self.num_threads = rospy.get_param('~num_threads', 0)
         self.top_cutoff = rospy.get_param('~top_cutoff')
 
         if self.detector is None:
@@ -121,14 +148,17 @@ class LineDetectorNode(object):
     def cbImage(self, image_msg):
         # print('line_detector_node: image received!!')
         self.stats.received()
+        self.timing.received_message(image_msg)
 
         if not self.active:
+            self.timing.decided_to_skip()
             return
-        # Start a daemon thread to process the image
-        thread = threading.Thread(target=self.processImage,args=(image_msg,))
-        thread.setDaemon(True)
-        thread.start()
-        # Returns rightaway
+        # Hand the image to the worker; returns right away
+        self.worker.put(image_msg)
+
+    def onDrop(self, _image_msg):
+        self.stats.skipped()
+        self.timing.decided_to_skip()
 
     def cbTransform(self, transform_msg):
         self.ai.shift = transform_msg.s[0:3]
@@ -136,6 +166,12 @@ class LineDetectorNode(object):
 
         self.loginfo("AntiInstagram transform received")
 
+    def cbTransformCB(self, th_msg):
+        self.ai.ThLow = th_msg.th[0:3]
+        self.ai.ThHi = th_msg.th[3:6]
+
+        self.loginfo("AntiInstagram color balance received")
+
     def loginfo(self, s):
         rospy.loginfo('[%s] %s' % (self.node_name, s))
 
@@ -147,27 +183,16 @@ class LineDetectorNode(object):
             return
         self.loginfo('%3d:%s' % (self.intermittent_counter, s))
 
-    def processImage(self, image_msg):
-        if not self.thread_lock.acquire(False):
-            self.stats.skipped()
-            # Return immediately if the thread is locked
-            return
-
-        try:
-            self.processImage_(image_msg)
-        finally:
-            # Release the thread lock
-            self.thread_lock.release()
-
     def processImage_(self, image_msg):
 
         self.stats.processed()
 
         if self.intermittent_log_now():
             self.intermittent_log(self.stats.info())
+            self.intermittent_log('worker: %s' % self.worker.info())
             self.stats.reset()
 
-        tk = TimeKeeper(image_msg)
+        tk = TimeKeeper(image_msg, stats=self.timing)
 
         self.intermittent_counter += 1
 
@@ -191,40 +216,40 @@ class LineDetectorNode(object):
 
         tk.completed('resized')
 
-        # milansc: color correction is now done within the image_tranformer_node (antiInstagram pkg)
-        """
-        # apply color correction: AntiInstagram
-        image_cv_corr = self.ai.applyTransform(image_cv)
-        image_cv_corr = cv2.convertScaleAbs(image_cv_corr)
-        tk.completed('corrected')
-        """
+        # milansc: color correction is now done within the image_tranformer_node (antiInstagram pkg),
+        # unless apply_ai is set: then it is done here, on the small image.
+        if self.apply_ai:
+            image_cv = self.applyColorCorrection(image_cv)
+            tk.completed('corrected')
+
         # Set the image to be detected
         self.detector_used.setImage(image_cv)
 
         # Detect lines and normals
 
-        white = self.detector_used.detectLines('white')
-        yellow = self.detector_used.detectLines('yellow')
-        red = self.detector_used.detectLines('red')
+        if self.num_threads:
+            pool = get_line_detector_pool(self.num_threads)
+        else:
+            pool = None
+        white, yellow, red = self.detector_used.detectLinesAll(pool=pool)
 
         tk.completed('detected')
 
-        # SegmentList constructor
-        segmentList = SegmentList()
-        segmentList.header.stamp = image_msg.header.stamp
-
-        # Convert to normalized pixel coordinates, and add segments to segmentList
+        # Convert to normalized pixel coordinates, and create the segments as arrays
         arr_cutoff = np.array((0, self.top_cutoff, 0, self.top_cutoff))
         arr_ratio = np.array((1./self.image_size[1], 1./self.image_size[0], 1./self.image_size[1], 1./self.image_size[0]))
+        segment_array_lists = []
         if len(white.lines) > 0:
             lines_normalized_white = ((white.lines + arr_cutoff) * arr_ratio)
-            segmentList.segments.extend(self.toSegmentMsg(lines_normalized_white, white.normals, Segment.WHITE))
+            segment_array_lists.append(self.toSegmentArrays(lines_normalized_white, white.normals, Segment.WHITE))
         if len(yellow.lines) > 0:
             lines_normalized_yellow = ((yellow.lines + arr_cutoff) * arr_ratio)
-            segmentList.segments.extend(self.toSegmentMsg(lines_normalized_yellow, yellow.normals, Segment.YELLOW))
+            segment_array_lists.append(self.toSegmentArrays(lines_normalized_yellow, yellow.normals, Segment.YELLOW))
         if len(red.lines) > 0:
             lines_normalized_red = ((red.lines + arr_cutoff) * arr_ratio)
-            segmentList.segments.extend(self.toSegmentMsg(lines_normalized_red, red.normals, Segment.RED))
+            segment_array_lists.append(self.toSegmentArrays(lines_normalized_red, red.normals, Segment.RED))
+        segment_array_list = concatenate_segment_array_lists(segment_array_lists)
+        segment_array_list.header.stamp = image_msg.header.stamp
 
         self.intermittent_log('# segments: white %3d yellow %3d red %3d' % (len(white.lines),
                 len(yellow.lines), len(red.lines)))
@@ -232,7 +257,8 @@ class LineDetectorNode(object):
         tk.completed('prepared')
 
         # Publish segmentList
-        self.pub_lines.publish(segmentList)
+        # (serialized directly from the arrays, without creating the Segments)
+        self.pub_lines.publish(segment_array_list.as_message())
         tk.completed('--pub_lines--')
 
         # VISUALIZATION only below
@@ -269,24 +295,18 @@ class LineDetectorNode(object):
         self.intermittent_log(tk.getall())
 
 
+    def applyColorCorrection(self, image_cv):
+        """ Same corrections as the image_transformer_node, with the latest parameters. """
+        return self.ai.applyCorrection(image_cv, self.ai_trafo_mode, stretch_image=False)
+
     def onShutdown(self):
         self.loginfo("Shutdown.")
 
     def toSegmentMsg(self,  lines, normals, color):
+        return self.toSegmentArrays(lines, normals, color).segments
 
-        segmentMsgList = []
-        for x1,y1,x2,y2,norm_x,norm_y in np.hstack((lines,normals)):
-            segment = Segment()
-            segment.color = color
-            segment.pixels_normalized[0].x = x1
-            segment.pixels_normalized[0].y = y1
-            segment.pixels_normalized[1].x = x2
-            segment.pixels_normalized[1].y = y2
-            segment.normal.x = norm_x
-            segment.normal.y = norm_y
-
-            segmentMsgList.append(segment)
-        return segmentMsgList
+    def toSegmentArrays(self, lines, normals, color):
+        return segment_array_list_from_lines(lines, normals, color)
 
 class Stats():
     def __init__(self):
@@ -1,18 +1,27 @@
 import cv2
 
-from duckietown_msgs.msg import Segment, SegmentList
+from duckietown_msgs.msg import Segment
+from ground_projection.segment_array_list import (segment_array_list_from_lines,
+                                                  concatenate_segment_array_lists,
+                                                  segment_array_list_from_segment_list)
+from line_detector.thread_pool import get_line_detector_pool
 import numpy as np
 
 from .fuzzing import fuzzy_segment_list_image_space
-from .ldn import toSegmentMsg
 
 
 class ImagePrep(object):
 
     FAMILY = 'image_prep'
 
-    def __init__(self, shape, top_cutoff, resampling_algorithm, fuzzy_mult=None, fuzzy_noise=None):
+    def __init__(self, shape, top_cutoff, resampling_algorithm, fuzzy_mult=None, fuzzy_noise=None,
+                 num_threads=None):
+        """
+            If num_threads is given, the line detection for the three colors
+            is done in parallel by a pool of num_threads threads.
+        """
         self.shape = shape
+        self.num_threads = num_threads
         self.top_cutoff = top_cutoff
         self.fuzzy_mult = fuzzy_mult
         self.fuzzy_noise = fuzzy_noise
@@ -22,8 +31,13 @@ class ImagePrep(object):
             msg = 'Good values for resampling_algorithm: %s, not %r.' % (allowed, resampling_algorithm)
             raise ValueError(msg)
 
-    def process(self, context, image_cv, line_detector, transform):
-        """ Returns SegmentList """
+    def process(self, context, image_cv, line_detector, transform, as_arrays=False):
+        """
+            Returns SegmentList.
+
+            If as_arrays is True, returns a SegmentArrayList instead; if
+            there is no fuzzing, the Segment objects are never created.
+        """
 
         shape = image_cv.shape
         if len(shape) != 3:
@@ -69,46 +83,48 @@ class ImagePrep(object):
                 line_detector.setImage(self.image_corrected)
 
             # Detect lines and normals
-            with context.phase('white'):
-                white = line_detector.detectLines('white')
-            with context.phase('yellow'):
-                yellow = line_detector.detectLines('yellow')
-
-            with context.phase('red'):
-                red = line_detector.detectLines('red')
+            if self.num_threads:
+                pool = get_line_detector_pool(self.num_threads)
+            else:
+                pool = None
+            white, yellow, red = line_detector.detectLinesAll(context=context, pool=pool)
 
             with context.phase('get_segment_list_normalized'):
-                segment_list = get_segment_list_normalized(self.top_cutoff,
-                                                       self.shape, white, yellow, red)
+                segment_array_list = get_segment_array_list_normalized(self.top_cutoff,
+                                                                       self.shape, white, yellow, red)
 
         # SegmentList constructor
         if self.fuzzy_mult is not None:
-            segment_list2 = fuzzy_segment_list_image_space(segment_list,
+            segment_list2 = fuzzy_segment_list_image_space(segment_array_list.to_segment_list(),
                                                            n=self.fuzzy_mult,
                                                            intensity=self.fuzzy_noise)
+            if as_arrays:
+                return segment_array_list_from_segment_list(segment_list2)
             return segment_list2
+        elif as_arrays:
+            return segment_array_list
         else:
-            return segment_list
+            return segment_array_list.to_segment_list()
 
 
 def get_segment_list_normalized(top_cutoff, shape, white, yellow, red):
-    segmentList = SegmentList()
+    sal = get_segment_array_list_normalized(top_cutoff, shape, white, yellow, red)
+    return sal.to_segment_list()
 
-    # Convert to normalized pixel coordinates, and add segments to segmentList
+
+def get_segment_array_list_normalized(top_cutoff, shape, white, yellow, red, header=None):
+    """ Same as get_segment_list_normalized(), returns a SegmentArrayList. """
+    # Convert to normalized pixel coordinates
     s0, s1 = shape
     arr_cutoff = np.array((0, top_cutoff, 0, top_cutoff))
     arr_ratio = np.array((1. / s1, 1. / s0, 1. / s1, 1. / s0))
 
-    if len(white.lines) > 0:
-        lines_normalized_white = ((white.lines + arr_cutoff) * arr_ratio)
-        segmentList.segments.extend(toSegmentMsg(lines_normalized_white, white.normals, Segment.WHITE))
-
-    if len(yellow.lines) > 0:
-        lines_normalized_yellow = ((yellow.lines + arr_cutoff) * arr_ratio)
-        segmentList.segments.extend(toSegmentMsg(lines_normalized_yellow, yellow.normals, Segment.YELLOW))
-
-    if len(red.lines) > 0:
-        lines_normalized_red = ((red.lines + arr_cutoff) * arr_ratio)
-        segmentList.segments.extend(toSegmentMsg(lines_normalized_red, red.normals, Segment.RED))
+    sals = []
+    for detections, color in [(white, Segment.WHITE),
+                              (yellow, Segment.YELLOW),
+                              (red, Segment.RED)]:
+        if len(detections.lines) > 0:
+            lines_normalized = ((detections.lines + arr_cutoff) * arr_ratio)
+            sals.append(segment_array_list_from_lines(lines_normalized, detections.normals, color))
 
-    return segmentList
+    return concatenate_segment_array_lists(sals, header=header)
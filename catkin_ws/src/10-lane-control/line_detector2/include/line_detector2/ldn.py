@@ -2,12 +2,14 @@ import cv2
 
 from anti_instagram import AntiInstagram
 from cv_bridge import CvBridge
-from duckietown_msgs.msg import Segment, SegmentList
 import duckietown_utils as dtu
 from easy_algo import get_easy_algo_db
 from easy_node import EasyNode
+from ground_projection.segment_array_list import segment_array_list_from_lines
+from line_detector.thread_pool import get_line_detector_pool
 import numpy as np
 
+from .image_prep import get_segment_array_list_normalized
 from .plotting import drawLines, color_segment
 
 
@@ -78,37 +80,26 @@ class LineDetectorNode2(EasyNode):
             self.detector.setImage(image_cv_corr)
 
             # Detect lines and normals
-            white = self.detector.detectLines('white')
-            yellow = self.detector.detectLines('yellow')
-            red = self.detector.detectLines('red')
+            if self.config.num_threads:
+                pool = get_line_detector_pool(self.config.num_threads)
+            else:
+                pool = None
+            white, yellow, red = self.detector.detectLinesAll(context=context, pool=pool)
 
         with context.phase('preparing-images'):
-            # SegmentList constructor
-            segmentList = SegmentList()
-            segmentList.header.stamp = image_msg.header.stamp
-
-            # Convert to normalized pixel coordinates, and add segments to segmentList
-            top_cutoff = self.config.top_cutoff
-            s0, s1 = self.config.img_size[0], self.config.img_size[1]
-
-            arr_cutoff = np.array((0, top_cutoff, 0, top_cutoff))
-            arr_ratio = np.array((1. / s1, 1. / s0, 1. / s1, 1. / s0))
-            if len(white.lines) > 0:
-                lines_normalized_white = ((white.lines + arr_cutoff) * arr_ratio)
-                segmentList.segments.extend(toSegmentMsg(lines_normalized_white, white.normals, Segment.WHITE))
-            if len(yellow.lines) > 0:
-                lines_normalized_yellow = ((yellow.lines + arr_cutoff) * arr_ratio)
-                segmentList.segments.extend(toSegmentMsg(lines_normalized_yellow, yellow.normals, Segment.YELLOW))
-            if len(red.lines) > 0:
-                lines_normalized_red = ((red.lines + arr_cutoff) * arr_ratio)
-                segmentList.segments.extend(toSegmentMsg(lines_normalized_red, red.normals, Segment.RED))
+            # Convert to normalized pixel coordinates, as arrays
+            segment_array_list = get_segment_array_list_normalized(self.config.top_cutoff,
+                                                                   self.config.img_size,
+                                                                   white, yellow, red)
+            segment_array_list.header.stamp = image_msg.header.stamp
 
             self.intermittent_log('# segments: white %3d yellow %3d red %3d' % (len(white.lines),
                     len(yellow.lines), len(red.lines)))
 
         # Publish segmentList
         with context.phase('publishing'):
-            self.publishers.segment_list.publish(segmentList)
+            # serialized directly from the arrays
+            self.publishers.segment_list.publish(segment_array_list.as_message())
 
         # VISUALIZATION only below
 
@@ -147,15 +138,4 @@ class LineDetectorNode2(EasyNode):
 
 
 def toSegmentMsg(lines, normals, color):
-    segmentMsgList = []
-    for x1, y1, x2, y2, norm_x, norm_y in np.hstack((lines, normals)):
-        segment = Segment()
-        segment.color = color
-        segment.pixels_normalized[0].x = x1
-        segment.pixels_normalized[0].y = y1
-        segment.pixels_normalized[1].x = x2
-        segment.pixels_normalized[1].y = y2
-        segment.normal.x = norm_x
-        segment.normal.y = norm_y
-        segmentMsgList.append(segment)
-    return segmentMsgList
+    return segment_array_list_from_lines(lines, normals, color).segments
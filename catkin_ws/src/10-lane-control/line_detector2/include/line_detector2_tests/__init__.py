@@ -1,3 +1,5 @@
 
 from . import single_image
 from . import single_image_histogram
+from . import multi_color
+from . import segment_array_list
@@ -0,0 +1,93 @@
+import time
+
+import cv2
+from numpy.testing.utils import assert_equal
+
+import duckietown_utils as dtu
+from easy_node.utils.timing import ProcessingTimingStats
+from line_detector import LineDetectorHSV, LineDetector2Dense, get_line_detector_pool
+import numpy as np
+
+
+def get_baseline_configuration():
+    """ Same as baseline.line_detector.yaml """
+    return dict(dilation_kernel_size=3, canny_thresholds=[80, 200],
+                hough_threshold=2, hough_min_line_length=3, hough_max_line_gap=1,
+                hsv_white1=[0, 0, 150], hsv_white2=[180, 60, 255],
+                hsv_yellow1=[25, 140, 100], hsv_yellow2=[45, 255, 255],
+                hsv_red1=[0, 140, 100], hsv_red2=[15, 255, 255],
+                hsv_red3=[165, 140, 100], hsv_red4=[180, 255, 255])
+
+
+def synthetic_road_image(H=120, W=160):
+    """ A gray road with white, yellow and red stripes, plus noise. """
+    bgr = np.zeros((H, W, 3), 'uint8')
+    bgr[:, :] = (60, 60, 60)
+    cv2.line(bgr, (W - 10, H - 1), (W / 2 + 10, 0), (255, 255, 255), 4)
+    cv2.line(bgr, (10, H - 1), (W / 2 - 10, 0), (0, 220, 240), 4)
+    cv2.line(bgr, (0, H / 2), (W - 1, H / 2 + 10), (20, 20, 230), 3)
+    noise = np.random.randint(-30, 30, size=bgr.shape)
+    return np.clip(bgr + noise, 0, 255).astype('uint8')
+
+
+@dtu.unit_test
+def detect_lines_all_same_as_each_color():
+    np.random.seed(7)
+    detector = LineDetectorHSV(get_baseline_configuration())
+    for _ in range(3):
+        detector.setImage(synthetic_road_image())
+        separate = [detector.detectLines(color) for color in ['white', 'yellow', 'red']]
+        together = detector.detectLinesAll()
+        for a, b in zip(separate, together):
+            assert_equal(a.area, b.area)
+            assert_equal(np.array(a.lines), np.array(b.lines))
+            assert_equal(np.array(a.normals), np.array(b.normals))
+
+
+@dtu.unit_test
+def detect_lines_all_parallel():
+    np.random.seed(9)
+    pool = get_line_detector_pool(3)
+    config_dense = get_baseline_configuration()
+    for k in ['hough_threshold', 'hough_min_line_length', 'hough_max_line_gap']:
+        del config_dense[k]
+    config_dense['sobel_threshold'] = 40
+    detectors = [LineDetectorHSV(get_baseline_configuration()),
+                 LineDetector2Dense(config_dense)]
+    for detector in detectors:
+        detector.setImage(synthetic_road_image())
+        pts = ProcessingTimingStats()
+        pts.reset()
+        pts.received_message()
+        pts.decided_to_process()
+        serial = detector.detectLinesAll()
+        parallel = detector.detectLinesAll(context=pts, pool=pool)
+        for a, b in zip(serial, parallel):
+            assert_equal(a.area, b.area)
+            assert_equal(np.array(a.lines), np.array(b.lines))
+            assert_equal(np.array(a.normals), np.array(b.normals))
+        print(pts.get_stats())
+
+
+@dtu.unit_test
+def detect_lines_all_benchmark():
+    np.random.seed(8)
+    detector = LineDetectorHSV(get_baseline_configuration())
+    n = 50
+    for H, W in [(120, 160), (480, 640)]:
+        detector.setImage(synthetic_road_image(H=H, W=W))
+        t0 = time.time()
+        for _ in range(n):
+            for color in ['white', 'yellow', 'red']:
+                detector._colorFilter(color)
+        t_separate = (time.time() - t0) / n
+        t0 = time.time()
+        for _ in range(n):
+            detector._colorFilterAll()
+        t_together = (time.time() - t0) / n
+        print('color filter %dx%d: separate %.3f ms  together %.3f ms' %
+              (W, H, t_separate * 1000, t_together * 1000))
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,125 @@
+from StringIO import StringIO
+
+from numpy.testing.utils import assert_almost_equal
+
+from duckietown_msgs.msg import Segment, SegmentList
+import duckietown_utils as dtu
+from easy_node.utils.timing import FakeContext
+from ground_projection.segment_array_list import (segment_array_list_from_lines,
+                                                  segment_array_list_from_segment_list,
+                                                  concatenate_segment_array_lists,
+                                                  deserialize_segment_array_list)
+from line_detector import LineDetectorHSV
+from line_detector2.image_prep import ImagePrep
+from line_detector2_tests.multi_color import get_baseline_configuration, synthetic_road_image
+import numpy as np
+
+
+def to_segment_msg_per_segment(lines, normals, color):
+    """ The original toSegmentMsg() """
+    segmentMsgList = []
+    for x1, y1, x2, y2, norm_x, norm_y in np.hstack((lines, normals)):
+        segment = Segment()
+        segment.color = color
+        segment.pixels_normalized[0].x = x1
+        segment.pixels_normalized[0].y = y1
+        segment.pixels_normalized[1].x = x2
+        segment.pixels_normalized[1].y = y2
+        segment.normal.x = norm_x
+        segment.normal.y = norm_y
+        segmentMsgList.append(segment)
+    return segmentMsgList
+
+
+def random_segment_array_list(n):
+    sals = []
+    for color in [Segment.WHITE, Segment.YELLOW, Segment.RED]:
+        lines = np.random.uniform(0, 1, size=(n, 4))
+        normals = np.random.uniform(-1, 1, size=(n, 2))
+        sal = segment_array_list_from_lines(lines, normals, color)
+        sal.points[:] = np.random.uniform(-1, 1, size=(n, 2, 3))
+        sals.append(sal)
+    return concatenate_segment_array_lists(sals)
+
+
+def assert_same_segment(s1, s2):
+    assert s1.color == s2.color
+    for i in range(2):
+        assert_almost_equal(s1.pixels_normalized[i].x, s2.pixels_normalized[i].x, decimal=6)
+        assert_almost_equal(s1.pixels_normalized[i].y, s2.pixels_normalized[i].y, decimal=6)
+        assert_almost_equal(s1.points[i].x, s2.points[i].x)
+        assert_almost_equal(s1.points[i].y, s2.points[i].y)
+        assert_almost_equal(s1.points[i].z, s2.points[i].z)
+    assert_almost_equal(s1.normal.x, s2.normal.x, decimal=6)
+    assert_almost_equal(s1.normal.y, s2.normal.y, decimal=6)
+
+
+@dtu.unit_test
+def segment_array_list_same_as_segments():
+    np.random.seed(8)
+    for n in [0, 1, 50]:
+        lines = np.random.uniform(0, 1, size=(n, 4))
+        normals = np.random.uniform(-1, 1, size=(n, 2))
+        slow = to_segment_msg_per_segment(lines, normals, Segment.YELLOW)
+        sal = segment_array_list_from_lines(lines, normals, Segment.YELLOW)
+        assert len(sal) == n
+        assert len(sal.segments) == n
+        for s1, s2 in zip(slow, sal.segments):
+            assert_same_segment(s1, s2)
+
+        # and back
+        sal2 = segment_array_list_from_segment_list(SegmentList(segments=slow))
+        assert_almost_equal(sal2.pixels_normalized, sal.pixels_normalized)
+        assert_almost_equal(sal2.normal, sal.normal)
+
+
+@dtu.unit_test
+def segment_array_list_serialization():
+    np.random.seed(9)
+    for n in [0, 1, 30]:
+        sal = random_segment_array_list(n)
+        sal.header.seq = 42
+        sal.header.stamp.secs = 1234
+        sal.header.stamp.nsecs = 5678
+        sal.header.frame_id = 'frame'
+
+        buff = StringIO()
+        sal.serialize(buff)
+        s = buff.getvalue()
+        assert len(s) == 3 * 4 + 4 + len('frame') + 4 + 73 * len(sal)
+
+        # same as the message serialization
+        segment_list = sal.to_segment_list()
+        if hasattr(segment_list, 'serialize'):
+            buff2 = StringIO()
+            segment_list.serialize(buff2)
+            assert buff2.getvalue() == s
+
+            buff3 = StringIO()
+            sal.as_message().serialize(buff3)
+            assert buff3.getvalue() == s
+
+        sal2 = deserialize_segment_array_list(s)
+        assert sal2.header.seq == 42
+        assert sal2.header.stamp.secs == 1234
+        assert sal2.header.stamp.nsecs == 5678
+        assert sal2.header.frame_id == 'frame'
+        assert sal2.data.tostring() == sal.data.tostring()
+
+
+@dtu.unit_test
+def image_prep_as_arrays():
+    np.random.seed(10)
+    detector = LineDetectorHSV(get_baseline_configuration())
+    image_prep = ImagePrep(shape=[120, 160], top_cutoff=40, resampling_algorithm='nearest')
+    image = synthetic_road_image(H=480, W=640)
+    context = FakeContext()
+    segment_list = image_prep.process(context, image, detector, transform=None)
+    sal = image_prep.process(context, image, detector, transform=None, as_arrays=True)
+    assert len(segment_list.segments) == len(sal) > 0
+    for s1, s2 in zip(segment_list.segments, sal.segments):
+        assert_same_segment(s1, s2)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -1,5 +1,6 @@
 import graphviz
 import cv2
+import numpy as np
 import os,csv
 
 
@@ -29,23 +30,91 @@ class Edge(object):
         return "Edge(%r,%r,%r,%r)" % (self.source, self.target, self.weight, self.action)
 
 
+class GraphIndex(object):
+    """
+    Compact representation of a graph for the search algorithms, with the nodes numbered 0..n-1
+    in sorted order (node_ids maps the nodes to their number).
+
+    The edges are in CSR format: the edges of node i are indices[indptr[i]:indptr[i+1]] (target nodes),
+    with weights data[...] and actions actions[...]. Only the cheapest of parallel edges is kept.
+    targets[i] and weights[i] are the same rows as lists, for the loops of the searches.
+    positions is an array (n, 2), nan where the position is not known.
+    """
+    def __init__(self, graph):
+        self.nodes = sorted(graph._nodes)
+        self.node_ids = dict((node, i) for i, node in enumerate(self.nodes))
+        n = len(self.nodes)
+
+        indptr = [0]
+        indices = []
+        data = []
+        self.actions = []
+        for node in self.nodes:
+            cheapest = {}
+            for e in graph._edges.get(node, ()):
+                j = self.node_ids[e.target]
+                if j not in cheapest or (e.weight, e.action) < (cheapest[j].weight, cheapest[j].action):
+                    cheapest[j] = e
+            for j in sorted(cheapest):
+                indices.append(j)
+                data.append(cheapest[j].weight)
+                self.actions.append(cheapest[j].action)
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype='int32')
+        self.indices = np.array(indices, dtype='int32')
+        self.data = np.array(data, dtype='float64')
+
+        self.targets = [indices[indptr[i]:indptr[i + 1]] for i in range(n)]
+        self.weights = [data[indptr[i]:indptr[i + 1]] for i in range(n)]
+
+        self.positions = np.array([graph.node_positions.get(node, (np.nan, np.nan)) for node in self.nodes],
+                                  dtype='float64').reshape((n, 2))
+        # goal index -> list of the euclidean distances of all nodes to the goal
+        self._heuristics = {}
+
+    def edge_action(self, i, j):
+        """Returns the action of the edge i -> j."""
+        k = self.indptr[i] + self.targets[i].index(j)
+        return self.actions[k]
+
+    def heuristic_to(self, goal_id):
+        """Returns the euclidean distances of all the nodes to the goal (0 where there is no position)."""
+        h = self._heuristics.get(goal_id)
+        if h is None:
+            d = np.hypot(*(self.positions - self.positions[goal_id]).T)
+            h = self._heuristics[goal_id] = np.nan_to_num(d).tolist()
+        return h
+
+
+def position_key(position):
+    """The key of a position in the position index: the coordinates rounded to the cm."""
+    return round(position[0], 2), round(position[1], 2)
+
+
 class Graph(object):
     def __init__(self, node_label_fn=None):
         self._nodes = set()
         self._edges = dict()
         self.node_label_fn = node_label_fn if node_label_fn else lambda x: x
         self.node_positions = dict()
+        # position_key(position) -> node
+        self._nodes_by_pos = dict()
+        # GraphIndex, built when needed
+        self._index = None
 
     def __contains__(self, node):
         return node in self._nodes
 
     def add_node(self, node):
         """Adds a node to the graph."""
-        self._nodes.add(node)
+        if node not in self._nodes:
+            self._nodes.add(node)
+            self._index = None
 
     def add_edge(self, node1, node2, weight=1.0,action=None, bidirectional=False):
         """Adds an edge between node1 and node2. Adds the nodes to the graph first
         if they don't exist."""
+        self._index = None
         self.add_node(node1)
         self.add_node(node2)
         node1_edges = self._edges.get(node1, set())
@@ -58,12 +127,28 @@ class Graph(object):
 
     def set_node_positions(self, positions):
         self.node_positions = positions
+        self._nodes_by_pos = dict()
+        for node in sorted(positions):
+            self._nodes_by_pos.setdefault(position_key(positions[node]), node)
+        self._index = None
 
     def set_node_pos(self, node, pos):
         """Sets the (x,y) pos of the node, if it exists in the graph."""
         if not node in self:
             raise NodeNotInGraph(node)
+        if node in self.node_positions:
+            key = position_key(self.node_positions[node])
+            if self._nodes_by_pos.get(key) == node:
+                del self._nodes_by_pos[key]
         self.node_positions[node] = pos
+        self._nodes_by_pos.setdefault(position_key(pos), node)
+        self._index = None
+
+    def get_index(self):
+        """Returns the GraphIndex of the graph, rebuilt after the graph changes."""
+        if self._index is None:
+            self._index = GraphIndex(self)
+        return self._index
 
     @property
     def intersection_nodes(self):
@@ -75,9 +160,9 @@ class Graph(object):
         """
         Get the node with a given number
         """
-        for n in self._nodes:
-            if n == str(node_number):
-                return n
+        node = str(node_number)
+        if node in self._nodes:
+            return node
 
         # No node with the given number was found...
         return None
@@ -140,9 +225,10 @@ class Graph(object):
         return apriltags_mapping
 
     def get_node_by_pos(self,position):
-        for n in self._nodes:
-            if round(self.node_positions[n][0],2) == round(position[0],2) and round(self.node_positions[n][1],2) == round(position[1],2):
-                return n
+        """Returns the node at the position (up to the cm), or None."""
+        node = self._nodes_by_pos.get(position_key(position))
+        if node in self._nodes:
+            return node
         return None
 
     def draw(self, map_dir, highlight_edges=None, show_weights=None, map_name = 'duckietown', highlight_nodes = None):
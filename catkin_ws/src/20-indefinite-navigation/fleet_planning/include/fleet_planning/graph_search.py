@@ -1,11 +1,12 @@
 from __future__ import division
+import heapq
 import numpy as np
 
 from search_classes import SearchNode, Path
-from graph import Graph, Edge
+from graph import Graph, Edge, NodeNotInGraph
 from utils import *
 
-# Complete the definition of expand_node below
+
 class GraphSearchProblem(object):
 	def __init__(self, graph, start, goal):
 		self.graph = graph
@@ -25,23 +26,26 @@ class GraphSearchProblem(object):
 
 	def best_first_search(self, f):
 		"""Returns a solution path."""
-		q = PriorityQueue(f=f)
-		q.append(SearchNode(self.start))
-		expanded = set([self.start])
+		# binary heap with lazy deletion: a state can be in the heap several times,
+		# only the first time it is popped counts
+		counter = 0
+		q = [(f(SearchNode(self.start)), counter, SearchNode(self.start))]
+		best_cost = {self.start: 0.0}
+		expanded = set()
 		while q:
-			search_node = q.pop()
+			_, _, search_node = heapq.heappop(q)
+			if search_node.state in expanded:
+				continue
 			if self.test_goal(search_node.state):
 				return Path(search_node)
-			expanded.add(search_node)
+			expanded.add(search_node.state)
 			for child in self.expand_node(search_node):
-				if (child not in q) and (child not in expanded):
-				    q.append(child)
-				elif child in q:
-				    #look for a node in q with the same state as child, but different parent and cost.
-				    previous_search_node = q[child]
-				    if child.cost < previous_search_node.cost:
-				        del q[previous_search_node]
-				        q.append(child)
+				if child.state in expanded:
+					continue
+				if child.state not in best_cost or child.cost < best_cost[child.state]:
+					best_cost[child.state] = child.cost
+					counter += 1
+					heapq.heappush(q, (f(child), counter, child))
 		# If we get to here, no solution has been found.
 		return None
 
@@ -56,4 +60,59 @@ class GraphSearchProblem(object):
 
 	def astar_search(self):
 		"""Returns path found by A*"""
-		return self.best_first_search(lambda search_node: search_node.cost + self.h_to_Goal(search_node))
+		return self.astar_search_from_any([self.start])
+
+	def astar_search_from_any(self, starts):
+		"""
+			Many-to-one A*: returns the shortest path to the goal from any of the
+			start states (the start is path.path[0]), or None.
+		"""
+		index = self.graph.get_index()
+		for state in list(starts) + [self.goal]:
+			if state not in index.node_ids:
+				raise NodeNotInGraph(state)
+		goal = index.node_ids[self.goal]
+		h = index.heuristic_to(goal)
+		targets, weights = index.targets, index.weights
+
+		n = len(index.nodes)
+		inf = float('inf')
+		g = [inf] * n
+		parent = [-1] * n
+		closed = [False] * n
+		q = []
+		for state in starts:
+			i = index.node_ids[state]
+			g[i] = 0.0
+			q.append((h[i], i))
+		heapq.heapify(q)
+
+		while q:
+			_, i = heapq.heappop(q)
+			if closed[i]:
+				continue
+			if i == goal:
+				return self._path_from_index(index, parent, g, goal)
+			closed[i] = True
+			gi = g[i]
+			for j, w in zip(targets[i], weights[i]):
+				c = gi + w
+				if c < g[j] and not closed[j]:
+					g[j] = c
+					parent[j] = i
+					heapq.heappush(q, (c + h[j], j))
+		# If we get to here, no solution has been found.
+		return None
+
+	def _path_from_index(self, index, parent, g, goal):
+		chain = []
+		i = goal
+		while i != -1:
+			chain.append(i)
+			i = parent[i]
+		chain.reverse()
+		search_node = None
+		for k, i in enumerate(chain):
+			action = index.edge_action(chain[k - 1], i) if k > 0 else None
+			search_node = SearchNode(index.nodes[i], search_node, cost=g[i], action=action)
+		return Path(search_node)
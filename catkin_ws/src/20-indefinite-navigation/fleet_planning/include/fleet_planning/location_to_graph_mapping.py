@@ -51,9 +51,15 @@ class IntersectionMapper:
         self.mapping_tiles = []
         self.max_radius = 1  # in tile lenghts. If the 2d position is within this radius, it will be assign to this intersection. Must be <= 1.
 
+        # (tile x, tile y) -> list of (position in mapping_tiles, MappingTile)
+        self._tiles_by_cell = {}
+
         for tile in graph_creator.tile_map:
             if 'way' in tile.type:
-                self.mapping_tiles.append(MappingTile(tile))
+                mapping_tile = MappingTile(tile)
+                cell = (int(np.floor(tile.x)), int(np.floor(tile.y)))
+                self._tiles_by_cell.setdefault(cell, []).append((len(self.mapping_tiles), mapping_tile))
+                self.mapping_tiles.append(mapping_tile)
 
     def get_node_name(self, position_2d_m, rotation_deg):
         """
@@ -63,9 +69,19 @@ class IntersectionMapper:
         :param rotation_deg: z rotation in degrees on map, a float
         :return: node number as int
         """
-        for intersection in self.mapping_tiles:
-            if intersection.distance_to(position_2d_m) < self.max_radius * intersection.tile_length:
-                return intersection.node_from_duckiebot_rotation(rotation_deg)
+        # Only the tiles in the cells around the position can be within max_radius <= 1 tile of it.
+        # If several are, take the first one in mapping_tiles.
+        cx = int(np.floor(position_2d_m[0] / MappingTile.tile_length))
+        cy = int(np.floor(position_2d_m[1] / MappingTile.tile_length))
+        found = None
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for k, intersection in self._tiles_by_cell.get((x, y), ()):
+                    if (found is None or k < found[0]) and \
+                            intersection.distance_to(position_2d_m) < self.max_radius * intersection.tile_length:
+                        found = (k, intersection)
+        if found is not None:
+            return found[1].node_from_duckiebot_rotation(rotation_deg)
         return None
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+class AllPairsShortestPaths(object):
+    """
+        The shortest paths between all the nodes of a (static) graph, computed
+        once with Dijkstra from every node:
+
+            distances[i, j]  cost of the shortest path i -> j (inf if there is none)
+            next_hop[i, j]   the node after i on that path (i if i == j, -1 if there is none)
+
+        The rows and columns are the indices of the GraphIndex of the graph (index.node_ids).
+        Call update(graph) when the map changes.
+    """
+    def __init__(self, graph):
+        self.update(graph)
+
+    def update(self, graph):
+        self.graph = graph
+        self.index = index = graph.get_index()
+        n = len(index.nodes)
+        adjacency = csr_matrix((index.data, index.indices, index.indptr), shape=(n, n))
+
+        self.distances, predecessors = dijkstra(adjacency, directed=True, return_predecessors=True)
+        self.next_hop = next_hop_from_predecessors(predecessors)
+        self.next_hop[np.isinf(self.distances)] = -1
+
+    def node_id(self, node):
+        """Returns the index of the node, or None if the node is not in the graph."""
+        return self.index.node_ids.get(str(node))
+
+    def distance(self, source, target):
+        return self.distances[self.index.node_ids[source], self.index.node_ids[target]]
+
+    def get_path(self, source, target):
+        """Returns the list of nodes from source to target, or None if target cannot be reached."""
+        i, j = self.index.node_ids[source], self.index.node_ids[target]
+        if self.next_hop[i, j] < 0:
+            return None
+        path = [i]
+        while i != j:
+            i = self.next_hop[i, j]
+            path.append(i)
+        return [self.index.nodes[k] for k in path]
+
+    def closest_source(self, sources, target):
+        """
+            Returns the position in sources of the node with the shortest path
+            to target, or None if none of them can reach it.
+        """
+        d = self.distances[sources, target]
+        if len(d) == 0:
+            return None
+        k = int(np.argmin(d))
+        return None if np.isinf(d[k]) else k
+
+    def assign(self, sources, targets):
+        """
+            Optimal assignment (Hungarian method) of the sources to the targets,
+            minimizing the total distance from the sources to their targets.
+            Returns a list of (source position, target position), leaving out
+            the pairs with no path.
+        """
+        if len(sources) == 0 or len(targets) == 0:
+            return []
+        costs = self.distances[np.ix_(sources, targets)]
+        unreachable = np.isinf(costs)
+        # larger than any sum of finite distances, so that these pairs are avoided
+        big = 1.0 + np.sum(costs[~unreachable]) if np.any(~unreachable) else 1.0
+        rows, cols = linear_sum_assignment(np.where(unreachable, big, costs))
+        return [(int(r), int(c)) for r, c in zip(rows, cols) if not unreachable[r, c]]
+
+
+def next_hop_from_predecessors(predecessors):
+    """
+        Converts the predecessors matrix returned by scipy's dijkstra
+        (predecessors[i, j] is the node before j on the path i -> j, < 0 for i
+        and for the unreachable nodes) to next hops, by pointer jumping: each
+        node points to its predecessor, except the first hops that point to
+        themselves; following the pointers log2(path length) times by squaring
+        leads each node to its first hop.
+    """
+    n = predecessors.shape[0]
+    rows = np.arange(n)[:, np.newaxis]
+    columns = np.tile(np.arange(n), (n, 1))
+    first_hop = (predecessors == rows) | (predecessors < 0)
+    up = np.where(first_hop, columns, predecessors)
+    while True:
+        up2 = up[rows, up]
+        if np.array_equal(up2, up):
+            return up
+        up = up2
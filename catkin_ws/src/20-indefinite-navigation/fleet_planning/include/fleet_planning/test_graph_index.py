@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+import numpy as np
+
+from graph import Graph
+from generate_duckietown_map import graph_creator
+from location_to_graph_mapping import IntersectionMapper
+
+MAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/maps')
+
+
+class TestGraphIndex(unittest.TestCase):
+
+    def test_lookups(self):
+        graph = Graph()
+        graph.add_edge('1', '2', 1.0, 'f')
+        graph.add_edge('2', 'turn3', 1.0, 'l')
+        graph.set_node_positions({'1': (0.0, 0.0), '2': (1.004, 2.0), 'turn3': (1.5, 2.5)})
+        self.assertEqual(graph.get_node(1), '1')
+        self.assertEqual(graph.get_node('turn3'), 'turn3')
+        self.assertIsNone(graph.get_node(4))
+        self.assertEqual(graph.get_node_by_pos((1.0, 2.0)), '2')
+        self.assertIsNone(graph.get_node_by_pos((1.1, 2.0)))
+
+        graph.set_node_pos('2', (3.0, 3.0))
+        self.assertIsNone(graph.get_node_by_pos((1.0, 2.0)))
+        self.assertEqual(graph.get_node_by_pos((3.0, 3.0)), '2')
+
+    def test_csr(self):
+        graph = Graph()
+        graph.add_edge('a', 'b', 2.0, 'l')
+        graph.add_edge('a', 'b', 1.0, 's')
+        graph.add_edge('a', 'c', 1.5, 'r')
+        index = graph.get_index()
+        self.assertEqual(index.nodes, ['a', 'b', 'c'])
+        self.assertEqual(list(index.indptr), [0, 2, 2, 2])
+        self.assertEqual(list(index.indices), [1, 2])
+        self.assertEqual(list(index.data), [1.0, 1.5])
+        self.assertEqual(index.edge_action(0, 1), 's')
+
+        # the index is rebuilt after a change
+        graph.add_edge('c', 'a', 1.0, 'f')
+        self.assertIsNot(graph.get_index(), index)
+        self.assertEqual(list(graph.get_index().indptr), [0, 2, 2, 3])
+
+    def test_apriltags_mapping(self):
+        graph = graph_creator().build_graph_from_csv(MAP_DIR, 'autolab_tiles_map')
+        mapping = graph.get_apriltags_mapping(MAP_DIR)
+        for tag, node in mapping.items():
+            if node is not None:
+                self.assertEqual(graph.get_node_by_pos(graph.node_positions[node]), node)
+
+    def test_intersection_mapper(self):
+        gc = graph_creator()
+        gc.build_graph_from_csv(MAP_DIR, 'autolab_tiles_map')
+        mapper = IntersectionMapper(gc)
+
+        def linear_search(position, rotation):
+            for intersection in mapper.mapping_tiles:
+                if intersection.distance_to(position) < mapper.max_radius * intersection.tile_length:
+                    return intersection.node_from_duckiebot_rotation(rotation)
+            return None
+
+        random = np.random.RandomState(0)
+        size = (max(t.x for t in gc.tile_map) + 2) * 0.595, (max(t.y for t in gc.tile_map) + 2) * 0.595
+        for _ in range(2000):
+            position = np.array([random.uniform(-1, size[0]), random.uniform(-1, size[1])])
+            rotation = random.choice([0, 90, 180, 270]) + random.uniform(-10, 10)
+            self.assertEqual(mapper.get_node_name(position, rotation), linear_search(position, rotation))
+
+if __name__ == '__main__':
+    import rostest
+    rostest.rosrun('fleet_planning', 'test_graph_index', TestGraphIndex)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import itertools
+import random
+import unittest
+
+from graph import Graph
+from graph_search import GraphSearchProblem
+
+
+def grid_graph(n, seed=0, p_edge=0.8):
+    """A directed n x n grid with random weights >= the euclidean distance, each edge with probability p_edge."""
+    rnd = random.Random(seed)
+    graph = Graph()
+    positions = {}
+    for x, y in itertools.product(range(n), range(n)):
+        positions['%d_%d' % (x, y)] = (x, y)
+        for dx, dy, action in [(1, 0, 'e'), (0, 1, 'n'), (-1, 0, 'w'), (0, -1, 's')]:
+            if 0 <= x + dx < n and 0 <= y + dy < n and rnd.random() < p_edge:
+                graph.add_edge('%d_%d' % (x, y), '%d_%d' % (x + dx, y + dy), 1.0 + rnd.random(), action)
+    for node in list(positions):
+        graph.add_node(node)
+    graph.set_node_positions(positions)
+    return graph
+
+
+def dijkstra_costs(graph, start):
+    costs = {start: 0.0}
+    todo = set([start])
+    while todo:
+        node = min(todo, key=lambda x: costs[x])
+        todo.remove(node)
+        for e in graph.node_edges(node):
+            c = costs[node] + e.weight
+            if c < costs.get(e.target, float('inf')):
+                costs[e.target] = c
+                todo.add(e.target)
+    return costs
+
+
+class TestGraphSearch(unittest.TestCase):
+
+    def test_astar_is_optimal(self):
+        graph = grid_graph(6)
+        problem = GraphSearchProblem(graph, None, None)
+        nodes = sorted(graph.node_positions)
+        for start in nodes[::5]:
+            costs = dijkstra_costs(graph, start)
+            for goal in nodes:
+                problem.start, problem.goal = start, goal
+                path = problem.astar_search()
+                if goal not in costs:
+                    self.assertIsNone(path)
+                    continue
+                self.assertAlmostEqual(path.cost, costs[goal])
+                self.assertEqual(path.path[0], start)
+                self.assertEqual(path.path[-1], goal)
+                self.assertEqual(len(path.actions), len(path.path) - 1)
+                # the path follows edges with the given actions and adds up to the cost
+                total = 0.0
+                for (a, b), action in zip(path.edges(), path.actions):
+                    edge = min((e for e in graph.node_edges(a) if e.target == b), key=lambda e: e.weight)
+                    self.assertEqual(edge.action, action)
+                    total += edge.weight
+                self.assertAlmostEqual(total, path.cost)
+                # the generic best first search agrees
+                generic = problem.best_first_search(lambda sn: sn.cost + problem.h_to_Goal(sn))
+                self.assertAlmostEqual(generic.cost, path.cost)
+
+    def test_many_to_one(self):
+        graph = grid_graph(6, seed=1)
+        nodes = sorted(graph.node_positions)
+        starts = nodes[:3] + nodes[-3:]
+        problem = GraphSearchProblem(graph, None, '2_3')
+        path = problem.astar_search_from_any(starts)
+        best = min(dijkstra_costs(graph, s).get('2_3', float('inf')) for s in starts)
+        self.assertAlmostEqual(path.cost, best)
+        self.assertIn(path.path[0], starts)
+
+    def test_start_is_goal(self):
+        graph = grid_graph(3)
+        path = GraphSearchProblem(graph, '1_1', '1_1').astar_search()
+        self.assertEqual(path.path, ['1_1'])
+        self.assertEqual(path.cost, 0.0)
+
+if __name__ == '__main__':
+    import rostest
+    rostest.rosrun('fleet_planning', 'test_graph_search', TestGraphSearch)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import itertools
+import unittest
+
+import numpy as np
+
+from graph import Graph
+from shortest_paths import AllPairsShortestPaths
+from test_graph_search import grid_graph, dijkstra_costs
+
+
+class TestShortestPaths(unittest.TestCase):
+
+    def test_distances_and_paths(self):
+        graph = grid_graph(5, seed=3)
+        # parallel edge: the cheapest one counts
+        graph.add_edge('0_0', '1_0', 0.5, 'x')
+        sp = AllPairsShortestPaths(graph)
+        nodes = sorted(graph.node_positions)
+        for source in nodes:
+            costs = dijkstra_costs(graph, source)
+            for target in nodes:
+                path = sp.get_path(source, target)
+                if target not in costs:
+                    self.assertTrue(np.isinf(sp.distance(source, target)))
+                    self.assertIsNone(path)
+                    continue
+                self.assertAlmostEqual(sp.distance(source, target), costs[target])
+                self.assertEqual(path[0], source)
+                self.assertEqual(path[-1], target)
+                total = 0.0
+                for a, b in zip(path[:-1], path[1:]):
+                    total += min(e.weight for e in graph.node_edges(a) if e.target == b)
+                self.assertAlmostEqual(total, costs[target])
+
+    def test_closest_and_assignment(self):
+        graph = grid_graph(5, seed=4, p_edge=1.0)
+        sp = AllPairsShortestPaths(graph)
+        ids = [sp.node_id(n) for n in ['0_0', '4_4', '2_1', '0_3']]
+        targets = [sp.node_id(n) for n in ['1_1', '3_3', '4_0']]
+
+        k = sp.closest_source(ids, targets[0])
+        self.assertEqual(sp.distances[ids[k], targets[0]], min(sp.distances[ids, targets[0]]))
+
+        assignment = sp.assign(ids, targets)
+        self.assertEqual(len(assignment), len(targets))
+        total = sum(sp.distances[ids[s], targets[t]] for s, t in assignment)
+        best = min(sum(sp.distances[ids[s], targets[t]] for t, s in enumerate(perm))
+                   for perm in itertools.permutations(range(len(ids)), len(targets)))
+        self.assertAlmostEqual(total, best)
+
+    def test_unreachable(self):
+        graph = Graph()
+        graph.add_edge('a', 'b', 1.0, 'f')
+        graph.add_node('c')
+        sp = AllPairsShortestPaths(graph)
+        a, b, c = [sp.node_id(n) for n in 'abc']
+        self.assertIsNone(sp.closest_source([c, b], a))
+        self.assertEqual(sp.assign([a, c], [b, c]), [(0, 0), (1, 1)])
+        self.assertEqual(sp.assign([c], [a]), [])
+        self.assertIsNone(sp.node_id('d'))
+
+if __name__ == '__main__':
+    import rostest
+    rostest.rosrun('fleet_planning', 'test_shortest_paths', TestShortestPaths)
@@ -3,6 +3,7 @@
 from enum import Enum
 import rospy
 from fleet_planning.generate_duckietown_map import graph_creator
+from fleet_planning.shortest_paths import AllPairsShortestPaths
 from std_msgs.msg import ByteMultiArray, String
 from duckietown_msgs.msg import SourceTargetNodes
 from fleet_planning.message_serialization import InstructionMessageSerializer, LocalizationMessageSerializer
@@ -44,6 +45,9 @@ class TaxiCentralNode:
         self._graph = gc.build_graph_from_csv(map_dir, map_name)
         self._graph_creator = gc
 
+        # shortest paths between all the nodes, for the dispatch. To be updated if the map changes.
+        self._shortest_paths = AllPairsShortestPaths(self._graph)
+
         # publishers
         self._pub_duckiebot_target_location = rospy.Publisher('/taxi/commands', ByteMultiArray, queue_size=1)
         self._pub_draw_command = rospy.Publisher("~/draw_request", String, queue_size=1, latch=True)
@@ -125,61 +129,66 @@ class TaxiCentralNode:
 
     def _fleet_planning_closest_duckiebot(self):
         """
-        E.g. for every pending customer request do breadth first search to find closest available duckiebot.
-        Make sure to use Duckiebot.next_location for the search. Finally assign customer request to best duckiebot.
+        Assign the pending customer requests to the available duckiebots, so that the total length of the paths
+        from the duckiebots to the customers is minimal. Use Duckiebot.next_location for moving duckiebots.
+        The distances come from the shortest paths precomputed for the map (self._shortest_paths).
+        If there are more requests than available duckiebots, only the oldest requests are assigned.
+        The requests whose start location is not in the graph are rejected (removed), otherwise they would take
+        the slots of the oldest requests forever.
         """
-        # For now quickly find the closest duckiebot
-
-        # We work on the inverted graph. Because we want the duckiebot that has the shortest
-        # path to the location. I.e. if the duckiebot already drove past the location it
-        # might have to go a long distance. We don't want that.
-        graph = self._graph.get_inverted_graph()
-
-        while len(self._pending_customer_requests) > 0:
-            pending_request = self._pending_customer_requests[0]
-            available_duckiebots = self.available_duckiebots
-            if len(available_duckiebots) == 0:
-                rospy.loginfo("No duckiebot available for pending transport request")
-                return
-
-            # Get the start node
-            start_node = graph.get_node(pending_request.start_location)
-
-            nodes_to_visit = [start_node]
-            visited_nodes = []
-
-            # Find the closest duckiebot via breadth first search
-            duckiebot = None
-            while len(nodes_to_visit) > 0 and duckiebot is None:
-                current_node = nodes_to_visit.pop(0)
-                visited_nodes.append(current_node)
-
-                # Check if there's a duckiebot on that node
-                for db in available_duckiebots:
-                    if db.next_location == '-1':  # if duckiebot has no mission, it is not moving. use current node
-                        db_location = db.location
-                    else:
-                        db_location = db.next_location # if duckiebot has mission, location is probably outdated, use next expected location
-
-                    if str(db_location) == current_node:
-                        # We found one!
-                        duckiebot = db
-                        break
-
-                # Add all the neighboring nodes to the list of nodes we still have to visit
-                edges = graph.node_edges(current_node)
-                for edge in edges:
-                    if str(edge.target) not in visited_nodes:
-                        nodes_to_visit.append(edge.target)
-
-            if duckiebot is not None:
-                # Assign the request to that duckiebot
-                self._pending_customer_requests.pop(0)
-                duckiebot.assign_customer_request(pending_request)
-                self._publish_duckiebot_mission(duckiebot, TaxiEvent.ACCEPTED_REQUEST)
+        shortest_paths = self._shortest_paths
+
+        invalid_requests = [request for request in self._pending_customer_requests
+                            if shortest_paths.node_id(request.start_location) is None]
+        for request in invalid_requests:
+            rospy.logwarn('Customer start location {} is not in the graph. Request rejected.'.format(request.start_location))
+            self._pending_customer_requests.remove(request)
+        if invalid_requests:
+            self._publish_draw_request()
+
+        if len(self._pending_customer_requests) == 0:
+            return
+
+        available_duckiebots = self.available_duckiebots
+        if len(available_duckiebots) == 0:
+            rospy.loginfo("No duckiebot available for pending transport request")
+            return
+
+        duckiebots = []
+        sources = []
+        for db in available_duckiebots:
+            if db.next_location == '-1':  # if duckiebot has no mission, it is not moving. use current node
+                db_location = db.location
             else:
-                rospy.logwarn("There are available _duckiebots but they were not found in the graph. Aborting assignment procedure.")
-                break
+                db_location = db.next_location # if duckiebot has mission, location is probably outdated, use next expected location
+            i = shortest_paths.node_id(db_location)
+            if i is not None:
+                duckiebots.append(db)
+                sources.append(i)
+
+        requests = []
+        targets = []
+        for request in self._pending_customer_requests[:len(duckiebots)]:
+            requests.append(request)
+            targets.append(shortest_paths.node_id(request.start_location))
+
+        if len(requests) == 1:
+            # just take the closest duckiebot
+            k = shortest_paths.closest_source(sources, targets[0])
+            assignment = [] if k is None else [(k, 0)]
+        else:
+            assignment = shortest_paths.assign(sources, targets)
+
+        if len(assignment) == 0:
+            rospy.logwarn("There are available _duckiebots but they were not found in the graph. Aborting assignment procedure.")
+            return
+
+        for k, r in assignment:
+            # Assign the request to that duckiebot
+            duckiebot = duckiebots[k]
+            self._pending_customer_requests.remove(requests[r])
+            duckiebot.assign_customer_request(requests[r])
+            self._publish_duckiebot_mission(duckiebot, TaxiEvent.ACCEPTED_REQUEST)
 
     def _location_update(self, message):
         """
@@ -86,6 +86,31 @@ class TestTaxiCentral(unittest.TestCase):
         # request shall be pending again
         self.assertTrue(len(taxi_central_node._pending_customer_requests) == 1)
 
+    def test_invalid_request_rejected(self):
+        script_dir = os.path.dirname(__file__)
+        rospy.set_param('/map_dir', os.path.join(os.path.abspath(script_dir), 'maps'))
+        rospy.set_param('/map_name', 'autolab_tiles_map')
+
+        taxi_central_node = TaxiCentralNode()
+        taxi_central_node._fleet_planning_strategy = FleetPlanningStrategy.DEACTIVATED
+
+        # the oldest request starts from a node that is not in the map
+        taxi_central_node._register_customer_request(SourceTargetNodes(9999, 9))
+        taxi_central_node._register_customer_request(SourceTargetNodes(8, 9))
+
+        robot_name = 'jeff'
+        message = LocalizationMessageSerializer.serialize(robot_name, 9, [9, 11, 13, 15])
+        taxi_central_node._location_update(ByteMultiArray(ByteMultiArray, message))
+        self.assertEqual(len(taxi_central_node.available_duckiebots), 1)
+
+        # the invalid request is removed and does not take the only duckiebot
+        taxi_central_node._fleet_planning_strategy = FleetPlanningStrategy.CLOSEST_DUCKIEBOT
+        taxi_central_node._handle_customer_requests()
+        self.assertEqual(taxi_central_node._pending_customer_requests, [])
+        duckiebot = taxi_central_node._registered_duckiebots[robot_name]
+        self.assertEqual(duckiebot.taxi_state, TaxiState.GOING_TO_CUSTOMER)
+        self.assertEqual(duckiebot.pop_customer_request().start_location, 8)
+
     def test_location_update(self):
         rospy.wait_for_service('send_location_information')
         fake_location = rospy.ServiceProxy('send_location_information', VirtualDuckiebotLocation)
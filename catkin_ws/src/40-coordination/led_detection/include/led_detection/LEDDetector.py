@@ -18,11 +18,9 @@ import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 from matplotlib.patches import Rectangle
 
-# fft
-import scipy.fftpack
 import cv2
 
-__all__ = ['LEDDetector']
+__all__ = ['LEDDetector', 'gray_from_bgr_stack', 'candidate_spectra']
 
 def ros_compressed_from_numpygray(np_arr):
     msg = CompressedImage()
@@ -53,25 +51,22 @@ class LEDDetector():
         W = channel.shape[2]
         H = channel.shape[1]
 
-        print('Pre-downsampling shape: {0}'.format(channel[0].shape))
-
         # determine top-left offset to center the grid
         ncells_x = int(floor(1.0*W/cell_width))
         ncells_y = int(floor(1.0*H/cell_height))
         rest_x = W%cell_width
         rest_y = H%cell_height
+        tly = int(ceil(.5*rest_y))
+        tlx = int(ceil(.5*rest_x))
 
+        # Compute values: the grid is reshaped to (N, ncells_y, cell_height, ncells_x, cell_width)
+        # and averaged over the cells, for all the images at once
         N = channel.shape[0]
-        cell_values = np.zeros((N,ncells_y, ncells_x))
-
-        # Compute values
-        for i in range(ncells_y):
-            for j in range(ncells_x):
-                tly = ceil(.5*rest_y)+i*cell_height
-                tlx = ceil(.5*rest_x)+j*cell_width
-                cell_values[:, i, j] = np.mean(channel[:,tly:tly+cell_height, tlx:tlx+cell_width], axis=tuple([1, 2]))
+        grid = channel[:, tly:tly+ncells_y*cell_height, tlx:tlx+ncells_x*cell_width]
+        grid = grid.reshape((N, ncells_y, cell_height, ncells_x, cell_width))
+        cell_values = grid.mean(axis=(2, 4), dtype='float64')
 
-        return (cell_values, [ceil(.5*rest_y), ceil(.5*rest_x)])
+        return (cell_values, [tly, tlx])
 
     # ~~~~~~~~~~~~~~~~~~~ Find local maxima ~~~~~~~~~~~~~~~~~~~~
 
@@ -85,7 +80,7 @@ class LEDDetector():
         local_max = maximum_filter(image, 5)==image
         background = (image==0)
         eroded_background = binary_erosion(background, structure=neighborhood, border_value=1)
-        detected_peaks = local_max - eroded_background
+        detected_peaks = local_max & ~eroded_background
         return detected_peaks
 
     # ~~~~~~~~~~~~~~~~~~~ Select candidates ~~~~~~~~~~~~~~~~~~~~
@@ -134,17 +129,11 @@ class LEDDetector():
         self.republish()
 
         # Crop + Greyscale
-        tlx = floor(1.0*W*crop_rect_norm[0])
-        tly = floor(1.0*H*crop_rect_norm[1])
-        brx = ceil(1.0*W*crop_rect_norm[2])
-        bry = ceil(1.0*H*crop_rect_norm[3])
-        croppedshape = [images['rgb'].shape[0], bry-tly, brx-tlx] 
-        channel = np.zeros(croppedshape)
-        for i in range(n):
-            channel[i,:,:] = cv2.cvtColor(images['rgb'][i,tly:bry,tlx:brx,:], cv2.COLOR_BGR2GRAY)
-
-        print('expected shape {0}'.format(croppedshape))
-        print('channel.shape {0}'.format(channel.shape))
+        tlx = int(floor(1.0*W*crop_rect_norm[0]))
+        tly = int(floor(1.0*H*crop_rect_norm[1]))
+        brx = int(ceil(1.0*W*crop_rect_norm[2]))
+        bry = int(ceil(1.0*H*crop_rect_norm[3]))
+        channel = gray_from_bgr_stack(rgb[:,tly:bry,tlx:brx,:])
 
         cell_width = cell_size[0]
         cell_height = cell_size[1]
@@ -153,7 +142,7 @@ class LEDDetector():
         (cell_vals, crop_offset) = self.downsample(channel, cell_width, cell_height)
         candidates_mask = self.get_candidate_cells(cell_vals, var_threshold)
 
-        candidate_cells = [(i,j) for (i,j) in np.ndindex(candidates_mask.shape) if candidates_mask[i,j]]
+        candidate_cells = zip(*np.nonzero(candidates_mask))
 
         if(self.publisher is not None):
             for idx in candidate_cells:
@@ -166,9 +155,16 @@ class LEDDetector():
         # Detect frequencies and discard non-periodic signals
         f_tolerance = 0.3
 
-        for (i,j) in candidate_cells:
-            signal = cell_vals[:,i,j]
-            signal = signal-np.mean(signal)
+        # Frequency estimation based on FFT, for all the candidates at once
+        T = 1.0/30 # TODO expecting 30 fps, but RESAMPLE to be sure
+        f = np.linspace(0.0, 1.0/(2.0*T), n/2)
+        signals, spectra = candidate_spectra(cell_vals, candidates_mask)
+        peaks = np.argmax(spectra, axis=0) if len(candidate_cells) else []
+
+        for k, (i,j) in enumerate(candidate_cells):
+            signal = signals[:,k]
+            y_f = spectra[:,k]
+            fft_peak_freq = 1.0*peaks[k]/T/n
 
             led_img_coords = Vector2D((0.5+j)*cell_width+crop_offset[1]+tlx, (0.5+i)*cell_height+crop_offset[0]+tly)
             led_img_coords_norm = Vector2D(1.0*led_img_coords.x/W, 1.0*led_img_coords.y/H)
@@ -176,13 +172,6 @@ class LEDDetector():
             if(self.verbose):
                 logger.info('Coords: %s, %s'% (led_img_coords.x,led_img_coords.y))
 
-            # Frequency estimation based on FFT
-            T = 1.0/30 # TODO expecting 30 fps, but RESAMPLE to be sure
-            f = np.linspace(0.0, 1.0/(2.0*T), n/2)
-            signal_f = scipy.fftpack.fft(signal)
-            y_f =  2.0/n * np.abs(signal_f[:n/2])
-            fft_peak_freq = 1.0*np.argmax(y_f)/T/n
-
             unfiltered.detections.append(LEDDetection(rospy.Time.from_sec(timestamps[0]),
                 rospy.Time.from_sec(timestamps[-1]), led_img_coords_norm, fft_peak_freq, '', -1, timestamps, signal, f, y_f)) # -1...confidence not implemented
 
@@ -236,4 +225,27 @@ class LEDDetector():
         return result
 
     def republish(self):
+        if self.publisher is not None:
             self.publisher.publish(self.debug_msg)
+
+
+def gray_from_bgr_stack(bgr):
+    """ Converts a stack of BGR images (N, H, W, 3) to gray (N, H, W) with one cvtColor call. """
+    N, H, W, _ = bgr.shape
+    # the images are stacked vertically in one (N*H, W) image
+    tall = np.ascontiguousarray(bgr).reshape((N*H, W, 3))
+    gray = cv2.cvtColor(tall, cv2.COLOR_BGR2GRAY)
+    return gray.reshape((N, H, W))
+
+
+def candidate_spectra(cell_vals, candidates_mask):
+    """
+        Returns the signals of the candidate cells, minus their mean, and the
+        amplitude of their spectra (2/n |FFT| for the first n/2 frequencies),
+        as two arrays with one column per candidate, in the order of np.nonzero().
+    """
+    n = cell_vals.shape[0]
+    signals = cell_vals[:, candidates_mask]
+    signals = signals - np.mean(signals, axis=0)
+    spectra = 2.0/n * np.abs(np.fft.rfft(signals, axis=0)[:n/2])
+    return signals, spectra
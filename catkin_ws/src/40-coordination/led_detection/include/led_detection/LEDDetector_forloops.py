@@ -65,7 +65,7 @@ class LEDDetector_forloops():
         print(1.0*H/cell_height)
         print(1.0*W/cell_width*1.0*H/cell_height)
         # HACK1 
-        out = np.reshape(out, [ceil(1.0*W/cell_width), ceil(1.0*H/cell_height), out.shape[1]]) # TODO change the code above later
+        out = np.reshape(out, [int(ceil(1.0*W/cell_width)), int(ceil(1.0*H/cell_height)), out.shape[1]]) # TODO change the code above later
         #HACK2
         out = np.swapaxes(out, 0,2)
         print(out.shape)
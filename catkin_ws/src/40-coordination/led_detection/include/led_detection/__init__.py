@@ -8,3 +8,4 @@ logger.setLevel(logging.DEBUG)
 from .api import *
 from .unit_tests import *
 from .algorithms import *
+from .streaming import *
@@ -0,0 +1,237 @@
+from collections import namedtuple
+
+import numpy as np
+
+__all__ = [
+    'BlobGrid',
+    'StreamingLEDDetector',
+    'StreamingBlobResult',
+]
+
+
+StreamingBlobResult = namedtuple(
+    "StreamingBlobResult",
+    "position "  # (x, y) in pixels, where the blob was first seen
+    "frequency "  # the protocol frequency with the most power, or None
+    "power "  # normalized power at that frequency, in [0, 1]
+    "powers "  # normalized power at each protocol frequency
+    "appearance "  # fraction of the frames in the window where the blob was seen
+    "detected "  # True if power >= min_power
+    "signal "  # the blink signal (0/1) in the window, oldest first
+)
+
+
+class BlobGrid(object):
+    """
+        A spatial hash of the known blobs, with square cells of side
+        max_distance, so that the blobs closer than max_distance to a
+        point are in the 3x3 cells around it.
+    """
+
+    def __init__(self, max_distance):
+        self.max_distance = float(max_distance)
+        # cell -> list of (blob_id, position)
+        self._cells = {}
+
+    def _cell(self, p):
+        return (int(np.floor(p[0] / self.max_distance)),
+                int(np.floor(p[1] / self.max_distance)))
+
+    def add(self, blob_id, p):
+        self._cells.setdefault(self._cell(p), []).append((blob_id, p))
+
+    def remove(self, blob_id, p):
+        c = self._cell(p)
+        cell = [_ for _ in self._cells[c] if _[0] != blob_id]
+        if cell:
+            self._cells[c] = cell
+        else:
+            del self._cells[c]
+
+    def nearest(self, p):
+        """ Returns the id of the closest blob within max_distance, or None. """
+        ci, cj = self._cell(p)
+        best, best_d2 = None, self.max_distance ** 2
+        for i in (ci - 1, ci, ci + 1):
+            for j in (cj - 1, cj, cj + 1):
+                for blob_id, q in self._cells.get((i, j), ()):
+                    d2 = (q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2
+                    if d2 < best_d2:
+                        best, best_d2 = blob_id, d2
+        return best
+
+
+class _Blob(object):
+    __slots__ = ['position', 'values', 'num', 'S']
+
+    def __init__(self, position, capacity, num_frequencies):
+        self.position = position
+        # 0/1 for each slot of the ring buffer
+        self.values = np.zeros(capacity, 'uint8')
+        # number of frames in the window where the blob was seen
+        self.num = 0
+        # sum over the window of x_t exp(-j w t), for each frequency
+        self.S = np.zeros(num_frequencies, 'complex128')
+
+
+class StreamingLEDDetector(object):
+    """
+        Detects blinking LEDs one frame at a time.
+
+        update() is called with the timestamp of each frame and the
+        positions of the blobs detected in it. Each position is associated
+        to the closest known blob (within max_distance, looked up in a
+        BlobGrid) or starts a new blob. Each blob has a ring buffer
+        with its 0/1 signal over the last "window" seconds (at most
+        "capacity" frames); the blobs not seen in the window are forgotten.
+
+        Instead of an FFT of the whole capture, the DFT of each signal is
+        kept only at the given frequencies, updated when a frame enters or
+        leaves the window (sliding Goertzel):
+
+            S(f) = sum_t x_t exp(-j 2 pi f t)
+
+        using the actual timestamps, so dropped frames do not matter. The
+        DFT of the signal minus its mean is S(f) - m E(f), where E(f) is the
+        same sum with x_t = 1. The normalized power
+
+            P(f) = 2 |S(f) - m E(f)|^2 / (n sum_t (x_t - m)^2)
+
+        is about 1 for a sinusoid at frequency f and about 0.8 for a square
+        wave, and a blob is detected if its best frequency has
+        P(f) >= min_power.
+    """
+
+    def __init__(self, frequencies, window, max_distance, capacity=128,
+                 min_power=0.5, min_samples=6):
+        self.frequencies = np.array(frequencies, dtype='float64')
+        self.window = float(window)
+        self.capacity = int(capacity)
+        self.min_power = float(min_power)
+        self.min_samples = int(min_samples)
+        self.max_distance = float(max_distance)
+        self._omega = 2 * np.pi * self.frequencies
+        self.reset()
+
+    def reset(self):
+        """ Forgets all the frames and blobs. """
+        self.grid = BlobGrid(self.max_distance)
+        self.blobs = {}
+        self._next_id = 0
+        # the timestamps are relative to t0, to keep the phases small
+        self._t0 = None
+        self._timestamps = np.zeros(self.capacity)
+        # exp(-j w t) for each slot and frequency
+        self._W = np.zeros((self.capacity, len(self.frequencies)), 'complex128')
+        self._E = np.zeros(len(self.frequencies), 'complex128')
+        # the window is the slots first, first + 1, ..., first + n - 1 (mod capacity)
+        self._first = 0
+        self.num_frames = 0
+        # frames added since the sums were last recomputed
+        self._since_refresh = 0
+
+    def update(self, timestamp, points):
+        """
+            Adds a frame, with the (x, y) positions of the blobs detected in it.
+        """
+        if self._t0 is None:
+            self._t0 = timestamp
+        t = timestamp - self._t0
+        while self.num_frames > 0 and (self.num_frames == self.capacity or
+                                       self._timestamps[self._first] <= t - self.window):
+            self._pop_oldest()
+
+        slot = (self._first + self.num_frames) % self.capacity
+        w = np.exp(-1j * self._omega * t)
+        self._timestamps[slot] = t
+        self._W[slot] = w
+        self._E += w
+        self.num_frames += 1
+
+        for p in points:
+            blob_id = self.grid.nearest(p)
+            if blob_id is None:
+                blob_id = self._next_id
+                self._next_id += 1
+                p = (float(p[0]), float(p[1]))
+                self.blobs[blob_id] = _Blob(p, self.capacity, len(self.frequencies))
+                self.grid.add(blob_id, p)
+            blob = self.blobs[blob_id]
+            if not blob.values[slot]:
+                blob.values[slot] = 1
+                blob.num += 1
+                blob.S += w
+
+        self._since_refresh += 1
+        if self._since_refresh >= self.capacity:
+            self._refresh()
+
+    def _pop_oldest(self):
+        slot = self._first
+        w = self._W[slot]
+        self._E -= w
+        for blob_id, blob in list(self.blobs.items()):
+            if blob.values[slot]:
+                blob.values[slot] = 0
+                blob.num -= 1
+                blob.S -= w
+                if blob.num == 0:
+                    self.grid.remove(blob_id, blob.position)
+                    del self.blobs[blob_id]
+        self._first = (self._first + 1) % self.capacity
+        self.num_frames -= 1
+
+    def _slots(self):
+        return (self._first + np.arange(self.num_frames)) % self.capacity
+
+    def _refresh(self):
+        """ Recomputes the sums from the ring buffers, so that rounding errors do not add up. """
+        slots = self._slots()
+        W = self._W[slots]
+        self._E = W.sum(axis=0)
+        for blob in self.blobs.values():
+            blob.S = np.dot(blob.values[slots].astype('float64'), W)
+        self._since_refresh = 0
+
+    def get_timestamps(self):
+        """ Returns the timestamps of the frames in the window, oldest first. """
+        return self._timestamps[self._slots()] + (self._t0 or 0.0)
+
+    def get_duration(self):
+        """ Returns the time between the first and the last frame in the window. """
+        if self.num_frames == 0:
+            return 0.0
+        last = (self._first + self.num_frames - 1) % self.capacity
+        return self._timestamps[last] - self._timestamps[self._first]
+
+    def is_ready(self):
+        """ True if there are enough frames for a decision. """
+        return self.num_frames >= self.min_samples
+
+    def get_results(self):
+        """ Returns a list of StreamingBlobResult, one for each known blob. """
+        n = float(self.num_frames)
+        slots = self._slots()
+        results = []
+        for blob_id in sorted(self.blobs):
+            blob = self.blobs[blob_id]
+            m = blob.num / n
+            energy = blob.num * (1 - m)
+            if energy > 0:
+                X = blob.S - m * self._E
+                powers = 2 * (X.real ** 2 + X.imag ** 2) / (n * energy)
+                best = int(np.argmax(powers))
+                frequency, power = float(self.frequencies[best]), float(powers[best])
+            else:
+                # always on: no blinking
+                powers = np.zeros(len(self.frequencies))
+                frequency, power = None, 0.0
+            detected = self.is_ready() and power >= self.min_power
+            results.append(StreamingBlobResult(position=blob.position,
+                                               frequency=frequency,
+                                               power=power,
+                                               powers=powers,
+                                               appearance=m,
+                                               detected=detected,
+                                               signal=blob.values[slots].copy()))
+        return results
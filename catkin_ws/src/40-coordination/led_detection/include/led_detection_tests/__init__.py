@@ -0,0 +1,2 @@
+from . import streaming
+from . import downsample
@@ -0,0 +1,80 @@
+import duckietown_utils as dtu
+from led_detection.LEDDetector import LEDDetector, candidate_spectra, gray_from_bgr_stack
+import numpy as np
+import scipy.fftpack
+import cv2
+
+
+def downsample_loops(channel, cell_width, cell_height):
+    """ The cell averages computed one cell at a time. """
+    N, H, W = channel.shape
+    ncells_x, ncells_y = W // cell_width, H // cell_height
+    oy, ox = int(np.ceil(.5*(H % cell_height))), int(np.ceil(.5*(W % cell_width)))
+    cell_values = np.zeros((N, ncells_y, ncells_x))
+    for i in range(ncells_y):
+        for j in range(ncells_x):
+            tly = oy + i*cell_height
+            tlx = ox + j*cell_width
+            cell = channel[:, tly:tly+cell_height, tlx:tlx+cell_width]
+            cell_values[:, i, j] = np.mean(cell, axis=(1, 2))
+    return cell_values, [oy, ox]
+
+
+@dtu.unit_test
+def downsample_matches_loops():
+    random = np.random.RandomState(0)
+    channel = random.randint(0, 256, (7, 97, 130)).astype('uint8')
+    for cell_width, cell_height in [(20, 20), (13, 7), (130, 97)]:
+        expected, offset_expected = downsample_loops(channel, cell_width, cell_height)
+        values, offset = LEDDetector().downsample(channel, cell_width, cell_height)
+        assert offset == offset_expected, (offset, offset_expected)
+        assert values.shape == expected.shape
+        assert np.allclose(values, expected)
+
+
+@dtu.unit_test
+def gray_stack_matches_cvtcolor():
+    random = np.random.RandomState(1)
+    bgr = random.randint(0, 256, (5, 40, 60, 3)).astype('uint8')
+    # also a non-contiguous crop
+    bgr = bgr[:, 3:33, 5:50, :]
+    gray = gray_from_bgr_stack(bgr)
+    for i in range(bgr.shape[0]):
+        assert np.array_equal(gray[i], cv2.cvtColor(bgr[i], cv2.COLOR_BGR2GRAY))
+
+
+@dtu.unit_test
+def candidate_spectra_matches_fft():
+    random = np.random.RandomState(2)
+    n = 31
+    cell_vals = random.uniform(0, 255, (n, 6, 8))
+    mask = random.uniform(size=(6, 8)) > 0.5
+    signals, spectra = candidate_spectra(cell_vals, mask)
+    for k, (i, j) in enumerate(zip(*np.nonzero(mask))):
+        signal = cell_vals[:, i, j] - np.mean(cell_vals[:, i, j])
+        y_f = 2.0/n * np.abs(scipy.fftpack.fft(signal)[:n/2])
+        assert np.allclose(signals[:, k], signal)
+        assert np.allclose(spectra[:, k], y_f)
+
+
+@dtu.unit_test
+def detect_blinking_led():
+    n, H, W = 30, 120, 160
+    frequency = 5.0
+    images = np.zeros((n,), dtype=[('timestamp', 'float64'), ('rgb', 'uint8', (H, W, 3))])
+    for k in range(n):
+        t = k / 30.0
+        images['timestamp'][k] = t
+        images['rgb'][k] = 30
+        if np.sin(2 * np.pi * frequency * t) > 0:
+            images['rgb'][k, 40:60, 100:120, :] = 255
+
+    result = LEDDetector().detect_led(images, [frequency], [20, 20])
+    assert len(result.detections) == 1, result.detections
+    d = result.detections[0]
+    assert d.frequency == frequency
+    assert np.allclose([d.pixels_normalized.x, d.pixels_normalized.y], [110. / W, 50. / H])
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,78 @@
+import duckietown_utils as dtu
+from led_detection.streaming import StreamingLEDDetector, BlobGrid
+import numpy as np
+
+PROTOCOL_FREQUENCIES = [1.9, 4, 5.7, 7.8, 10.6]
+
+
+def blink(frequency, t, phase=0.0):
+    """ True if an LED blinking at frequency (square wave) is on at time t. """
+    return np.sin(2 * np.pi * frequency * t + phase) > 0
+
+
+def run(frequencies_at, fps=30.0, duration=3.0, window=1.0, drop=0.0, seed=0):
+    """ frequencies_at: dict position -> frequency (None = always on) """
+    random = np.random.RandomState(seed)
+    d = StreamingLEDDetector(PROTOCOL_FREQUENCIES, window=window, max_distance=15)
+    for k in range(int(duration * fps)):
+        t = 1500000000.0 + k / fps
+        if random.uniform() < drop:
+            continue
+        points = []
+        for (x, y), f in frequencies_at.items():
+            if f is None or blink(f, t, phase=x):
+                # a bit of jitter in the detected position
+                points.append((x + random.uniform(-2, 2), y + random.uniform(-2, 2)))
+        d.update(t, points)
+    return d
+
+
+@dtu.unit_test
+def blob_grid_nearest():
+    g = BlobGrid(10)
+    g.add(0, (5, 5))
+    g.add(1, (24, 5))
+    assert g.nearest((13, 5)) == 0
+    assert g.nearest((16, 5)) == 1
+    assert g.nearest((100, 100)) is None
+    g.remove(0, (5, 5))
+    assert g.nearest((6, 6)) is None
+
+
+@dtu.unit_test
+def streaming_detects_protocol_frequencies():
+    for f in PROTOCOL_FREQUENCIES:
+        d = run({(100, 50): f, (300, 80): None}, drop=0.2)
+        results = d.get_results()
+        assert len(results) == 2, results
+        led, steady = sorted(results, key=lambda r: r.position[0])
+        assert led.detected and led.frequency == f, (f, led)
+        assert not steady.detected, steady
+
+
+@dtu.unit_test
+def streaming_memory_is_bounded():
+    d = run({(100, 50): 4}, duration=10.0, window=0.5)
+    assert d.num_frames <= 16, d.num_frames
+    assert d.get_duration() < 0.5
+
+    # the blob is forgotten once it is not seen for a window
+    for k in range(20):
+        d.update(1500000010.0 + k / 30.0, [])
+    assert not d.blobs
+    assert not d.grid._cells
+
+
+@dtu.unit_test
+def streaming_sums_match_recomputation():
+    d = run({(100, 50): 5.7, (200, 50): 1.9}, duration=4.0)
+    S = dict((i, b.S.copy()) for i, b in d.blobs.items())
+    E = d._E.copy()
+    d._refresh()
+    assert np.allclose(E, d._E)
+    for i, b in d.blobs.items():
+        assert np.allclose(S[i], b.S)
+
+
+if __name__ == '__main__':
+    dtu.run_tests_for_this_module()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import sys
+import time
+
+import cv2
+
+from led_detection.LEDDetector import LEDDetector, candidate_spectra, gray_from_bgr_stack
+from led_detection.LEDDetector_forloops import LEDDetector_forloops
+import numpy as np
+import scipy.fftpack
+
+print('Compares the downsampling of LEDDetector with the LEDDetector_forloops baseline.')
+
+# usage: benchmark_downsample.py [nimages [height width]]
+args = sys.argv[1:]
+n = int(args[0]) if args else 15
+H, W = (int(args[1]), int(args[2])) if len(args) >= 3 else (480, 640)
+cell_width, cell_height = 20, 20
+
+random = np.random.RandomState(0)
+bgr = random.randint(0, 256, (n, H, W, 3)).astype('uint8')
+
+
+def timeit(name, f, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        res = f()
+        dt = time.time() - t0
+        best = dt if best is None else min(best, dt)
+    print('%-40s %10.2f ms' % (name, best * 1000))
+    return best, res
+
+# greyscale conversion
+def gray_loop():
+    channel = np.zeros((n, H, W))
+    for i in range(n):
+        channel[i, :, :] = cv2.cvtColor(bgr[i], cv2.COLOR_BGR2GRAY)
+    return channel
+
+t_gray_loop, _ = timeit('greyscale, one image at a time', gray_loop)
+t_gray, channel = timeit('greyscale, gray_from_bgr_stack', lambda: gray_from_bgr_stack(bgr))
+
+# downsampling (the baseline only looks at the first 15 images)
+forloops = LEDDetector_forloops()
+t_forloops, _ = timeit('downsample, LEDDetector_forloops', lambda: forloops.downsample(channel[:15], cell_width, cell_height), repeat=1)
+detector = LEDDetector()
+t_downsample, (cell_vals, _) = timeit('downsample, LEDDetector', lambda: detector.downsample(channel[:15], cell_width, cell_height))
+
+# spectra of the candidate cells
+cell_vals = detector.downsample(channel, cell_width, cell_height)[0]
+mask = np.ones(cell_vals.shape[1:], dtype='bool')
+
+def spectra_loop():
+    res = []
+    for (i, j) in np.ndindex(mask.shape):
+        signal = cell_vals[:, i, j]
+        signal = signal - np.mean(signal)
+        res.append(2.0 / n * np.abs(scipy.fftpack.fft(signal)[:n / 2]))
+    return res
+
+t_spectra_loop, _ = timeit('spectra of %d cells, one at a time' % mask.sum(), spectra_loop)
+t_spectra, _ = timeit('spectra of %d cells, candidate_spectra' % mask.sum(), lambda: candidate_spectra(cell_vals, mask))
+
+print('speedup greyscale:  %8.1fx' % (t_gray_loop / t_gray))
+print('speedup downsample: %8.1fx' % (t_forloops / t_downsample))
+print('speedup spectra:    %8.1fx' % (t_spectra_loop / t_spectra))
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import rospy
 import time
-from led_detection.LEDDetector import LEDDetector
+from led_detection.streaming import StreamingLEDDetector
 from std_msgs.msg import Byte
 from duckietown_msgs.msg import Vector2D, LEDDetection, LEDDetectionArray, LEDDetectionDebugInfo, BoolStamped, SignalsDetection
 from sensor_msgs.msg import CompressedImage, Image
@@ -9,18 +9,15 @@ from std_msgs.msg import String
 from duckietown_utils.bag_logs import numpy_from_ros_compressed
 import numpy as np
 import cv2
-import scipy.fftpack
 from cv_bridge import CvBridge, CvBridgeError
 
 class LEDDetectorNode(object):
     def __init__(self):
         self.active = True # [INTERACTIVE MODE] Won't be overwritten if FSM isn't running, node always active
-        self.first_timestamp = 0
-        self.capture_finished = True
+        self.trigger_time = None
         self.tinit = None
         self.trigger = True
         self.node_state = 0
-        self.data = []
 
         # Needed to publish images
         self.bridge = CvBridge()
@@ -28,7 +25,7 @@ class LEDDetectorNode(object):
         # Node name
         self.node_name = rospy.get_name()
 
-        # Capture time
+        # Capture time: the decisions use the frames of the last capture_time seconds
         self.capture_time = 0.5
 
         # Parameters
@@ -89,7 +86,6 @@ class LEDDetectorNode(object):
         self.veh_name           = rospy.get_namespace().strip("/")
 
         # Subscribed
-        self.sub_cam    = rospy.Subscriber("camera_node/image/compressed", CompressedImage, self.camera_callback)
         self.sub_trig   = rospy.Subscriber("~trigger",Byte, self.trigger_callback)
         self.sub_switch = rospy.Subscriber("~switch",BoolStamped,self.cbSwitch)
 
@@ -112,6 +108,16 @@ class LEDDetectorNode(object):
         #print self.freqIdentify
         #print '---------------------------------------------------------------'
 
+        # Streaming detectors: each frame is processed when it arrives, and the
+        # power at the frequencies to identify is kept over a sliding window
+        self.min_power  = rospy.get_param('~min_power', 0.5)
+        self.detector_right = self.create_streaming_detector()
+        self.detector_front = self.create_streaming_detector()
+        self.detector_TL    = self.create_streaming_detector()
+        # set by cbSwitch, the detectors are reset in camera_callback
+        # (the thread that updates them)
+        self.reset_detectors = False
+
         #rospy.loginfo('[%s] Config: \n\t crop_rect_normalized: %s, \n\t capture_time: %s, \n\t cell_size: %s'%(self.node_name, self.crop_rect_normalized, self.capture_time, self.cell_size))
 
         # Check vehicle name
@@ -128,64 +134,67 @@ class LEDDetectorNode(object):
         rospy.loginfo('[%s] Vehicle: %s'%(self.node_name, self.veh_name))
         rospy.loginfo('[%s] Waiting for camera image...' %self.node_name)
 
+        # Only the latest image is queued: a frame that arrives while the
+        # previous one is processed replaces the waiting one
+        self.sub_cam = rospy.Subscriber("camera_node/image/compressed", CompressedImage, self.camera_callback,
+                                        queue_size=1, buff_size=2**24)
+
+    def create_streaming_detector(self):
+        return StreamingLEDDetector(self.freqIdentify, window=self.capture_time,
+                                    max_distance=self.DTOL, min_power=self.min_power)
+
     def cbSwitch(self, switch_msg): # active/inactive switch from FSM
         self.active = switch_msg.data
         if self.active:
             self.trigger = True
+            # the frames seen before becoming inactive are stale
+            self.reset_detectors = True
 
     def camera_callback(self, msg):
         if not self.active:
             return
 
+        if self.reset_detectors:
+            self.reset_detectors = False
+            self.detector_right.reset()
+            self.detector_front.reset()
+            self.detector_TL.reset()
+
         float_time = msg.header.stamp.to_sec()
         debug_msg  = LEDDetectionDebugInfo()
 
         if self.trigger:
             #rospy.loginfo('[%s] GOT TRIGGER! Starting...')
-            self.trigger          = False
-            self.data             = []
-            self.capture_finished = False
-            # Start capturing images
-            #rospy.loginfo('[%s] Start capturing frames'%self.node_name)
-            self.first_timestamp = msg.header.stamp.to_sec()
-            self.tinit           = time.time()
-
-        elif self.capture_finished:
+            self.trigger      = False
+            self.trigger_time = float_time
+            self.tinit        = time.time()
+
+        # Process the frame
+        rgb = numpy_from_ros_compressed(msg)
+        rgb = cv2.cvtColor(rgb,cv2.COLOR_BGRA2GRAY)
+        rgb = cv2.resize(rgb, (640 * 1, 480 * 1))
+        rgb = 255 - rgb
+        imRight, imFront, imTL = self.process_frame(float_time, rgb)
+
+        if self.trigger_time is None:
             self.node_state = 0
             #rospy.loginfo('[%s] Waiting for trigger...' %self.node_name)
-
-        if self.first_timestamp > 0:
+        else:
             # TODO sanity check rel_time positive, restart otherwise
-            rel_time = float_time - self.first_timestamp
+            rel_time = float_time - self.trigger_time
 
-            # Capturing
             if rel_time < self.capture_time:
+                # Capturing: the window does not cover the time since the trigger yet
                 self.node_state = 1
-                # Capture image
-                rgb = numpy_from_ros_compressed(msg)
-                rgb = cv2.cvtColor(rgb,cv2.COLOR_BGRA2GRAY)
-                rgb = cv2.resize(rgb, (640 * 1, 480 * 1))
-                rgb = 255 - rgb
-                #rospy.loginfo('[%s] Capturing frame %s' %(self.node_name, rel_time))
-                # Save image to data
-                #if np.size(self.data) == 0:
-                #    self.data = rgb
-                #else:
-                #    self.data = np.dstack((self.data,rgb))
-                self.data.append({'timestamp': float_time, 'rgb': rgb[:,:]})
                 debug_msg.capture_progress = 100.0*rel_time/self.capture_time
-
-            # Start processing
-            elif not self.capture_finished and self.first_timestamp > 0:
-                #rospy.loginfo('[%s] Relative Time %s, processing' %(self.node_name, rel_time))
+            else:
                 self.node_state = 2
-                self.capture_finished = True
-                self.first_timestamp = 0
-                self.sub_cam.unregister() # IMPORTANT! Explicitly ignore messages
-                                          # while processing, accumulates delay otherwise!
-                self.send_state(debug_msg)
-                # Process image and publish results
-                self.process_and_publish()
+                self.trigger_time = None
+                # Decide and publish results
+                self.decide_and_publish(imRight, imFront, imTL)
+                # Keep going
+                if self.continuous:
+                    self.trigger = True
 
         self.send_state(debug_msg) # TODO move heartbeat to dedicated thread
 
@@ -195,149 +204,61 @@ class LEDDetectorNode(object):
 
     def crop_image(self,images,cropNorm):
         # Get size
-        H,W,_ = images.shape
+        H,W = images.shape[:2]
         # Compute indices
         hStart = int(np.floor(H*cropNorm[0][0]))
         hEnd   = int(np.ceil(H*cropNorm[0][1]))
         wStart = int(np.floor(W*cropNorm[1][0]))
         wEnd   = int(np.ceil(W*cropNorm[1][1]))
         # Crop image
-        imageCropped = images[hStart:hEnd,wStart:wEnd,:]
+        imageCropped = images[hStart:hEnd,wStart:wEnd]
         # Return cropped image
         return imageCropped
 
-    def process_and_publish(self):
+    def process_frame(self, timestamp, image):
+        """ Detects the blobs in the three crops and updates the streaming detectors. """
+        imRight = self.crop_image(image,self.cropNormalizedRight)
+        imFront = self.crop_image(image,self.cropNormalizedFront)
+        imTL    = self.crop_image(image,self.cropNormalizedTL)
+
+        for detector, blob_detector, im in [(self.detector_right, self.detector_car, imRight),
+                                            (self.detector_front, self.detector_car, imFront),
+                                            (self.detector_TL, self.detector_tl, imTL)]:
+            keypoints = blob_detector.detect(im)
+            detector.update(timestamp, [k.pt for k in keypoints])
+
+        return imRight, imFront, imTL
+
+    def car_signal(self, freq_identified):
+        if freq_identified == self.freqIdentify[3]:
+            return SignalsDetection.SIGNAL_PRIORITY
+        elif freq_identified == self.freqIdentify[4]:
+            return SignalsDetection.SIGNAL_SACRIFICE_FOR_PRIORITY
+            #elif freq_identified == self.freqIdentify[1]:
+            #    return SignalsDetection.SIGNAL_B
+            #elif freq_identified == self.freqIdentify[2]:
+            #    return SignalsDetection.SIGNAL_C
+        else:
+            return SignalsDetection.SIGNAL_A
+
+    def decide_and_publish(self, imRight, imFront, imTL):
         # Initial time
         tic = time.time()
 
-        # Get dimensions
-        H,W = self.data[0]['rgb'].shape
-        NIm = len(self.data)
-
-        # Save in proper vectors
-        images     = np.zeros((H,W,NIm),dtype=np.uint8)
-        timestamps = np.zeros((NIm))
-        for i, v in enumerate(self.data):
-            timestamps[i] = v['timestamp']
-            images[:,:,i] = v['rgb']
-
-        # Crop images
-        imRight = self.crop_image(images,self.cropNormalizedRight)
-        imFront = self.crop_image(images,self.cropNormalizedFront)
-        imTL    = self.crop_image(images,self.cropNormalizedTL)
-
-        # Allocate space
-        FrameRight = []
-        BlobsRight = []
-        FrameFront = []
-        BlobsFront = []
-        FrameTL    = []
-        BlobsTL    = []
-
-        # Print on screen
-        #rospy.loginfo('[%s] Analyzing %s images of size %s X %s' %(self.node_name,NIm,W,H))
-
-        # Iterate
-        for t in range(NIm):
-            # Iterate Right
-            # Detect blobs.
-            keypoints = self.detector_car.detect(imRight[:, :, t])
-            FrameRight.append(np.zeros((2, len(keypoints))))
-
-            for n in range(len(keypoints)):
-                FrameRight[t][:, n] = keypoints[n].pt
-                if len(BlobsRight) == 0:
-                    # If no blobs saved, then save the first LED detected
-                    BlobsRight.append({'p': FrameRight[t][:, n], 'N': 1, 'Signal': np.zeros(imRight.shape[2])})
-                    BlobsRight[-1]['Signal'][t] = 1
-                else:
-                    # Thereafter, check whether the detected LED belongs to a blob
-                    Distance = np.empty(len(BlobsRight))
-                    for k in range(len(BlobsRight)):
-                        Distance[k] = np.linalg.norm(BlobsRight[k]['p'] - FrameRight[t][:, n])
-                    if np.min(Distance) < self.DTOL:
-                        if BlobsRight[np.argmin(Distance)]['Signal'][t] == 0:
-                            BlobsRight[np.argmin(Distance)]['N'] += 1
-                            BlobsRight[np.argmin(Distance)]['Signal'][t] = 1
-                    else:
-                        BlobsRight.append({'p': FrameRight[t][:, n], 'N': 1, 'Signal': np.zeros(imRight.shape[2])})
-                        BlobsRight[-1]['Signal'][t] = 1
-
-            # Iterate Front
-            # Detect blobs.
-            keypoints = self.detector_car.detect(imFront[:, :, t])
-            FrameFront.append(np.zeros((2, len(keypoints))))
-
-            for n in range(len(keypoints)):
-                FrameFront[t][:, n] = keypoints[n].pt
-                if len(BlobsFront) == 0:
-                    # If no blobs saved, then save the first LED detected
-                    BlobsFront.append({'p': FrameFront[t][:, n], 'N': 1, 'Signal': np.zeros(imFront.shape[2])})
-                    BlobsFront[-1]['Signal'][t] = 1
-                else:
-                    # Thereafter, check whether the detected LED belongs to a blob
-                    Distance = np.empty(len(BlobsFront))
-                    for k in range(len(BlobsFront)):
-                        Distance[k] = np.linalg.norm(BlobsFront[k]['p'] - FrameFront[t][:, n])
-                    if np.min(Distance) < self.DTOL:
-                        if BlobsFront[np.argmin(Distance)]['Signal'][t] == 0:
-                            BlobsFront[np.argmin(Distance)]['N'] += 1
-                            BlobsFront[np.argmin(Distance)]['Signal'][t] = 1
-                    else:
-                        BlobsFront.append({'p': FrameFront[t][:, n], 'N': 1, 'Signal': np.zeros(imFront.shape[2])})
-                        BlobsFront[-1]['Signal'][t] = 1
-
-            # Iterate TL
-            # Detect blobs.
-            keypoints = self.detector_tl.detect(imTL[:, :, t])
-            FrameTL.append(np.zeros((2, len(keypoints))))
-
-            for n in range(len(keypoints)):
-                FrameTL[t][:, n] = keypoints[n].pt
-                if len(BlobsTL) == 0:
-                    # If no blobs saved, then save the first LED detected
-                    BlobsTL.append(
-                        {'p': FrameTL[t][:, n], 'N': 1, 'Signal': np.zeros(imTL.shape[2])})
-                    BlobsTL[-1]['Signal'][t] = 1
-                else:
-                    # Thereafter, check whether the detected LED belongs to a blob
-                    Distance = np.empty(len(BlobsTL))
-                    for k in range(len(BlobsTL)):
-                        Distance[k] = np.linalg.norm(BlobsTL[k]['p'] - FrameTL[t][:, n])
-                    if np.min(Distance) < self.DTOL:
-                        if BlobsTL[np.argmin(Distance)]['Signal'][t] == 0:
-                            BlobsTL[np.argmin(Distance)]['N'] += 1
-                            BlobsTL[np.argmin(Distance)]['Signal'][t] = 1
-                    else:
-                        BlobsTL.append(
-                            {'p': FrameTL[t][:, n], 'N': 1, 'Signal': np.zeros(imTL.shape[2])})
-                        BlobsTL[-1]['Signal'][t] = 1
-
-        # Extract blobs (right)
-        keypointBlobRight = []
-        radiusRight       = self.DTOL/2.0
-        for k in range(len(BlobsRight)):
-            assert np.sum(BlobsRight[k]['Signal']) == BlobsRight[k]['N']
-            keypointBlobRight.append(cv2.KeyPoint(BlobsRight[k]['p'][0], BlobsRight[k]['p'][1], radiusRight))
-
-        # Extract blobs (front)
-        keypointBlobFront = []
-        radiusFront       = self.DTOL/2.0
-        for k in range(len(BlobsFront)):
-            assert np.sum(BlobsFront[k]['Signal']) == BlobsFront[k]['N']
-            keypointBlobFront.append(cv2.KeyPoint(BlobsFront[k]['p'][0], BlobsFront[k]['p'][1], radiusFront))
-
-        # Extract blobs (TL)
-        keypointBlobTL = []
-        radiusTL       = self.DTOL/2.0
-        for k in range(len(BlobsTL)):
-            assert np.sum(BlobsTL[k]['Signal']) == BlobsTL[k]['N']
-            keypointBlobTL.append(cv2.KeyPoint(BlobsTL[k]['p'][0], BlobsTL[k]['p'][1], radiusTL))
-
-        # Images
-        imPublishRight = cv2.drawKeypoints(imRight[:,:,-1], keypointBlobRight, np.array([]), (0,0,255), cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS)
-        imPublishFront = cv2.drawKeypoints(imFront[:,:,-1], keypointBlobFront, np.array([]), (0,0,255), cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS)
-        imPublishTL    = cv2.drawKeypoints(imTL[:,:,-1], keypointBlobTL, np.array([]),(0,0,255), cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS)
+        H,W = 480, 640
+
+        resultsRight = self.detector_right.get_results()
+        resultsFront = self.detector_front.get_results()
+        resultsTL    = self.detector_TL.get_results()
+
+        # Images (with the blobs in the window)
+        radius = self.DTOL/2.0
+        def draw(im, results):
+            keypoints = [cv2.KeyPoint(r.position[0], r.position[1], radius) for r in results]
+            return cv2.drawKeypoints(im, keypoints, np.array([]), (0,0,255), cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS)
+        imPublishRight = draw(imRight, resultsRight)
+        imPublishFront = draw(imFront, resultsFront)
+        imPublishTL    = draw(imTL, resultsTL)
 
         # Initialize detection
         self.right = SignalsDetection.NO_CAR
@@ -347,73 +268,21 @@ class LEDDetectorNode(object):
         # Result
         result = LEDDetectionArray()
 
-        # Sampling time
-        T = (1.0*self.capture_time)/(1.0*NIm)
-
         # Decide whether LED or not (right)
-        for i in range(len(BlobsRight)):
-            #rospy.loginfo('[%s] Detection on the right' % (self.node_name))
-            # Detection
-            detected,result,freq_identified, fft_peak_freq = self.detect_blob(BlobsRight[i],T,NIm,H,W,self.cropNormalizedRight,timestamps,result)
-
-            # Take decision
-            if detected:
-
-                #print '-------------------'
-                #print("NIm = %d " % NIm)
-                #print("T = %f " % T)
-                #print("fft_peak_freq = %f " % fft_peak_freq)
-                #print("freq_identified = %f " % freq_identified)
-                #print '-------------------'
-
-
-                if freq_identified == self.freqIdentify[3]:
-                    self.right = SignalsDetection.SIGNAL_PRIORITY
-                elif freq_identified == self.freqIdentify[4]:
-                    self.right = SignalsDetection.SIGNAL_SACRIFICE_FOR_PRIORITY
-                    #elif freq_identified == self.freqIdentify[1]:
-                    #    self.right = SignalsDetection.SIGNAL_B
-                    #elif freq_identified == self.freqIdentify[2]:
-                    #    self.right = SignalsDetection.SIGNAL_C
-                else:
-                    self.right = SignalsDetection.SIGNAL_A
+        for r in resultsRight:
+            if self.add_detection(self.detector_right, r, H, W, self.cropNormalizedRight, result):
+                self.right = self.car_signal(r.frequency)
                 break
 
         # Decide whether LED or not (front)
-        for i in range(len(BlobsFront)):
-            #rospy.loginfo('[%s] Detection on the front' % (self.node_name))
-            # Detection
-            detected, result,freq_identified, fft_peak_freq  = self.detect_blob(BlobsFront[i],T,NIm,H,W,self.cropNormalizedFront,timestamps,result)
-
-            # Take decision
-            if detected:
-
-                #print '-------------------'
-                #print("NIm = %d " % NIm)
-                #print("T = %f " % T)
-                #print("fft_peak_freq = %f " % fft_peak_freq)
-                #print("freq_identified = %f " % freq_identified)
-                #print '-------------------'
-
-                if freq_identified == self.freqIdentify[3]:
-                    self.front = SignalsDetection.SIGNAL_PRIORITY
-                elif freq_identified == self.freqIdentify[4]:
-                    self.front = SignalsDetection.SIGNAL_SACRIFICE_FOR_PRIORITY
-                    #elif freq_identified == self.freqIdentify[1]:
-                    #    self.front = SignalsDetection.SIGNAL_B
-                    #elif freq_identified == self.freqIdentify[2]:
-                    #    self.front = SignalsDetection.SIGNAL_C
-                else:
-                    self.front = SignalsDetection.SIGNAL_A
+        for r in resultsFront:
+            if self.add_detection(self.detector_front, r, H, W, self.cropNormalizedFront, result):
+                self.front = self.car_signal(r.frequency)
                 break
 
         # Decide whether LED or not (traffic light)
-        for i in range(len(BlobsTL)):
-            #rospy.loginfo('[%s] Detection of the traffic light' % (self.node_name))
-            # Detection
-            detected, result,freq_identified, fft_peak_freq  = self.detect_blob(BlobsTL[i],T,NIm,H,W,self.cropNormalizedTL,timestamps,result)
-            # Take decision
-            if detected:
+        for r in resultsTL:
+            if self.add_detection(self.detector_TL, r, H, W, self.cropNormalizedTL, result):
                 self.traffic_light = SignalsDetection.GO
                 break
             else:
@@ -432,36 +301,21 @@ class LEDDetectorNode(object):
         # Print performance
         #rospy.loginfo('[%s] Detection completed. Processing time: %.2f s. Total time:  %.2f s' %(self.node_name,processing_time,total_time))
 
-        # Keep going
-        if self.continuous:
-            self.trigger = True
-            self.sub_cam = rospy.Subscriber("camera_node/image/compressed",CompressedImage, self.camera_callback)
-
-    def detect_blob(self,Blob,T,NIm,H,W,crop,timestamps,result):
-        # Percentage of appearance
-        apperance_percentage = (1.0*Blob['N'])/(1.0*NIm)
-
-        # Frequency estimation based on FFT
-        f              = np.arange(0.0,1.0*NIm+1.0,2.0)
-        signal_f       = scipy.fftpack.fft(Blob['Signal']-np.mean(Blob['Signal']))
-        y_f            = 2.0/NIm*np.abs(signal_f[:NIm/2+1])
-        fft_peak_freq  = 1.0*np.argmax(y_f)/(NIm*T)
-        #half_freq_dist = 0.8 #1.0*f[1]/2
-
-        #rospy.loginfo('[%s] Appearance perc. = %s, frequency = %s' % (self.node_name, apperance_percentage, fft_peak_freq))
-        freq_identified = 0
-        # Take decision
-        detected = False
-        for i in range(len(self.freqIdentify)):
-            if  (apperance_percentage < 0.8 and apperance_percentage > 0.2 and not self.useFFT) or (self.useFFT and abs(fft_peak_freq-self.freqIdentify[i]) < 0.35):
-                # Decision
-                detected = True
-                freq_identified = self.freqIdentify[i]
-                # Raw detection
-                coord_norm = Vector2D(1.0*(crop[1][0]+Blob['p'][0])/W, 1.0*(crop[0][0]+Blob['p'][1])/H)
-                result.detections.append(LEDDetection(rospy.Time.from_sec(timestamps[0]),rospy.Time.from_sec(timestamps[-1]),coord_norm,fft_peak_freq,'',-1,timestamps,signal_f,f,y_f))
-
-        return detected, result, freq_identified, fft_peak_freq
+    def is_detected(self, detector, r):
+        if self.useFFT:
+            return r.detected
+        # heuristics: the blob blinks if it appears in 20% to 80% of the frames
+        return detector.is_ready() and 0.2 < r.appearance < 0.8
+
+    def add_detection(self, detector, r, H, W, crop, result):
+        """ Adds the raw detection to result if the blob r is detected; returns whether it is. """
+        #rospy.loginfo('[%s] Appearance perc. = %s, frequency = %s, power = %s' % (self.node_name, r.appearance, r.frequency, r.power))
+        detected = self.is_detected(detector, r)
+        if detected:
+            timestamps = detector.get_timestamps()
+            coord_norm = Vector2D(1.0*(crop[1][0]+r.position[0])/W, 1.0*(crop[0][0]+r.position[1])/H)
+            result.detections.append(LEDDetection(rospy.Time.from_sec(timestamps[0]),rospy.Time.from_sec(timestamps[-1]),coord_norm,r.frequency,'',r.power,timestamps,r.signal,self.freqIdentify,r.powers))
+        return detected
 
     def publish(self,imRight,imFront,imTL,results):
         #  Publish image with circles
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import duckietown_utils as dtu
 import sys
+import timeit
 
 
 dtu.DuckietownConstants.show_timeit_benchmarks = True
@@ -15,3 +16,25 @@ with dtu.timeit_clock('empty 1'):
                             with dtu.timeit_clock('empty 8'):
                                 with dtu.timeit_clock('empty 9'):
                                     pass
+
+dtu.DuckietownConstants.show_timeit_benchmarks = False
+
+
+def empty_block():
+    with dtu.timeit_clock('empty'):
+        pass
+
+
+def empty_span():
+    with dtu.profiler.span('empty'):
+        pass
+
+
+n = 100000
+for enabled in [False, True]:
+    dtu.profiler.enabled = enabled
+    for f in [empty_block, empty_span]:
+        t = min(timeit.repeat(f, number=n, repeat=3)) / n
+        print('profiler enabled: %5s  %-12s %6.2f us' % (enabled, f.__name__, t * 1e6))
+
+print(dtu.profiler.format_tree())